@@ -66,6 +66,20 @@ function readHistoryFromCsv(market, crop) {
   return rows;
 }
 
+// Last n modal prices (the LSTM window) from our CSV copy; [] when unavailable
+function recentPricesFromCsv(market, crop, n = 60) {
+  try {
+    return readHistoryFromCsv(market, crop).map(r => r.price).slice(-n);
+  } catch (_) {
+    return [];
+  }
+}
+
+// The ML API answers 404 with history_required when it has no stored prices for the pair
+function historyRequired(data) {
+  return Boolean(data && data.history_required);
+}
+
 async function scrapeCommodityOnline() {
   const cacheKey = 'commodityonline';
   const hit = cache.get(cacheKey);
@@ -162,20 +176,55 @@ app.post('/api/predict', async (req, res) => {
       const rec = prices.find(p => p.market === body.market && p.crop.toLowerCase().includes(body.crop.toLowerCase()));
       if (rec && Number.isFinite(rec.price)) body.anchor_price = rec.price;
     }
-    // Auto-fill recent price history for LSTM if missing
-    if (body && body.task === 'price_forecast' && !('history' in body) && body.market && body.crop) {
-      try {
-        const rows = readHistoryFromCsv(body.market, body.crop);
-        const values = rows.map(r => r.price).filter(n => Number.isFinite(n));
-        // Use the last 60 points if available (LSTM window)
-        if (values.length > 0) {
-          body.history = values.slice(-60);
-        }
-      } catch (_) {
-        // ignore, fallback to ML API defaults
+    // Without "history" the ML API uses its in-memory copy of the price CSVs
+    let resp;
+    try {
+      resp = await axios.post('http://127.0.0.1:5000/predict', body, { timeout: 15000 });
+    } catch (err) {
+      // e.g. an ML API image without the data directory: send the window from our CSV copy
+      const history = err.response && historyRequired(err.response.data) ? recentPricesFromCsv(body.market, body.crop) : [];
+      if (history.length === 0) throw err;
+      resp = await axios.post('http://127.0.0.1:5000/predict', { ...body, history }, { timeout: 15000 });
+    }
+    res.status(resp.status).json(resp.data);
+  } catch (err) {
+    if (err.response) {
+      res.status(err.response.status).json(err.response.data);
+    } else {
+      res.status(500).json({ error: 'ML API not reachable', detail: String(err) });
+    }
+  }
+});
+
+// Batched price forecasts: one ML API round trip for many market-crop pairs
+app.post('/api/predict/batch', async (req, res) => {
+  try {
+    const jobs = Array.isArray(req.body && req.body.jobs) ? req.body.jobs : [];
+    if (jobs.length === 0) return res.status(400).json({ error: 'jobs are required' });
+    const prices = jobs.some(j => j && !('anchor_price' in j)) ? await getLivePrices() : [];
+    // Jobs without "history" are scored on the ML API's in-memory copy of the price CSVs
+    for (const job of jobs) {
+      if (!job || !job.market || !job.crop) continue;
+      if (!('anchor_price' in job)) {
+        const rec = prices.find(p => p.market === job.market && p.crop.toLowerCase().includes(job.crop.toLowerCase()));
+        if (rec && Number.isFinite(rec.price)) job.anchor_price = rec.price;
       }
     }
-    const resp = await axios.post('http://127.0.0.1:5000/predict', body, { timeout: 15000 });
+    const resp = await axios.post('http://127.0.0.1:5000/predict/batch', { jobs }, { timeout: 30000 });
+    // Jobs the ML API has no stored prices for are retried once with the window from our CSV copy
+    const results = (resp.data && Array.isArray(resp.data.results)) ? resp.data.results : [];
+    const retry = [];
+    results.forEach((result, i) => {
+      if (!historyRequired(result) || !jobs[i]) return;
+      const history = recentPricesFromCsv(jobs[i].market, jobs[i].crop);
+      if (history.length > 0) retry.push({ index: i, job: { ...jobs[i], history } });
+    });
+    if (retry.length > 0) {
+      const again = await axios.post('http://127.0.0.1:5000/predict/batch', { jobs: retry.map(r => r.job) }, { timeout: 30000 });
+      (again.data.results || []).forEach((result, k) => {
+        results[retry[k].index] = { ...result, index: retry[k].index };
+      });
+    }
     res.status(resp.status).json(resp.data);
   } catch (err) {
     if (err.response) {
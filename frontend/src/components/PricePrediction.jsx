@@ -41,7 +41,8 @@ const PricePrediction = ({ language, getText }) => {
           task: 'price_forecast',
           market: formData.market,
           crop: formData.crop,
-          days: formData.days
+          days: formData.days,
+          horizon: formData.days
         }),
       });
 
@@ -78,14 +79,16 @@ const PricePrediction = ({ language, getText }) => {
     if (!predictions) return [];
     const numDays = 7; // show a week
 
-    // If backend returns an explicit predictions array, prefer it
+    // If backend returns an explicit predictions array (horizon forecast), chart every day with its own bounds
     if (Array.isArray(predictions.predictions) && predictions.predictions.length > 0) {
-      const series = predictions.predictions.slice(0, numDays);
+      const series = predictions.predictions;
       return series.map((pred, index) => ({
         day: `Day ${index + 1}`,
         price: pred,
-        lower: predictions.prediction_range ? predictions.prediction_range[0] : pred,
-        upper: predictions.prediction_range ? predictions.prediction_range[1] : pred,
+        lower: Array.isArray(predictions.lower) ? predictions.lower[index]
+          : (predictions.prediction_range ? predictions.prediction_range[0] : pred),
+        upper: Array.isArray(predictions.upper) ? predictions.upper[index]
+          : (predictions.prediction_range ? predictions.prediction_range[1] : pred),
         date: new Date(Date.now() + index * 24 * 60 * 60 * 1000).toLocaleDateString()
       }));
     }
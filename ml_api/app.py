@@ -3,7 +3,17 @@ import os
 import joblib
 import numpy as np
 from datetime import datetime
-from tensorflow.keras.models import load_model
+import registry
+import hot_reload
+import price_store
+from backends import load_artifact
+from affine_scaler import fuse
+from bundle import load_scalers
+from preload import PRELOAD_MODELS, Preloader
+from result_cache import ResultCache, artifact_version
+from recommend_table import ProbabilityTable, TableSource
+from features import build_features
+from horizon import parse_horizon, rollout, direct_path, interval_bounds, artifact_horizons
 
 app = Flask(__name__)
 
@@ -12,6 +22,9 @@ SEQ_LENGTH = 30
 
 CALIBRATION_ALPHA = float(os.environ.get('CALIBRATION_ALPHA', '0.6'))
 CLAMP_PCT = float(os.environ.get('CLAMP_PCT', '0.15'))
+MAX_BATCH_JOBS = int(os.environ.get('MAX_BATCH_JOBS', '64'))
+# Baseline models default to their NumPy exports; INFERENCE_BACKEND=keras/tflite/onnx overrides
+LSTM_BACKEND = os.environ.get('INFERENCE_BACKEND') or 'numpy'
 
 MARKET_CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -20,10 +33,19 @@ MARKET_CROPS = {
     'hospet': ['Maize', 'Ragi', 'Rice', 'Tomato']
 }
 
-# Lazy caches
-_lstm_cache = {}
+# Family name that prefixes this app's keys in the shared registry (registry.py)
+FAMILY = 'baseline'
+
+# Lazy caches; LSTMs share the registry's MODEL_CACHE_MAX_MB / MODEL_CACHE_TTL_SECONDS budget
+_lstm_cache = registry.models
 _xgb_cache = None
 
+# Forecast responses keyed by input fingerprint and model artifact version
+_results = registry.results
+
+# Optional micro-batching of concurrent single-row forecasts (COALESCE_WINDOW_MS > 0)
+_batcher = registry.batcher
+
 
 def _ensure_price_scaler(obj):
     # New training saves {'price_scaler': scaler}; older saved scaler directly
@@ -33,23 +55,37 @@ def _ensure_price_scaler(obj):
 
 
 def load_lstm_model_and_scaler(market: str, crop: str):
-    key = (market, crop)
-    if key in _lstm_cache:
-        return _lstm_cache[key]
-    model_path_keras = os.path.join(MODEL_DIR, f'lstm_{market}_{crop}.keras')
-    model_path_h5 = os.path.join(MODEL_DIR, f'lstm_{market}_{crop}.h5')
-    scaler_path = os.path.join(MODEL_DIR, f'lstm_{market}_{crop}_scaler.pkl')
-    if os.path.exists(model_path_keras) and os.path.exists(scaler_path):
-        model = load_model(model_path_keras, compile=False)
-        scaler = _ensure_price_scaler(joblib.load(scaler_path))
-        _lstm_cache[key] = (model, scaler)
-        return model, scaler
-    if os.path.exists(model_path_h5) and os.path.exists(scaler_path):
-        model = load_model(model_path_h5, compile=False)
-        scaler = _ensure_price_scaler(joblib.load(scaler_path))
-        _lstm_cache[key] = (model, scaler)
+    # Single-flight: concurrent cold requests share one load; misses are negatively cached
+    cached = _lstm_cache.get_or_load((FAMILY, market, crop), lambda: _load_lstm_from_disk(market, crop))
+    return cached if cached is not None else (None, None)
+
+
+def _load_lstm_from_disk(market: str, crop: str):
+    # TensorFlow is only imported when the chosen artifact is a .keras/.h5 file;
+    # availability comes from the manifest index (registry.artifacts)
+    found = registry.artifacts.servable(os.path.join(MODEL_DIR, f'lstm_{market}_{crop}'), LSTM_BACKEND)
+    if found:
+        model_path, scaler_path = found
+        model = load_artifact(model_path)
+        scaler_obj = load_scalers(scaler_path)
+        # sklearn scaler -> precomputed arrays; same outputs without per-call validation
+        scaler = fuse(_ensure_price_scaler(scaler_obj))
+        model.horizons = artifact_horizons(scaler_obj)
+        # Forecasts are keyed by the version of the model that produced them (hot_reload.py swaps models)
+        model.sources = (model_path, scaler_path)
+        model.version = artifact_version(*model.sources)
+        # A (re)load invalidates forecasts produced by any previous version
+        _results.invalidate(FAMILY, market, crop)
         return model, scaler
-    return None, None
+    return None
+
+
+def run_model(key, model, X):
+    # Single rows go through the coalescer when enabled; batches run directly
+    if _batcher is not None and len(X) == 1:
+        # Rows only share a batch with rows for the same model version (hot_reload.py swaps models)
+        return _batcher.submit(key + (model.version,), model, X[0])[np.newaxis]
+    return model(X)
 
 
 def pad_or_truncate_history(history):
@@ -71,13 +107,69 @@ def get_anchor(anchor_price, last_price):
         return float(last_price)
 
 
+def calibrate(model_preds, anchors):
+    # Vectorised blend towards the anchor and clamp to +/- CLAMP_PCT
+    model_preds = np.asarray(model_preds, dtype=float)
+    anchors = np.asarray(anchors, dtype=float)
+    blended = CALIBRATION_ALPHA * model_preds + (1.0 - CALIBRATION_ALPHA) * anchors
+    return np.clip(blended, anchors * (1.0 - CLAMP_PCT), anchors * (1.0 + CLAMP_PCT))
+
+
+def forecast_key(model, market, crop, seq, anchor_price, *extra):
+    # Result-cache key for a padded history under the model serving the request
+    return ResultCache.make_key(FAMILY, market, crop, seq, anchor_price, model.version, *extra)
+
+
+def encode_windows(prices, scaler, n_features, last=False):
+    # (K, L) raw price windows -> scaled model rows: (K, L, n_features), or only the newest
+    # (K, 1, n_features) row with last=True. Models trained by train_lstm.py take the 7
+    # baseline features (built on raw prices) with column 0 as the scaled price.
+    newest = prices[:, -1:] if last else prices
+    scaled = scaler.transform(newest)
+    if n_features == 1:
+        return scaled[..., np.newaxis]
+    feats = build_features(prices, last=last)
+    feats[..., 0] = scaled
+    return feats
+
+
+def prepare_price_input(seq, anchor_price, scaler, n_features):
+    # Returns the scaled (SEQ_LENGTH, n_features) model input plus last/anchor prices
+    last_price = float(seq[-1][0])
+    anchor = get_anchor(anchor_price, last_price)
+    return encode_windows(seq.T, scaler, n_features)[0], last_price, anchor
+
+
+def forecast_horizon(market, crop, model, scaler, seq, anchor_price, horizon, scenarios):
+    # Multi-day path. Multi-horizon models answer in one forward pass; otherwise every
+    # scenario advances together, one batched forward pass per day
+    last_price = float(seq[-1][0])
+    anchor = get_anchor(anchor_price, last_price)
+    n_features = model.input_shape[-1]
+    if scenarios == 0 and 1 < horizon <= model.horizons[-1]:
+        X = encode_windows(seq.T, scaler, n_features)
+        preds = scaler.inverse_transform(run_model((FAMILY, market, crop), model, X).reshape(-1, 1)).reshape(1, -1)
+        paths = direct_path(preds, model.horizons, last_price, horizon)
+    else:
+        paths = rollout(
+            lambda X: scaler.inverse_transform(run_model((FAMILY, market, crop), model, X)[:, :1])[:, 0],
+            lambda prices, last: encode_windows(prices, scaler, n_features, last),
+            seq, horizon, scenarios)
+    central, lower, upper = interval_bounds(paths, seq, lambda p: calibrate(p, anchor))
+    return {'forecast': float(central[0]), 'model_pred': float(paths[0, 0]), 'anchor_price': anchor,
+            'last_price': last_price, 'horizon': horizon, 'scenarios': scenarios,
+            'predictions': central.tolist(), 'lower': lower.tolist(), 'upper': upper.tolist()}
+
+
+XGB_PATHS = [os.path.join(MODEL_DIR, name) for name in
+             ('xgb_crop_recommendation.pkl', 'xgb_le_market.pkl', 'xgb_le_crop.pkl')]
+
+
 def load_xgb():
     global _xgb_cache
     if _xgb_cache is not None:
         return _xgb_cache
-    model_path = os.path.join(MODEL_DIR, 'xgb_crop_recommendation.pkl')
-    le_market_path = os.path.join(MODEL_DIR, 'xgb_le_market.pkl')
-    le_crop_path = os.path.join(MODEL_DIR, 'xgb_le_crop.pkl')
+    model_path, le_market_path, le_crop_path = XGB_PATHS
     if not (os.path.exists(model_path) and os.path.exists(le_market_path) and os.path.exists(le_crop_path)):
         return None
     model = joblib.load(model_path)
@@ -87,11 +179,89 @@ def load_xgb():
     return _xgb_cache
 
 
+def reset_xgb():
+    global _xgb_cache
+    _xgb_cache = None
+
+
+def score_crops(model, n_crops, m_enc, months):
+    # (N,) market encodings and months -> (N, n_crops) class scores
+    features = np.column_stack([m_enc, months])
+    if hasattr(model, 'predict_proba'):
+        return model.predict_proba(features)
+    preds = np.asarray(model.predict(features), dtype=int)
+    return np.eye(n_crops)[preds]
+
+
+def build_recommendation_table(_part=None):
+    # The model only sees (market_enc, month), so 4 markets x 12 months is the whole input space
+    bundle = load_xgb()
+    if bundle is None:
+        return None
+    model, le_market, le_crop = bundle
+    return ProbabilityTable.build(le_market.classes_, le_crop.classes_,
+                                  lambda m_idx, months: score_crops(model, len(le_crop.classes_), m_idx, months))
+
+
+# Recommendations are served from the precomputed table; rebuilt when the pickles change
+_recommendations = TableSource(XGB_PATHS, build_recommendation_table, reset=reset_xgb)
+
+# Retrained artifacts are swapped into the caches in place (MODEL_RELOAD_INTERVAL_SECONDS, POST /admin/reload)
+hot_reload.register(FAMILY, _load_lstm_from_disk, _recommendations)
+
+
+def preload_tasks():
+    # One task per trained market-crop pair plus the recommendation model
+    tasks = {}
+    for market, crops in registry.artifacts.market_crops(('baseline',), MARKET_CROPS).items():
+        for crop in crops:
+            tasks[f'{market}-{crop}'] = lambda m=market, c=crop: load_lstm_model_and_scaler(m, c)[0] is not None
+    tasks['xgb_crop_recommendation'] = lambda: _recommendations.get() is not None
+    return tasks
+
+
+# Eager, parallel warm-up at worker start (PRELOAD_MODELS=1, family listed in PRELOAD_VARIANTS)
+_preloader = Preloader(preload_tasks()).start() if PRELOAD_MODELS and FAMILY in registry.PRELOAD_VARIANTS else None
+
+# Price series for forecasts that omit "history", kept in memory and re-read when a CSV changes
+price_store.preload(MARKET_CROPS)
+
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok'})
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    # 503 until every artifact has been loaded and warmed
+    if _preloader is None:
+        return jsonify({'ready': True, 'preload': False,
+                        'loaded': sorted(registry.label(key) for key, _ in registry.family_items(FAMILY))})
+    report = _preloader.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'coalescer': _batcher.stats() if _batcher is not None else None,
+        'retraces': {registry.label(key): model.retraces for key, (model, _) in registry.family_items(FAMILY)},
+        'model_cache': _lstm_cache.stats(),
+        'result_cache': _results.stats(),
+        'recommendation_table': _recommendations.stats(),
+        'hot_reload': hot_reload.stats(),
+        'price_store': price_store.store.stats(),
+    })
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    # Reload retrained artifacts without a restart (hot_reload.py); needs the X-Admin-Token header
+    body, status = hot_reload.handle(request.headers.get('X-Admin-Token'), request.get_json(silent=True), [FAMILY])
+    return jsonify(body), status
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     data = request.json or {}
@@ -100,25 +270,48 @@ def predict():
     if task == 'price_forecast':
         market = data.get('market')
         crop = data.get('crop')
-        history = data.get('history') or []
         anchor_price = data.get('anchor_price')
         if not (market and crop):
             return jsonify({'error': 'Missing market or crop'}), 400
+        try:
+            horizon = parse_horizon(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         model, scaler = load_lstm_model_and_scaler(market, crop)
         if model is None or scaler is None:
             return jsonify({'error': f'Model for {market}-{crop} not found'}), 404
+        # Without a "history" the newest stored prices are used (price_store.py)
+        history = price_store.request_history(data, market, crop, SEQ_LENGTH)
+        if history is None:
+            return jsonify(price_store.missing_history(market, crop)), 404
         seq = pad_or_truncate_history(history)
-        last_price = float(seq[-1][0])
-        anchor = get_anchor(anchor_price, last_price)
-        input_scaled = scaler.transform(seq)
-        X_pred = input_scaled.reshape(1, SEQ_LENGTH, 1)
-        pred_scaled = model.predict(X_pred)
-        model_pred = float(scaler.inverse_transform(pred_scaled)[0][0])
-        blended = CALIBRATION_ALPHA * model_pred + (1.0 - CALIBRATION_ALPHA) * anchor
-        lo = anchor * (1.0 - CLAMP_PCT)
-        hi = anchor * (1.0 + CLAMP_PCT)
-        blended = max(lo, min(hi, blended))
-        return jsonify({'forecast': blended, 'model_pred': model_pred, 'anchor_price': anchor, 'last_price': last_price})
+        if horizon is not None:
+            result_key = forecast_key(model, market, crop, seq, anchor_price, *horizon)
+            cached = _results.get(result_key)
+            if cached is None:
+                try:
+                    cached = _results.put(result_key, forecast_horizon(market, crop, model, scaler, seq, anchor_price,
+                                                                       *horizon))
+                except Exception as e:
+                    print(f"Prediction failed for {market}-{crop}: {e}")
+                    return jsonify({'error': 'Prediction failed'}), 500
+            return jsonify(cached)
+        result_key = forecast_key(model, market, crop, seq, anchor_price)
+        cached = _results.get(result_key)
+        if cached is not None:
+            return jsonify(cached)
+        input_scaled, last_price, anchor = prepare_price_input(seq, anchor_price, scaler, model.input_shape[-1])
+        X_pred = input_scaled[np.newaxis]
+        try:
+            # e.g. a backend whose model takes a fixed window length other than SEQ_LENGTH
+            pred_scaled = run_model((FAMILY, market, crop), model, X_pred)
+        except Exception as e:
+            print(f"Prediction failed for {market}-{crop}: {e}")
+            return jsonify({'error': 'Prediction failed'}), 500
+        model_pred = float(scaler.inverse_transform(pred_scaled[:, :1])[0][0])
+        blended = float(calibrate(model_pred, anchor))
+        result = {'forecast': blended, 'model_pred': model_pred, 'anchor_price': anchor, 'last_price': last_price}
+        return jsonify(_results.put(result_key, result))
 
     elif task == 'crop_recommendation':
         # Inputs: market (required), month (optional 1-12) or date (YYYY-MM-DD)
@@ -135,24 +328,21 @@ def predict():
                 month = datetime.utcnow().month
         if month is None:
             month = datetime.utcnow().month
-        bundle = load_xgb()
-        if bundle is None:
+        table = _recommendations.get()
+        if table is None:
             return jsonify({'error': 'Recommendation model not available'}), 500
-        model, le_market, le_crop = bundle
-        try:
-            m_enc = le_market.transform([market])[0]
-        except Exception:
+        if market not in table:
             # unseen market
             return jsonify({'error': f'Unknown market: {market}'}), 400
-        features = np.array([[m_enc, int(month)]])
-        # Use predict_proba to rank
-        if hasattr(model, 'predict_proba'):
-            proba = model.predict_proba(features)[0]
-            indices = np.argsort(proba)[::-1]
-            crops_all = le_crop.inverse_transform(indices)
+        cell = table.lookup(market, int(month))
+        if cell is not None:
+            crops_all = cell[0]
         else:
-            preds = model.predict(features)
-            crops_all = le_crop.inverse_transform(preds)
+            # Month outside 1-12: score the single row directly
+            model, le_market, le_crop = load_xgb()
+            m_enc = le_market.transform([market])
+            proba = score_crops(model, len(le_crop.classes_), m_enc, [int(month)])[0]
+            crops_all = le_crop.inverse_transform(np.argsort(proba)[::-1])
         allowed = MARKET_CROPS.get(market, None)
         ranked = [c for c in crops_all if (allowed is None or c in allowed)]
         return jsonify({'market': market, 'month': int(month), 'recommended_crops': ranked[:top_k]})
@@ -161,5 +351,79 @@ def predict():
         return jsonify({'error': 'Invalid task'}), 400
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # Scores many price_forecast jobs with one forward pass per loaded model.
+    # Body: {"jobs": [{"market", "crop", "history"?, "anchor_price"}, ...]}
+    data = request.json or {}
+    jobs = data.get('jobs')
+    if not isinstance(jobs, list) or not jobs:
+        return jsonify({'error': 'Missing jobs'}), 400
+    if len(jobs) > MAX_BATCH_JOBS:
+        return jsonify({'error': f'Too many jobs (max {MAX_BATCH_JOBS})'}), 400
+
+    results = [None] * len(jobs)
+    groups = {}
+    for i, job in enumerate(jobs):
+        job = job if isinstance(job, dict) else {}
+        market = job.get('market')
+        crop = job.get('crop')
+        if not (market and crop):
+            results[i] = {'index': i, 'error': 'Missing market or crop', 'status': 400}
+            continue
+        groups.setdefault((market, crop), []).append(i)
+
+    for (market, crop), indices in groups.items():
+        model, scaler = load_lstm_model_and_scaler(market, crop)
+        if model is None or scaler is None:
+            for i in indices:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Model for {market}-{crop} not found', 'status': 404}
+            continue
+        rows, lasts, anchors, keys, ok = [], [], [], [], []
+        for i in indices:
+            history = price_store.request_history(jobs[i], market, crop, SEQ_LENGTH)
+            if history is None:
+                results[i] = {'index': i, 'market': market, 'crop': crop, **price_store.missing_history(market, crop),
+                              'status': 404}
+                continue
+            try:
+                seq = pad_or_truncate_history(history)
+                result_key = forecast_key(model, market, crop, seq, jobs[i].get('anchor_price'))
+                cached = _results.get(result_key)
+                if cached is not None:
+                    results[i] = dict(cached, index=i, market=market, crop=crop)
+                    continue
+                input_scaled, last_price, anchor = prepare_price_input(
+                    seq, jobs[i].get('anchor_price'), scaler, model.input_shape[-1])
+            except Exception as e:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Invalid history: {e}', 'status': 400}
+                continue
+            keys.append(result_key)
+            rows.append(input_scaled)
+            lasts.append(last_price)
+            anchors.append(anchor)
+            ok.append(i)
+        if not ok:
+            continue
+        try:
+            X_pred = np.stack(rows)
+            pred_scaled = run_model((FAMILY, market, crop), model, X_pred)
+            model_preds = scaler.inverse_transform(pred_scaled[:, :1])[:, 0]
+        except Exception as e:
+            for i in ok:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Prediction error: {e}', 'status': 500}
+            continue
+        forecasts = calibrate(model_preds, anchors)
+        for j, i in enumerate(ok):
+            result = _results.put(keys[j], {'forecast': float(forecasts[j]), 'model_pred': float(model_preds[j]),
+                                            'anchor_price': float(anchors[j]), 'last_price': float(lasts[j])})
+            results[i] = dict(result, index=i, market=market, crop=crop)
+
+    return jsonify({'results': results})
+
+
 if __name__ == '__main__':
     app.run(debug=True) 
@@ -2,10 +2,19 @@ from flask import Flask, request, jsonify
 import os
 import joblib
 import numpy as np
-import pandas as pd
 from datetime import datetime
-from tensorflow.keras.models import load_model
 from sklearn.preprocessing import RobustScaler
+import registry
+import hot_reload
+import price_store
+from backends import load_artifact
+from affine_scaler import fuse_columns, fuse_scalers
+from bundle import load_scalers
+from preload import PRELOAD_MODELS, Preloader
+from result_cache import ResultCache, artifact_version
+from recommend_table import ProbabilityTable, TableSource
+from features import build_attention_features
+from horizon import parse_horizon, rollout, direct_path, interval_bounds, artifact_horizons
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -16,6 +25,7 @@ SEQ_LENGTH = 60  # Enhanced sequence length
 
 CALIBRATION_ALPHA = float(os.environ.get('CALIBRATION_ALPHA', '0.8'))  # Higher confidence in attention models
 CLAMP_PCT = float(os.environ.get('CLAMP_PCT', '0.08'))  # Tighter bounds for better models
+MAX_BATCH_JOBS = int(os.environ.get('MAX_BATCH_JOBS', '64'))
 
 MARKET_CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -24,65 +34,96 @@ MARKET_CROPS = {
     'hospet': ['Maize', 'Ragi', 'Rice', 'Tomato']
 }
 
-# Enhanced caches
-_attention_lstm_cache = {}
+# Family name that prefixes this app's keys in the shared registry (registry.py)
+FAMILY = 'attention'
+# Manifest variants the fallback chain can serve, in order
+CHAIN_VARIANTS = ('student', 'attention', 'enhanced', 'baseline')
+
+# Enhanced caches; LSTMs share the registry's MODEL_CACHE_MAX_MB / MODEL_CACHE_TTL_SECONDS budget
+_attention_lstm_cache = registry.models
 _xgb_cache = None
 _ensemble_cache = None
 
+# Forecast results keyed by input fingerprint and model artifact version
+_results = registry.results
+
+# Optional micro-batching of concurrent single-row forecasts (COALESCE_WINDOW_MS > 0)
+_batcher = registry.batcher
+
 def _ensure_price_scaler(obj):
     """Handle both old and new scaler formats"""
     if isinstance(obj, dict) and 'price_scaler' in obj:
         return obj['price_scaler']
     return obj
 
-def load_attention_lstm_model_and_scaler(market: str, crop: str):
-    """Load attention-enhanced LSTM model with advanced architecture"""
-    key = (market, crop)
-    if key in _attention_lstm_cache:
-        return _attention_lstm_cache[key]
-    
-    # Try attention model first, fallback to enhanced model, then regular model
-    model_paths = [
-        f'lstm_attention_{market}_{crop}.keras',
-        f'lstm_enhanced_{market}_{crop}.keras',
-        f'lstm_{market}_{crop}.keras'
-    ]
+def model_key(market: str, crop: str, teacher: bool = False):
+    """Cache/batching key: the default (student first) chain or the teacher chain"""
+    return (FAMILY, market, crop, 'teacher') if teacher else (FAMILY, market, crop)
+
+def load_attention_lstm_model_and_scaler(market: str, crop: str, teacher: bool = False):
+    """Load attention-enhanced LSTM model with advanced architecture
     
-    scaler_paths = [
-        f'lstm_attention_{market}_{crop}_scaler.pkl',
-        f'lstm_enhanced_{market}_{crop}_scaler.pkl',
-        f'lstm_{market}_{crop}_scaler.pkl'
+    The distilled student (distill.py) is served when one exists, unless
+    ``teacher`` asks for the full attention model.
+    Single-flight: concurrent cold requests share one load, and missing or
+    failed pairs are negatively cached for MODEL_CACHE_NEGATIVE_TTL_SECONDS.
+    """
+    cached = _attention_lstm_cache.get_or_load(
+        model_key(market, crop, teacher), lambda: _load_attention_lstm_from_disk(market, crop, teacher))
+    return cached if cached is not None else (None, None, None)
+
+def _load_attention_lstm_from_disk(market: str, crop: str, teacher: bool = False):
+    """Load the first available model/scaler pair from the fallback chain, or None"""
+    # Try the distilled student, then the attention model, fallback to enhanced model,
+    # then regular model (each in the INFERENCE_BACKEND format when it has been exported)
+    stems = [
+        f'lstm_attention_{market}_{crop}',
+        f'lstm_enhanced_{market}_{crop}',
+        f'lstm_{market}_{crop}'
     ]
+    if not teacher:
+        stems.insert(0, f'lstm_attention_student_{market}_{crop}')
+    # Availability comes from the manifest index (registry.artifacts), not the filesystem
+    found = next(filter(None, map(registry.artifacts.servable, stems)), None)
     
-    model_path = None
-    scaler_path = None
-    
-    for mp, sp in zip(model_paths, scaler_paths):
-        if os.path.exists(mp) and os.path.exists(sp):
-            model_path = mp
-            scaler_path = sp
-            break
-    
-    if model_path and scaler_path:
+    if found:
+        model_path, scaler_path = found
         try:
-            model = load_model(model_path, compile=False)
-            scaler_data = joblib.load(scaler_path)
+            model = load_artifact(model_path)
+            scaler_data = load_scalers(scaler_path)
+            model.horizons = artifact_horizons(scaler_data)
+            model.student = scaler_data.get('student') if isinstance(scaler_data, dict) else None
             
-            # Handle different scaler formats
-            if isinstance(scaler_data, dict):
-                price_scaler = scaler_data.get('price_scaler', scaler_data)
-                feature_scaler = scaler_data.get('feature_scaler', None)
-            else:
-                price_scaler = scaler_data
-                feature_scaler = None
+            # Handle different scaler formats; both become precomputed arrays (affine_scaler.py) and the
+            # price and feature scaling of a row is fused into one step
+            price_scaler, input_scaler = fuse_scalers(scaler_data, model.input_shape[-1])
+            if input_scaler is None:
+                input_scaler = fuse_columns(price_scaler, None, model.input_shape[-1])
             
-            _attention_lstm_cache[key] = (model, price_scaler, feature_scaler)
-            return model, price_scaler, feature_scaler
+            # Forecasts are keyed by the version of the model that produced them (hot_reload.py swaps models)
+            model.sources = (model_path, scaler_path)
+            model.version = artifact_version(*model.sources)
+            # A (re)load invalidates forecasts produced by any previous version
+            _results.invalidate(FAMILY, market, crop)
+            
+            return model, price_scaler, input_scaler
         except Exception as e:
             print(f"Error loading model {model_path}: {e}")
-            return None, None, None
+            return None
     
-    return None, None, None
+    return None
+
+def served_model_type(market: str, crop: str, teacher: bool = False):
+    """model_type reported for a pair: the distilled student or the attention model"""
+    model = load_attention_lstm_model_and_scaler(market, crop, teacher)[0]
+    return 'attention_student' if getattr(model, 'student', None) else 'attention_lstm'
+
+def run_model(key, model, X):
+    """Run the model, coalescing concurrent single rows when batching is enabled"""
+    if _batcher is not None and len(X) == 1:
+        # Rows only share a batch with rows for the same model version (hot_reload.py swaps models)
+        return _batcher.submit(key + (model.version,), model, X[0])[np.newaxis]
+    return model(X)
 
 def load_ensemble_model():
     """Load ensemble model for crop recommendations"""
@@ -105,205 +146,230 @@ def load_ensemble_model():
     
     return None, None
 
-def build_advanced_features(prices_np: np.ndarray):
-    """Enhanced feature engineering with more sophisticated features"""
-    p = prices_np.flatten()
+def pad_attention_history(history, anchor_price):
+    """Return the SEQ_LENGTH price window actually fed to the model and the anchor"""
+    # Use provided history or generate default
+    if history is None or len(history) < SEQ_LENGTH:
+        # Generate default history based on anchor price
+        if anchor_price is None:
+            anchor_price = 2000  # Default price
+        history = [anchor_price] * SEQ_LENGTH
     
-    def roll_mean(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).mean().values
+    # Ensure we have enough history
+    if len(history) < SEQ_LENGTH:
+        history = [history[0]] * (SEQ_LENGTH - len(history)) + history
     
-    def roll_std(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=2).std(ddof=0).fillna(0).values
-    
-    def roll_min(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).min().values
-    
-    def roll_max(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).max().values
-    
-    # Multiple time windows
-    ma7 = roll_mean(p, 7)
-    ma14 = roll_mean(p, 14)
-    ma30 = roll_mean(p, 30)
-    ma60 = roll_mean(p, 60)
-    
-    std7 = roll_std(p, 7)
-    std14 = roll_std(p, 14)
-    std30 = roll_std(p, 30)
-    
-    min7 = roll_min(p, 7)
-    min14 = roll_min(p, 14)
-    min30 = roll_min(p, 30)
-    
-    max7 = roll_max(p, 7)
-    max14 = roll_max(p, 14)
-    max30 = roll_max(p, 30)
-    
-    # Price ratios (scale-free features)
-    eps = 1e-6
-    r_ma7 = p / (ma7 + eps)
-    r_ma14 = p / (ma14 + eps)
-    r_ma30 = p / (ma30 + eps)
-    r_ma60 = p / (ma60 + eps)
-    
-    # Volatility ratios
-    r_std7 = std7 / (ma7 + eps)
-    r_std14 = std14 / (ma14 + eps)
-    r_std30 = std30 / (ma30 + eps)
-    
-    # Range ratios
-    r_min7 = p / (min7 + eps)
-    r_min14 = p / (min14 + eps)
-    r_min30 = p / (min30 + eps)
-    
-    r_max7 = p / (max7 + eps)
-    r_max14 = p / (max14 + eps)
-    r_max30 = p / (max30 + eps)
+    # Take the last SEQ_LENGTH values
+    recent_history = history[-SEQ_LENGTH:]
+    return np.array(recent_history, dtype=float).reshape(-1, 1), anchor_price
+
+def encode_attention_windows(prices, input_scaler, last=False):
+    """Scale (K, L) raw price windows into (K, L, F) model rows, or only the newest (K, 1, F) with last=True"""
+    # Build features
+    features = build_attention_features(prices, last=last)
     
-    # Price momentum (rate of change)
-    momentum_1 = np.diff(p, prepend=p[0])
-    momentum_3 = pd.Series(p).diff(3).fillna(0).values
-    momentum_7 = pd.Series(p).diff(7).fillna(0).values
+    # Scale features and prices in one step: column 0 (the raw price) uses the price scaler
+    return input_scaler.transform(features)
+
+def prepare_attention_input(prices_array, input_scaler):
+    """Build the scaled (SEQ_LENGTH, F) model input from a padded price window"""
+    return encode_attention_windows(prices_array.T, input_scaler)[0]
+
+def forecast_key(model, market, crop, prices_array, anchor_price, *extra):
+    """Result-cache key for a padded window under the model serving the request"""
+    return ResultCache.make_key(FAMILY, market, crop, prices_array, anchor_price, model.version, *extra)
+
+def calibrate_predictions(predictions, anchor_prices):
+    """Vectorised calibration towards anchor prices; rows without an anchor pass through"""
+    predictions = np.asarray(predictions, dtype=float)
+    has_anchor = np.array([a is not None for a in anchor_prices])
+    anchors = np.array([a if a is not None else 0.0 for a in anchor_prices], dtype=float)
     
-    # Technical indicators
-    rsi_14 = calculate_rsi(p, 14)
-    bollinger_upper, bollinger_lower = calculate_bollinger_bands(p, 20, 2)
-    bollinger_position = (p - bollinger_lower) / (bollinger_upper - bollinger_lower + eps)
+    # Calibrate prediction towards anchor price
+    calibrated = CALIBRATION_ALPHA * predictions + (1 - CALIBRATION_ALPHA) * anchors
     
-    # Combine all features
-    features = np.column_stack([
-        p,  # Original price
-        ma7, ma14, ma30, ma60,  # Moving averages
-        std7, std14, std30,  # Standard deviations
-        min7, min14, min30,  # Minimums
-        max7, max14, max30,  # Maximums
-        r_ma7, r_ma14, r_ma30, r_ma60,  # Price ratios
-        r_std7, r_std14, r_std30,  # Volatility ratios
-        r_min7, r_min14, r_min30,  # Min ratios
-        r_max7, r_max14, r_max30,  # Max ratios
-        momentum_1, momentum_3, momentum_7,  # Momentum
-        rsi_14, bollinger_position  # Technical indicators
-    ])
+    # Clamp prediction within reasonable bounds
+    min_price = anchors * (1 - CLAMP_PCT)
+    max_price = anchors * (1 + CLAMP_PCT)
+    calibrated = np.clip(calibrated, min_price, max_price)
     
-    return features
-
-def calculate_rsi(prices, window=14):
-    """Calculate Relative Strength Index"""
-    delta = pd.Series(prices).diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(50).values
-
-def calculate_bollinger_bands(prices, window=20, num_std=2):
-    """Calculate Bollinger Bands"""
-    rolling_mean = pd.Series(prices).rolling(window=window).mean()
-    rolling_std = pd.Series(prices).rolling(window=window).std()
-    upper_band = rolling_mean + (rolling_std * num_std)
-    lower_band = rolling_mean - (rolling_std * num_std)
-    return upper_band.fillna(method='bfill').values, lower_band.fillna(method='bfill').values
-
-def predict_price_attention(market: str, crop: str, history: list = None, anchor_price: float = None):
+    return np.where(has_anchor, calibrated, predictions)
+
+def predict_price_attention(market: str, crop: str, history: list = None, anchor_price: float = None,
+                            teacher: bool = False):
     """Make price prediction using attention-enhanced LSTM"""
     
-    model, price_scaler, feature_scaler = load_attention_lstm_model_and_scaler(market, crop)
+    model, price_scaler, input_scaler = load_attention_lstm_model_and_scaler(market, crop, teacher)
     if model is None:
         return None, "Attention model not found"
     
     try:
-        # Use provided history or generate default
-        if history is None or len(history) < SEQ_LENGTH:
-            # Generate default history based on anchor price
-            if anchor_price is None:
-                anchor_price = 2000  # Default price
-            history = [anchor_price] * SEQ_LENGTH
-        
-        # Ensure we have enough history
-        if len(history) < SEQ_LENGTH:
-            history = [history[0]] * (SEQ_LENGTH - len(history)) + history
-        
-        # Take the last SEQ_LENGTH values
-        recent_history = history[-SEQ_LENGTH:]
-        
-        # Build features
-        prices_array = np.array(recent_history).reshape(-1, 1)
-        features = build_advanced_features(prices_array)
-        
-        # Scale features if feature scaler is available
-        if feature_scaler is not None:
-            features_scaled = feature_scaler.transform(features)
-        else:
-            features_scaled = features
+        prices_array, anchor_price = pad_attention_history(history, anchor_price)
+        result_key = forecast_key(model, market, crop, prices_array, anchor_price)
+        cached = _results.get(result_key)
+        if cached is not None:
+            return cached, None
         
-        # Scale prices
-        prices_scaled = price_scaler.transform(prices_array)
-        features_scaled[:, 0] = prices_scaled.flatten()
+        features_scaled = prepare_attention_input(prices_array, input_scaler)
         
         # Reshape for LSTM input
         X = features_scaled.reshape(1, SEQ_LENGTH, features_scaled.shape[1])
         
         # Make prediction
-        prediction_scaled = model.predict(X, verbose=0)[0][0]
+        prediction_scaled = run_model(model_key(market, crop, teacher), model, X)[0][0]
         
         # Inverse transform prediction
         prediction = price_scaler.inverse_transform([[prediction_scaled]])[0][0]
         
         # Apply calibration and clamping
-        if anchor_price is not None:
-            # Calibrate prediction towards anchor price
-            prediction = CALIBRATION_ALPHA * prediction + (1 - CALIBRATION_ALPHA) * anchor_price
-            
-            # Clamp prediction within reasonable bounds
-            min_price = anchor_price * (1 - CLAMP_PCT)
-            max_price = anchor_price * (1 + CLAMP_PCT)
-            prediction = np.clip(prediction, min_price, max_price)
+        prediction = float(calibrate_predictions([prediction], [anchor_price])[0])
         
-        return prediction, None
+        return _results.put(result_key, prediction), None
         
     except Exception as e:
         return None, f"Prediction error: {str(e)}"
 
-def predict_crop_recommendation(market: str, month: int = None):
-    """Predict crop recommendations using ensemble model"""
+def predict_price_attention_horizon(market: str, crop: str, history: list, anchor_price: float,
+                                    horizon: int, scenarios: int = 0, teacher: bool = False):
+    """Multi-day attention forecast: every scenario advances together, one batched forward pass per day"""
+    model, price_scaler, input_scaler = load_attention_lstm_model_and_scaler(market, crop, teacher)
+    key = model_key(market, crop, teacher)
+    if model is None:
+        return None, "Attention model not found"
+    
+    try:
+        prices_array, anchor_price = pad_attention_history(history, anchor_price)
+        result_key = forecast_key(model, market, crop, prices_array, anchor_price, horizon, scenarios)
+        cached = _results.get(result_key)
+        if cached is not None:
+            return cached, None
+        
+        if scenarios == 0 and 1 < horizon <= model.horizons[-1]:
+            # Multi-horizon heads: the whole path from one forward pass
+            X = encode_attention_windows(prices_array.T, input_scaler)
+            preds = np.asarray(run_model(key, model, X), dtype=float).reshape(-1, 1)
+            paths = direct_path(price_scaler.inverse_transform(preds).reshape(1, -1), model.horizons,
+                                float(prices_array[-1][0]), horizon)
+        else:
+            paths = rollout(
+                lambda X: price_scaler.inverse_transform(np.asarray(run_model(key, model, X)[:, :1], dtype=float))[:, 0],
+                lambda prices, last: encode_attention_windows(prices, input_scaler, last),
+                prices_array, horizon, scenarios)
+        central, lower, upper = interval_bounds(
+            paths, prices_array, lambda p: calibrate_predictions(p, [anchor_price]))
+        
+        return _results.put(result_key, {
+            'predictions': central.tolist(),
+            'lower': lower.tolist(),
+            'upper': upper.tolist(),
+        }), None
+        
+    except Exception as e:
+        return None, f"Prediction error: {str(e)}"
+
+def predict_price_attention_batch(market: str, crop: str, jobs: list, teacher: bool = False):
+    """Score several (history, anchor_price) jobs for one pair in a single forward pass
+    
+    Returns a list of (prediction, error) tuples aligned with ``jobs``.
+    """
+    model, price_scaler, input_scaler = load_attention_lstm_model_and_scaler(market, crop, teacher)
+    if model is None:
+        return [(None, "Attention model not found")] * len(jobs)
+    
+    outputs = [None] * len(jobs)
+    rows, anchors, keys, ok = [], [], [], []
+    for i, job in enumerate(jobs):
+        try:
+            history = price_store.request_history(job, market, crop, SEQ_LENGTH)
+            prices_array, anchor_price = pad_attention_history(history, job.get('anchor_price'))
+            result_key = forecast_key(model, market, crop, prices_array, anchor_price)
+            cached = _results.get(result_key)
+            if cached is not None:
+                outputs[i] = (cached, None)
+                continue
+            features_scaled = prepare_attention_input(prices_array, input_scaler)
+        except Exception as e:
+            outputs[i] = (None, f"Prediction error: {str(e)}")
+            continue
+        rows.append(features_scaled)
+        anchors.append(anchor_price)
+        keys.append(result_key)
+        ok.append(i)
     
+    if ok:
+        try:
+            X = np.stack(rows)
+            predictions_scaled = run_model(model_key(market, crop, teacher), model, X)[:, :1]
+            predictions = price_scaler.inverse_transform(predictions_scaled)[:, 0]
+            predictions = calibrate_predictions(predictions, anchors)
+            for j, i in enumerate(ok):
+                outputs[i] = (_results.put(keys[j], float(predictions[j])), None)
+        except Exception as e:
+            for i in ok:
+                outputs[i] = (None, f"Prediction error: {str(e)}")
+    
+    return outputs
+
+RECOMMENDATION_PATHS = [os.path.join(MODEL_DIR, 'ensemble_crop_recommendation.pkl'),
+                        os.path.join(MODEL_DIR, 'ensemble_scaler.pkl')]
+RECOMMENDATION_MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
+RECOMMENDATION_CROPS = ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato']
+
+def reset_ensemble_model():
+    """Drop the loaded ensemble so the next load reads the pickles again"""
+    global _ensemble_cache
+    _ensemble_cache = None
+
+def score_crop_recommendations(ensemble_model, ensemble_scaler, months, market_idx):
+    """Crop probabilities for months and RECOMMENDATION_MARKETS indices (len() = any other market)"""
+    # Month followed by one-hot market flags; unknown markets get all zeros
+    market_flags = np.eye(len(RECOMMENDATION_MARKETS) + 1, len(RECOMMENDATION_MARKETS))[market_idx]
+    features = np.column_stack([months, market_flags])
+    crop_probs = ensemble_model.predict_proba(ensemble_scaler.transform(features))
+    return crop_probs[:, :len(RECOMMENDATION_CROPS)]
+
+def build_recommendation_table(_part=None):
+    """Score every market x month once; the model sees nothing else"""
     ensemble_model, ensemble_scaler = load_ensemble_model()
     if ensemble_model is None:
+        return None
+    return ProbabilityTable.build(
+        RECOMMENDATION_MARKETS + [None], RECOMMENDATION_CROPS,
+        lambda m_idx, months: score_crop_recommendations(ensemble_model, ensemble_scaler, months, m_idx))
+
+# Recommendations are served from the precomputed table; rebuilt when the pickles change
+_recommendations = TableSource(RECOMMENDATION_PATHS, build_recommendation_table, reset=reset_ensemble_model)
+
+# Retrained artifacts are swapped into the caches in place (MODEL_RELOAD_INTERVAL_SECONDS, POST /admin/reload)
+hot_reload.register(
+    FAMILY, lambda market, crop, *rest: _load_attention_lstm_from_disk(market, crop, 'teacher' in rest), _recommendations)
+
+def predict_crop_recommendation(market: str, month: int = None):
+    """Predict crop recommendations using ensemble model"""
+    
+    table = _recommendations.get()
+    if table is None:
         return None, "Ensemble model not found"
     
     try:
-        # Create feature vector for prediction
-        features = np.array([[
-            month if month is not None else 6,  # Default to June
-            1 if market == 'davangere' else 0,
-            1 if market == 'gangavathi' else 0,
-            1 if market == 'HBhalli' else 0,
-            1 if market == 'hospet' else 0
-        ]])
-        
-        # Scale features
-        features_scaled = ensemble_scaler.transform(features)
-        
-        # Make prediction
-        prediction = ensemble_model.predict(features_scaled)[0]
-        
-        # Get crop probabilities
-        crop_probs = ensemble_model.predict_proba(features_scaled)[0]
-        
-        # Map to crop names
-        crop_names = ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato']
-        recommendations = []
-        
-        for i, prob in enumerate(crop_probs):
-            if i < len(crop_names):
-                recommendations.append({
-                    'crop': crop_names[i],
-                    'probability': float(prob),
-                    'confidence': 'High' if prob > 0.7 else 'Medium' if prob > 0.4 else 'Low'
-                })
+        if month is None:
+            month = 6  # Default to June
+        table_market = market if market in RECOMMENDATION_MARKETS else None
+        cell = table.lookup(table_market, month) if isinstance(month, int) else None
+        if cell is None:
+            # Off the precomputed grid: score this one row directly
+            ensemble_model, ensemble_scaler = load_ensemble_model()
+            m_idx = RECOMMENDATION_MARKETS.index(table_market) if table_market else len(RECOMMENDATION_MARKETS)
+            crop_probs = score_crop_recommendations(ensemble_model, ensemble_scaler, [month], [m_idx])[0]
+            order = np.argsort(-crop_probs, kind='stable')
+            cell = ([RECOMMENDATION_CROPS[i] for i in order], crop_probs[order].tolist())
         
-        # Sort by probability
-        recommendations.sort(key=lambda x: x['probability'], reverse=True)
+        # Sorted by probability
+        recommendations = [{
+            'crop': str(crop),
+            'probability': float(prob),
+            'confidence': 'High' if prob > 0.7 else 'Medium' if prob > 0.4 else 'Low'
+        } for crop, prob in zip(*cell)]
         
         return recommendations, None
         
@@ -321,9 +387,10 @@ def predict():
         task = data.get('task', 'price_forecast')
         market = data.get('market', '').lower()
         crop = data.get('crop', '')
-        history = data.get('history', [])
         anchor_price = data.get('anchor_price')
         month = data.get('month')
+        # The distilled student serves by default; "teacher": true asks for the full attention model
+        teacher = bool(data.get('teacher', False))
         
         if not market:
             return jsonify({'error': 'Market is required'}), 400
@@ -337,14 +404,43 @@ def predict():
         if task == 'price_forecast' and crop not in MARKET_CROPS[market]:
             return jsonify({'error': 'Invalid crop for this market'}), 400
         
+        if task == 'price_forecast' and not registry.artifacts.trained(market, crop, CHAIN_VARIANTS):
+            return jsonify({'error': f'No trained model for {market}-{crop}'}), 404
+        
+        # Without a "history" the newest stored prices are used (price_store.py)
+        history = price_store.request_history(data, market, crop, SEQ_LENGTH) if task == 'price_forecast' else None
+        if task == 'price_forecast' and history is None:
+            return jsonify(price_store.missing_history(market, crop)), 404
+        
+        if task == 'price_forecast' and data.get('horizon') is not None:
+            try:
+                horizon, scenarios = parse_horizon(data)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            series, error = predict_price_attention_horizon(market, crop, history, anchor_price, horizon, scenarios,
+                                                            teacher)
+            if error:
+                return jsonify({'error': error}), 500
+            
+            return jsonify({
+                'prediction': series['predictions'][0],
+                'horizon': horizon,
+                'scenarios': scenarios,
+                **series,
+                'model_type': served_model_type(market, crop, teacher),
+                'confidence': 'high',
+                'market': market,
+                'crop': crop
+            })
+        
         if task == 'price_forecast':
-            prediction, error = predict_price_attention(market, crop, history, anchor_price)
+            prediction, error = predict_price_attention(market, crop, history, anchor_price, teacher)
             if error:
                 return jsonify({'error': error}), 500
             
             return jsonify({
                 'prediction': float(prediction),
-                'model_type': 'attention_lstm',
+                'model_type': served_model_type(market, crop, teacher),
                 'confidence': 'high',
                 'market': market,
                 'crop': crop
@@ -368,6 +464,85 @@ def predict():
     except Exception as e:
         return jsonify({'error': f'Server error: {str(e)}'}), 500
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Batched price forecasts: one forward pass per loaded model"""
+    try:
+        data = request.get_json()
+        if not data:
+            return jsonify({'error': 'No data provided'}), 400
+        
+        jobs = data.get('jobs')
+        if not isinstance(jobs, list) or not jobs:
+            return jsonify({'error': 'Jobs are required'}), 400
+        if len(jobs) > MAX_BATCH_JOBS:
+            return jsonify({'error': f'Too many jobs (max {MAX_BATCH_JOBS})'}), 400
+        
+        results = [None] * len(jobs)
+        groups = {}
+        for i, job in enumerate(jobs):
+            job = job if isinstance(job, dict) else {}
+            market = (job.get('market') or '').lower()
+            crop = job.get('crop', '')
+            if not market or market not in MARKET_CROPS:
+                results[i] = {'index': i, 'error': 'Invalid market'}
+            elif not crop or crop not in MARKET_CROPS[market]:
+                results[i] = {'index': i, 'error': 'Invalid crop for this market'}
+            elif not registry.artifacts.trained(market, crop, CHAIN_VARIANTS):
+                results[i] = {'index': i, 'error': f'No trained model for {market}-{crop}'}
+            elif price_store.request_history(job, market, crop, SEQ_LENGTH) is None:
+                results[i] = {'index': i, **price_store.missing_history(market, crop)}
+            else:
+                groups.setdefault((market, crop, bool(job.get('teacher', False))), []).append(i)
+        
+        for (market, crop, teacher), indices in groups.items():
+            outputs = predict_price_attention_batch(market, crop, [jobs[i] for i in indices], teacher)
+            model_type = served_model_type(market, crop, teacher)
+            for i, (prediction, error) in zip(indices, outputs):
+                if error:
+                    results[i] = {'index': i, 'market': market, 'crop': crop, 'error': error}
+                else:
+                    results[i] = {
+                        'index': i,
+                        'prediction': float(prediction),
+                        'model_type': model_type,
+                        'confidence': 'high',
+                        'market': market,
+                        'crop': crop
+                    }
+        
+        return jsonify({'results': results})
+    
+    except Exception as e:
+        return jsonify({'error': f'Server error: {str(e)}'}), 500
+
+def preload_tasks():
+    """One loading task per trained market-crop pair plus the ensemble recommender"""
+    tasks = {}
+    for market, crops in registry.artifacts.market_crops(CHAIN_VARIANTS, MARKET_CROPS).items():
+        for crop in crops:
+            tasks[f'{market}-{crop}'] = lambda m=market, c=crop: load_attention_lstm_model_and_scaler(m, c)[0] is not None
+    tasks['ensemble_crop_recommendation'] = lambda: _recommendations.get() is not None
+    return tasks
+
+# Eager, parallel warm-up at worker start (PRELOAD_MODELS=1, family listed in PRELOAD_VARIANTS)
+_preloader = Preloader(preload_tasks()).start() if PRELOAD_MODELS and FAMILY in registry.PRELOAD_VARIANTS else None
+
+# Price series for forecasts that omit "history", kept in memory and re-read when a CSV changes
+price_store.preload(MARKET_CROPS)
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until every artifact has been loaded and warmed"""
+    if _preloader is None:
+        return jsonify({
+            'ready': True,
+            'preload': False,
+            'loaded': sorted(registry.label(key) for key, _ in registry.family_items(FAMILY))
+        })
+    report = _preloader.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
 @app.route('/health', methods=['GET'])
 def health():
     """Health check endpoint"""
@@ -377,6 +552,25 @@ def health():
         'version': '2.0'
     })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Inference metrics endpoint"""
+    return jsonify({
+        'coalescer': _batcher.stats() if _batcher is not None else None,
+        'retraces': {registry.label(key): entry[0].retraces for key, entry in registry.family_items(FAMILY)},
+        'model_cache': _attention_lstm_cache.stats(),
+        'result_cache': _results.stats(),
+        'recommendation_table': _recommendations.stats(),
+        'hot_reload': hot_reload.stats(),
+        'price_store': price_store.store.stats()
+    })
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload retrained artifacts without a restart (hot_reload.py); needs the X-Admin-Token header"""
+    body, status = hot_reload.handle(request.headers.get('X-Admin-Token'), request.get_json(silent=True), [FAMILY])
+    return jsonify(body), status
+
 if __name__ == '__main__':
     print("Starting Attention-Enhanced LSTM API Server...")
     print("=" * 50)
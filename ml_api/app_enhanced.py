@@ -2,10 +2,19 @@ from flask import Flask, request, jsonify
 import os
 import joblib
 import numpy as np
-import pandas as pd
 from datetime import datetime
-from tensorflow.keras.models import load_model
 from sklearn.preprocessing import StandardScaler
+import registry
+import hot_reload
+import price_store
+from backends import load_artifact
+from affine_scaler import fuse_scalers
+from bundle import load_scalers
+from preload import PRELOAD_MODELS, Preloader
+from result_cache import ResultCache, artifact_version
+from recommend_table import ProbabilityTable, TableSource
+from features import build_enhanced_features
+from horizon import parse_horizon, rollout, direct_path, interval_bounds, artifact_horizons
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -16,6 +25,11 @@ SEQ_LENGTH = 60  # Enhanced sequence length
 
 CALIBRATION_ALPHA = float(os.environ.get('CALIBRATION_ALPHA', '0.7'))  # Increased confidence in model
 CLAMP_PCT = float(os.environ.get('CLAMP_PCT', '0.1'))  # Tighter bounds
+MAX_BATCH_JOBS = int(os.environ.get('MAX_BATCH_JOBS', '64'))
+# Opt-in MC-dropout uncertainty for one-step forecasts ("uncertainty": true): samples per forecast, reported quantiles
+MC_DROPOUT_SAMPLES = int(os.environ.get('MC_DROPOUT_SAMPLES', '50'))
+MAX_MC_DROPOUT_SAMPLES = int(os.environ.get('MAX_MC_DROPOUT_SAMPLES', '500'))
+MC_QUANTILES = [float(q) for q in os.environ.get('MC_QUANTILES', '0.05,0.5,0.95').split(',')]
 
 MARKET_CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -24,55 +38,102 @@ MARKET_CROPS = {
     'hospet': ['Maize', 'Ragi', 'Rice', 'Tomato']
 }
 
-# Enhanced caches
-_lstm_cache = {}
+# Family name that prefixes this app's keys in the shared registry (registry.py)
+FAMILY = 'enhanced'
+
+# Enhanced caches; LSTMs share the registry's MODEL_CACHE_MAX_MB / MODEL_CACHE_TTL_SECONDS budget
+_lstm_cache = registry.models
 _xgb_cache = None
 _ensemble_cache = None
 
+# Forecast responses keyed by input fingerprint and model artifact version
+_results = registry.results
 
-def _ensure_price_scaler(obj):
-    """Handle both old and new scaler formats"""
-    if isinstance(obj, dict) and 'price_scaler' in obj:
-        return obj['price_scaler']
-    return obj
+# Optional micro-batching of concurrent single-row forecasts (COALESCE_WINDOW_MS > 0)
+_batcher = registry.batcher
 
 
-def load_enhanced_lstm_model_and_scaler(market: str, crop: str):
-    """Load enhanced LSTM model with advanced architecture"""
-    key = (market, crop)
-    if key in _lstm_cache:
-        return _lstm_cache[key]
-    
-    # Try enhanced model first, fallback to regular model
-    model_paths = [
-        f'lstm_enhanced_{market}_{crop}.keras',
-        f'lstm_{market}_{crop}.keras'
-    ]
+def load_enhanced_lstm_model_and_scaler(market: str, crop: str, mc: bool = False):
+    """Load enhanced LSTM model with advanced architecture
     
-    scaler_paths = [
-        f'lstm_enhanced_{market}_{crop}_scaler.pkl',
-        f'lstm_{market}_{crop}_scaler.pkl'
+    ``mc`` loads the Keras training graph, which keeps its dropout, for
+    MC-dropout uncertainty; it is cached apart from the served model.
+    Single-flight: concurrent cold requests share one load, and missing or
+    failed pairs are negatively cached for MODEL_CACHE_NEGATIVE_TTL_SECONDS.
+    """
+    key = (FAMILY, market, crop, 'mc') if mc else (FAMILY, market, crop)
+    cached = _lstm_cache.get_or_load(key, lambda: _load_enhanced_lstm_from_disk(market, crop, mc))
+    return cached if cached is not None else (None, None)
+
+
+def training_graph(stem):
+    """(Keras model path, scaler path) as saved by training, before export or optimize_graph.py; or None"""
+    if not registry.artifacts.has(stem) or not registry.artifacts.exists(f'{stem}_scaler.pkl'):
+        return None
+    for suffix in ('.keras', '.h5'):
+        if registry.artifacts.exists(stem + suffix):
+            return stem + suffix, f'{stem}_scaler.pkl'
+    return None
+
+
+def _load_enhanced_lstm_from_disk(market: str, crop: str, mc: bool = False):
+    """Load the first available model/scaler pair from the fallback chain, or None"""
+    # Try enhanced model first, fallback to regular model (in the INFERENCE_BACKEND format when exported);
+    # only models listed in the manifest index (registry.artifacts) are candidates
+    find = training_graph if mc else registry.artifacts.servable
+    candidates = [
+        find(f'lstm_enhanced_{market}_{crop}'),
+        find(f'lstm_{market}_{crop}')
     ]
     
     model = None
     scalers = None
     
-    for model_path, scaler_path in zip(model_paths, scaler_paths):
-        if os.path.exists(model_path) and os.path.exists(scaler_path):
-            try:
-                model = load_model(model_path, compile=False)
-                scalers = joblib.load(scaler_path)
-                print(f"Loaded enhanced model: {model_path}")
-                break
-            except Exception as e:
-                print(f"Error loading {model_path}: {e}")
-                continue
+    for model_path, scaler_path in filter(None, candidates):
+        try:
+            model = load_artifact(model_path)
+            scalers = load_scalers(scaler_path)
+            model.horizons = artifact_horizons(scalers)
+            # (price scaler, fused row scaler) as precomputed arrays; same outputs as sklearn, no per-call validation
+            scalers = fuse_scalers(scalers, model.input_shape[-1])
+            print(f"Loaded enhanced model: {model_path}")
+            # Forecasts are keyed by the version of the model that produced them (hot_reload.py swaps models)
+            model.sources = (model_path, scaler_path)
+            model.version = artifact_version(*model.sources)
+            # A (re)load invalidates forecasts produced by any previous version
+            _results.invalidate(FAMILY, market, crop)
+            break
+        except Exception as e:
+            print(f"Error loading {model_path}: {e}")
+            continue
     
     if model is not None and scalers is not None:
-        _lstm_cache[key] = (model, scalers)
         return model, scalers
     
-    return None, None
+    return None
+
+
+def run_model(key, model, X):
+    """Run the model, coalescing concurrent single rows when batching is enabled"""
+    if _batcher is not None and len(X) == 1:
+        # Rows only share a batch with rows for the same model version (hot_reload.py swaps models)
+        return _batcher.submit(key + (model.version,), model, X[0])[np.newaxis]
+    return model(X)
+
+
+RECOMMENDATION_PATHS = [
+    'xgb_enhanced_crop_recommendation.pkl', 'ensemble_crop_recommendation.pkl', 'ensemble_scaler.pkl',
+    'xgb_le_market.pkl', 'xgb_le_crop.pkl', 'feature_selector.pkl', 'selected_features.pkl',
+    'xgb_crop_recommendation.pkl'
+]
+
+RECOMMENDATION_FEATURES = [
+    'market_enc', 'year', 'month', 'day', 'day_of_year', 'week_of_year', 
+    'quarter', 'is_month_start', 'is_month_end', 'price', 'price_ma_7', 
+    'price_ma_30', 'price_std_7', 'price_std_30', 'price_min_7', 
+    'price_max_7', 'price_range_7', 'price_volatility', 'price_momentum', 
+    'price_change_pct', 'market_volume', 'price_trend'
+]
 
 
 def load_enhanced_xgb():
@@ -114,6 +175,13 @@ def load_enhanced_xgb():
             return None, None
 
 
+def reset_enhanced_xgb():
+    """Drop loaded recommendation models so the next load reads the pickles again"""
+    global _xgb_cache, _ensemble_cache
+    _xgb_cache = None
+    _ensemble_cache = None
+
+
 def pad_or_truncate_history(history):
     """Enhanced sequence padding with better handling"""
     arr = list(map(float, history))
@@ -156,96 +224,101 @@ def get_anchor(anchor_price, last_price):
         return float(last_price)
 
 
-def build_enhanced_lstm_features(prices_scaled):
-    """Build enhanced features for LSTM prediction matching training"""
-    p = prices_scaled.flatten()
-    
-    def roll_mean(x, w):
-        return np.convolve(x, np.ones(w)/w, mode='same')
-    
-    def roll_std(x, w):
-        result = np.zeros_like(x)
-        for i in range(len(x)):
-            start = max(0, i - w + 1)
-            result[i] = np.std(x[start:i+1])
-        return result
-    
-    def roll_min(x, w):
-        result = np.zeros_like(x)
-        for i in range(len(x)):
-            start = max(0, i - w + 1)
-            result[i] = np.min(x[start:i+1])
-        return result
-    
-    def roll_max(x, w):
-        result = np.zeros_like(x)
-        for i in range(len(x)):
-            start = max(0, i - w + 1)
-            result[i] = np.max(x[start:i+1])
-        return result
-    
-    # Multiple time windows for moving averages
-    ma_windows = [3, 7, 14, 21, 30, 45, 60]
-    ma_features = []
-    for w in ma_windows:
-        if w <= len(p):
-            ma_features.append(roll_mean(p, w))
-    
-    # Multiple time windows for standard deviation
-    std_windows = [7, 14, 21, 30]
-    std_features = []
-    for w in std_windows:
-        if w <= len(p):
-            std_features.append(roll_std(p, w))
-    
-    # Min/Max features
-    min_features = [roll_min(p, 7), roll_min(p, 14), roll_min(p, 30)]
-    max_features = [roll_max(p, 7), roll_max(p, 14), roll_max(p, 30)]
-    
-    # Price ratios and relative positions
-    eps = 1e-6
-    price_ratios = []
-    for i, ma in enumerate(ma_features[:4]):  # Use first 4 MA features
-        price_ratios.append(p / (ma + eps))
-    
-    # Volatility features
-    volatility_features = []
-    for std in std_features:
-        volatility_features.append(std / (roll_mean(p, 14) + eps))
-    
-    # Trend features
-    trend_features = np.zeros_like(p)
-    for i in range(1, len(p)):
-        trend_features[i] = p[i] - p[i-1]
-    
-    # Momentum features
-    momentum_features = []
-    for w in [3, 7, 14]:
-        if w <= len(p):
-            momentum = np.zeros_like(p)
-            for i in range(w, len(p)):
-                momentum[i] = p[i] - p[i-w]
-            momentum_features.append(momentum)
-    
-    # Price position within recent range
-    range_position = []
-    for w in [7, 14, 30]:
-        if w <= len(p):
-            min_vals = roll_min(p, w)
-            max_vals = roll_max(p, w)
-            pos = (p - min_vals) / (max_vals - min_vals + eps)
-            range_position.append(pos)
-    
-    # Combine all features
-    all_features = [p] + ma_features + std_features + min_features + max_features + \
-                   price_ratios + volatility_features + [trend_features] + \
-                   momentum_features + range_position
-    
-    # Ensure all features have the same length
-    min_length = min(len(f) for f in all_features if len(f) > 0)
-    features_array = np.column_stack([f[:min_length] for f in all_features])
-    
-    return features_array
+def encode_windows(prices, price_scaler, input_scaler, last=False):
+    """Scale (K, L) raw price windows into (K, L, F) model rows, or only the newest (K, 1, F) with last=True"""
+    if input_scaler is None:
+        newest = prices[:, -1:] if last else prices
+        return price_scaler.transform(newest)[..., np.newaxis]
+    # As in training: features from raw prices with column 0 scaled as the price; input_scaler
+    # (affine_scaler.fuse_columns) does both in one step
+    return input_scaler.transform(build_enhanced_features(prices, last=last))
+
+
+def build_model_input(seq, price_scaler, input_scaler):
+    """Scale a padded price sequence into a (SEQ_LENGTH, F) model input"""
+    return encode_windows(seq.T, price_scaler, input_scaler)[0]
+
+
+def forecast_horizon(market, crop, model, scalers, seq, anchor_price, confidence, horizon, scenarios):
+    """Multi-day path: one forward pass with multi-horizon heads, else one batched pass per day"""
+    anchor = get_anchor(anchor_price, seq.flatten())
+    price_scaler, input_scaler = scalers
+    if scenarios == 0 and 1 < horizon <= model.horizons[-1]:
+        X = encode_windows(seq.T, price_scaler, input_scaler)
+        preds = price_scaler.inverse_transform(run_model((FAMILY, market, crop), model, X).reshape(-1, 1)).reshape(1, -1)
+        paths = direct_path(preds, model.horizons, float(seq[-1][0]), horizon)
+    else:
+        paths = rollout(
+            lambda X: price_scaler.inverse_transform(run_model((FAMILY, market, crop), model, X)[:, :1])[:, 0],
+            lambda prices, last: encode_windows(prices, price_scaler, input_scaler, last),
+            seq, horizon, scenarios)
+    central, lower, upper = interval_bounds(paths, seq, lambda p: calibrate(p, anchor, confidence)[0])
+    return {
+        'forecast': float(central[0]),
+        'model_pred': float(paths[0, 0]),
+        'anchor_price': float(anchor),
+        'last_price': float(seq[-1][0]),
+        'confidence': float(min(0.95, confidence * CALIBRATION_ALPHA)),
+        'horizon': horizon,
+        'scenarios': scenarios,
+        'predictions': central.tolist(),
+        'lower': lower.tolist(),
+        'upper': upper.tolist(),
+        'enhanced': True
+    }
+
+
+def forecast_key(model, market, crop, seq, anchor_price, history_len, *extra):
+    """Result-cache key; raw history length matters because it sets the confidence"""
+    return ResultCache.make_key(FAMILY, market, crop, seq, anchor_price, model.version, min(history_len, SEQ_LENGTH),
+                                *extra)
+
+
+def blend(model_preds, anchors, confidences):
+    """Confidence-weighted blend of model predictions and anchors, before the clamp"""
+    weight = CALIBRATION_ALPHA * confidences
+    return weight * model_preds + (1.0 - weight) * anchors
+
+
+def calibrate(model_preds, anchors, confidences):
+    """Vectorised confidence-weighted blend and clamp; returns (blended, lo, hi)"""
+    model_preds = np.asarray(model_preds, dtype=float)
+    anchors = np.asarray(anchors, dtype=float)
+    confidences = np.asarray(confidences, dtype=float)
+    blended = blend(model_preds, anchors, confidences)
+    lo = anchors * (1.0 - CLAMP_PCT * confidences)
+    hi = anchors * (1.0 + CLAMP_PCT * confidences)
+    return np.clip(blended, lo, hi), lo, hi
+
+
+def parse_mc_samples(data):
+    """MC-dropout sample count for a request body, or 0 when uncertainty was not asked for"""
+    if not data.get('uncertainty'):
+        return 0
+    try:
+        samples = int(data.get('samples') or MC_DROPOUT_SAMPLES)
+    except (TypeError, ValueError):
+        raise ValueError('samples must be an integer')
+    if not 2 <= samples <= MAX_MC_DROPOUT_SAMPLES:
+        raise ValueError(f'samples must be between 2 and {MAX_MC_DROPOUT_SAMPLES}')
+    return samples
+
+
+def mc_dropout_quantiles(market, crop, seq, anchor, confidence, samples):
+    """Quantiles of ``samples`` dropout-perturbed one-step forecasts from one batched forward pass"""
+    model, scalers = load_enhanced_lstm_model_and_scaler(market, crop, mc=True)
+    if model is None:
+        raise ValueError('no Keras training graph to sample')
+    price_scaler, input_scaler = scalers
+    preds_scaled = model.mc_dropout(build_model_input(seq, price_scaler, input_scaler), samples)
+    preds = blend(price_scaler.inverse_transform(preds_scaled[:, :1])[:, 0], anchor, confidence)
+    return {
+        'method': 'mc_dropout',
+        'samples': samples,
+        'levels': MC_QUANTILES,
+        'quantiles': np.quantile(preds, MC_QUANTILES).tolist(),
+        'std': float(np.std(preds)),
+    }
 
 
 def build_enhanced_features_for_prediction(market, crop, month, year=None):
@@ -286,11 +359,128 @@ def build_enhanced_features_for_prediction(market, crop, month, year=None):
     return features
 
 
+def recommendation_feature_rows(market_names, m_enc, months, year):
+    """(N, len(RECOMMENDATION_FEATURES)) feature rows for encoded markets and months"""
+    rows = []
+    for enc, month in zip(m_enc, months):
+        features = build_enhanced_features_for_prediction(market_names[enc], None, int(month), year)
+        features['market_enc'] = enc
+        rows.append([features[col] for col in RECOMMENDATION_FEATURES])
+    return np.array(rows, dtype=float)
+
+
+def score_enhanced_crops(xgb_data, ensemble_data, xgb_features):
+    """Combined XGBoost/ensemble scores for every crop class, one row per feature row"""
+    xgb_model, le_market, le_crop, feature_selector, selected_features = xgb_data
+    if feature_selector:
+        xgb_features = feature_selector.transform(xgb_features)
+    
+    if hasattr(xgb_model, 'predict_proba'):
+        xgb_proba = xgb_model.predict_proba(xgb_features)
+    else:
+        xgb_pred = np.asarray(xgb_model.predict(xgb_features), dtype=int)
+        xgb_proba = 0.8 * np.eye(len(le_crop.classes_))[xgb_pred]  # Default confidence
+    
+    if ensemble_data is None:
+        return xgb_proba
+    
+    ensemble_models, ensemble_scaler = ensemble_data
+    
+    # Scale features for ensemble
+    ensemble_features = ensemble_scaler.transform(xgb_features)
+    
+    # Get ensemble predictions
+    ensemble_probabilities = []
+    for name, model in ensemble_models.items():
+        if name in ['svm', 'lr']:
+            prob = model.predict_proba(ensemble_features)
+        else:
+            prob = model.predict_proba(xgb_features)
+        ensemble_probabilities.append(prob)
+    
+    # Weighted ensemble
+    weights = [0.3, 0.25, 0.2, 0.15, 0.1]  # XGB, RF, GB, SVM, LR
+    ensemble_probs = np.zeros_like(ensemble_probabilities[0])
+    for i, prob in enumerate(ensemble_probabilities):
+        ensemble_probs += weights[i] * prob
+    
+    # Combine XGBoost and ensemble results
+    return 0.6 * xgb_proba + 0.4 * ensemble_probs
+
+
+def build_recommendation_table(year):
+    """Score every market x month for one year in a single batched pass"""
+    xgb_data, ensemble_data = load_enhanced_xgb()
+    if xgb_data is None:
+        return None
+    le_market, le_crop = xgb_data[1], xgb_data[2]
+    markets = le_market.classes_
+    return ProbabilityTable.build(
+        markets, le_crop.classes_,
+        lambda m_idx, months: score_enhanced_crops(
+            xgb_data, ensemble_data, recommendation_feature_rows(markets, m_idx, months, year)))
+
+
+# Recommendations are served from per-year precomputed tables; rebuilt when the pickles change
+_recommendations = TableSource(RECOMMENDATION_PATHS, build_recommendation_table, reset=reset_enhanced_xgb)
+
+# Retrained artifacts are swapped into the caches in place (MODEL_RELOAD_INTERVAL_SECONDS, POST /admin/reload)
+hot_reload.register(
+    FAMILY, lambda market, crop, *rest: _load_enhanced_lstm_from_disk(market, crop, 'mc' in rest), _recommendations)
+
+
+def preload_tasks():
+    """One loading task per trained market-crop pair plus the recommendation models"""
+    tasks = {}
+    for market, crops in registry.artifacts.market_crops(('enhanced', 'baseline'), MARKET_CROPS).items():
+        for crop in crops:
+            tasks[f'{market}-{crop}'] = lambda m=market, c=crop: load_enhanced_lstm_model_and_scaler(m, c)[0] is not None
+    tasks['xgb_enhanced_crop_recommendation'] = lambda: _recommendations.get(datetime.utcnow().year) is not None
+    return tasks
+
+
+# Eager, parallel warm-up at worker start (PRELOAD_MODELS=1, family listed in PRELOAD_VARIANTS)
+_preloader = Preloader(preload_tasks()).start() if PRELOAD_MODELS and FAMILY in registry.PRELOAD_VARIANTS else None
+
+# Price series for forecasts that omit "history", kept in memory and re-read when a CSV changes
+price_store.preload(MARKET_CROPS)
+
+
 @app.route('/health', methods=['GET'])
 def health():
     return jsonify({'status': 'ok', 'enhanced': True})
 
 
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until every artifact has been loaded and warmed"""
+    if _preloader is None:
+        return jsonify({'ready': True, 'preload': False,
+                        'loaded': sorted(registry.label(key) for key, _ in registry.family_items(FAMILY))})
+    report = _preloader.report()
+    return jsonify(report), 200 if report['ready'] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'coalescer': _batcher.stats() if _batcher is not None else None,
+        'retraces': {registry.label(key): model.retraces for key, (model, _) in registry.family_items(FAMILY)},
+        'model_cache': _lstm_cache.stats(),
+        'result_cache': _results.stats(),
+        'recommendation_table': _recommendations.stats(),
+        'hot_reload': hot_reload.stats(),
+        'price_store': price_store.store.stats(),
+    })
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload retrained artifacts without a restart (hot_reload.py); needs the X-Admin-Token header"""
+    body, status = hot_reload.handle(request.headers.get('X-Admin-Token'), request.get_json(silent=True), [FAMILY])
+    return jsonify(body), status
+
+
 @app.route('/predict', methods=['POST'])
 def predict():
     """Enhanced prediction endpoint with ensemble methods"""
@@ -300,72 +490,67 @@ def predict():
     if task == 'price_forecast':
         market = data.get('market')
         crop = data.get('crop')
-        history = data.get('history') or []
         anchor_price = data.get('anchor_price')
         
         if not (market and crop):
             return jsonify({'error': 'Missing market or crop'}), 400
+        try:
+            horizon = parse_horizon(data)
+            samples = parse_mc_samples(data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
         
         # Load enhanced LSTM model
         model, scalers = load_enhanced_lstm_model_and_scaler(market, crop)
         if model is None or scalers is None:
             return jsonify({'error': f'Enhanced model for {market}-{crop} not found'}), 404
+        # Without a "history" the newest stored prices are used (price_store.py)
+        history = price_store.request_history(data, market, crop, SEQ_LENGTH)
+        if history is None:
+            return jsonify(price_store.missing_history(market, crop)), 404
         
         # Enhanced sequence preparation
         seq = pad_or_truncate_history(history)
+        if horizon is not None:
+            result_key = forecast_key(model, market, crop, seq, anchor_price, len(history), *horizon)
+            cached = _results.get(result_key)
+            if cached is None:
+                confidence = min(1.0, len(history) / SEQ_LENGTH)
+                try:
+                    cached = _results.put(result_key, forecast_horizon(
+                        market, crop, model, scalers, seq, anchor_price, confidence, *horizon))
+                except Exception as e:
+                    print(f"Prediction failed: {e}")
+                    return jsonify({'error': 'Prediction failed'}), 500
+            return jsonify(cached)
+        mc = ('mc', samples) if samples else ()
+        result_key = forecast_key(model, market, crop, seq, anchor_price, len(history), *mc)
+        cached = _results.get(result_key)
+        if cached is not None:
+            return jsonify(cached)
         last_price = float(seq[-1][0])
         anchor = get_anchor(anchor_price, seq.flatten())
         
         # Use enhanced scalers
-        if isinstance(scalers, dict):
-            price_scaler = scalers['price_scaler']
-            feature_scaler = scalers.get('feature_scaler')
-        else:
-            price_scaler = _ensure_price_scaler(scalers)
-            feature_scaler = None
+        price_scaler, input_scaler = scalers
         
-        # Enhanced prediction with multiple attempts
-        predictions = []
-        for _ in range(3):  # Multiple predictions for stability
-            try:
-                input_scaled = price_scaler.transform(seq)
-                
-                # If we have feature scaler, use enhanced features
-                if feature_scaler is not None:
-                    # Build enhanced features matching training
-                    enhanced_features = build_enhanced_lstm_features(input_scaled)
-                    enhanced_features = feature_scaler.transform(enhanced_features)
-                    X_pred = enhanced_features.reshape(1, SEQ_LENGTH, enhanced_features.shape[1])
-                else:
-                    X_pred = input_scaled.reshape(1, SEQ_LENGTH, 1)
-                
-                pred_scaled = model.predict(X_pred, verbose=0)
-                model_pred = float(price_scaler.inverse_transform(pred_scaled)[0][0])
-                predictions.append(model_pred)
-                
-            except Exception as e:
-                print(f"Prediction attempt failed: {e}")
-                continue
-        
-        if not predictions:
+        # Dropout is off at inference, so one forward pass is the model's prediction
+        try:
+            X_pred = build_model_input(seq, price_scaler, input_scaler)[np.newaxis]
+            pred_scaled = run_model((FAMILY, market, crop), model, X_pred)
+            model_pred = float(price_scaler.inverse_transform(pred_scaled[:, :1])[0][0])
+        except Exception as e:
+            print(f"Prediction failed: {e}")
             return jsonify({'error': 'Prediction failed'}), 500
         
-        # Use median prediction for stability
-        model_pred = np.median(predictions)
-        
-        # Enhanced blending with confidence weighting
+        # Enhanced blending with confidence weighting; tighter bounds with confidence
         confidence = min(1.0, len(history) / SEQ_LENGTH)  # Higher confidence with more history
-        blended = CALIBRATION_ALPHA * confidence * model_pred + (1.0 - CALIBRATION_ALPHA * confidence) * anchor
-        
-        # Tighter bounds with confidence
-        lo = anchor * (1.0 - CLAMP_PCT * confidence)
-        hi = anchor * (1.0 + CLAMP_PCT * confidence)
-        blended = max(lo, min(hi, blended))
+        blended, lo, hi = calibrate(model_pred, anchor, confidence)
         
         # Add confidence score
         confidence_score = min(0.95, confidence * CALIBRATION_ALPHA)
         
-        return jsonify({
+        result = {
             'forecast': float(blended),
             'model_pred': float(model_pred),
             'anchor_price': float(anchor),
@@ -373,7 +558,17 @@ def predict():
             'confidence': float(confidence_score),
             'prediction_range': [float(lo), float(hi)],
             'enhanced': True
-        })
+        }
+        if samples:
+            # Empirical quantiles of blended MC-dropout samples replace the clamp bounds
+            try:
+                uncertainty = mc_dropout_quantiles(market, crop, seq, anchor, confidence, samples)
+            except ValueError as e:
+                return jsonify({'error': f'Uncertainty not available for {market}-{crop}: {e}'}), 400
+            result['prediction_range'] = [uncertainty['quantiles'][0], uncertainty['quantiles'][-1]]
+            result['uncertainty'] = uncertainty
+        
+        return jsonify(_results.put(result_key, result))
 
     elif task == 'crop_recommendation':
         """Enhanced crop recommendation with ensemble methods"""
@@ -398,100 +593,26 @@ def predict():
             month = month or datetime.utcnow().month
             year = datetime.utcnow().year
         
-        # Load enhanced models
-        xgb_data, ensemble_data = load_enhanced_xgb()
-        if xgb_data is None:
-            return jsonify({'error': 'Enhanced recommendation models not available'}), 500
-        
-        xgb_model, le_market, le_crop, feature_selector, selected_features = xgb_data
-        
         try:
-            # Build enhanced features
-            features = build_enhanced_features_for_prediction(market, crop, month, year)
+            month = int(month)
+            table = _recommendations.get(year)
+            if table is None:
+                return jsonify({'error': 'Enhanced recommendation models not available'}), 500
             
-            # Encode market
-            try:
-                m_enc = le_market.transform([market])[0]
-                features['market_enc'] = m_enc
-            except Exception:
+            if market not in table:
                 return jsonify({'error': f'Unknown market: {market}'}), 400
             
-            # Prepare feature vector with all training features
-            feature_columns = [
-                'market_enc', 'year', 'month', 'day', 'day_of_year', 'week_of_year', 
-                'quarter', 'is_month_start', 'is_month_end', 'price', 'price_ma_7', 
-                'price_ma_30', 'price_std_7', 'price_std_30', 'price_min_7', 
-                'price_max_7', 'price_range_7', 'price_volatility', 'price_momentum', 
-                'price_change_pct', 'market_volume', 'price_trend'
-            ]
-            
-            feature_vector = [features[col] for col in feature_columns]
-            
-            # XGBoost prediction
-            xgb_features = np.array([feature_vector])
-            if feature_selector:
-                xgb_features = feature_selector.transform(xgb_features)
-            
-            if hasattr(xgb_model, 'predict_proba'):
-                xgb_proba = xgb_model.predict_proba(xgb_features)[0]
-                xgb_indices = np.argsort(xgb_proba)[::-1]
-                xgb_crops = le_crop.inverse_transform(xgb_indices)
-                xgb_scores = xgb_proba[xgb_indices]
-            else:
-                xgb_pred = xgb_model.predict(xgb_features)
-                xgb_crops = le_crop.inverse_transform(xgb_pred)
-                xgb_scores = [0.8] * len(xgb_crops)  # Default confidence
-            
-            # Ensemble prediction if available
-            if ensemble_data is not None:
-                ensemble_models, ensemble_scaler = ensemble_data
-                
-                # Scale features for ensemble
-                ensemble_features = ensemble_scaler.transform(xgb_features)
-                
-                # Get ensemble predictions
-                ensemble_predictions = []
-                ensemble_probabilities = []
-                
-                for name, model in ensemble_models.items():
-                    if name in ['svm', 'lr']:
-                        pred = model.predict(ensemble_features)
-                        prob = model.predict_proba(ensemble_features)
-                    else:
-                        pred = model.predict(xgb_features)
-                        prob = model.predict_proba(xgb_features)
-                    
-                    ensemble_predictions.append(pred)
-                    ensemble_probabilities.append(prob)
-                
-                # Weighted ensemble
-                weights = [0.3, 0.25, 0.2, 0.15, 0.1]  # XGB, RF, GB, SVM, LR
-                ensemble_probs = np.zeros_like(ensemble_probabilities[0])
-                for i, prob in enumerate(ensemble_probabilities):
-                    ensemble_probs += weights[i] * prob
-                
-                ensemble_indices = np.argsort(ensemble_probs[0])[::-1]
-                ensemble_crops = le_crop.inverse_transform(ensemble_indices)
-                ensemble_scores = ensemble_probs[0][ensemble_indices]
-                
-                # Combine XGBoost and ensemble results
-                combined_crops = {}
-                for i, crop in enumerate(xgb_crops):
-                    combined_crops[crop] = xgb_scores[i] * 0.6  # XGBoost weight
-                
-                for i, crop in enumerate(ensemble_crops):
-                    if crop in combined_crops:
-                        combined_crops[crop] += ensemble_scores[i] * 0.4  # Ensemble weight
-                    else:
-                        combined_crops[crop] = ensemble_scores[i] * 0.4
-                
-                # Sort by combined scores
-                final_crops = sorted(combined_crops.items(), key=lambda x: x[1], reverse=True)
-                recommended_crops = [crop for crop, score in final_crops]
-                confidence_scores = [score for crop, score in final_crops]
-            else:
-                recommended_crops = xgb_crops
-                confidence_scores = xgb_scores
+            cell = table.lookup(market, month)
+            if cell is None:
+                # Off the precomputed grid: score this one row directly
+                xgb_data, ensemble_data = load_enhanced_xgb()
+                le_market, le_crop = xgb_data[1], xgb_data[2]
+                m_enc = le_market.transform([market])
+                rows = recommendation_feature_rows(le_market.classes_, m_enc, [month], year)
+                scores = score_enhanced_crops(xgb_data, ensemble_data, rows)[0]
+                order = np.argsort(-scores, kind='stable')
+                cell = (list(le_crop.classes_[order]), scores[order].tolist())
+            recommended_crops, confidence_scores = cell
             
             # Filter by market availability
             allowed = MARKET_CROPS.get(market, None)
@@ -513,7 +634,7 @@ def predict():
                 'recommended_crops': recommended_crops[:top_k],
                 'confidence_scores': [float(score) for score in confidence_scores[:top_k]],
                 'enhanced': True,
-                'model_type': 'ensemble' if ensemble_data else 'xgboost'
+                'model_type': 'ensemble' if _ensemble_cache is not None else 'xgboost'
             }
             
             return jsonify(response)
@@ -525,6 +646,90 @@ def predict():
         return jsonify({'error': 'Invalid task'}), 400
 
 
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """Score many price_forecast jobs with one forward pass per loaded model"""
+    data = request.json or {}
+    jobs = data.get('jobs')
+    if not isinstance(jobs, list) or not jobs:
+        return jsonify({'error': 'Missing jobs'}), 400
+    if len(jobs) > MAX_BATCH_JOBS:
+        return jsonify({'error': f'Too many jobs (max {MAX_BATCH_JOBS})'}), 400
+    
+    results = [None] * len(jobs)
+    groups = {}
+    for i, job in enumerate(jobs):
+        job = job if isinstance(job, dict) else {}
+        market = job.get('market')
+        crop = job.get('crop')
+        if not (market and crop):
+            results[i] = {'index': i, 'error': 'Missing market or crop', 'status': 400}
+            continue
+        groups.setdefault((market, crop), []).append(i)
+    
+    for (market, crop), indices in groups.items():
+        model, scalers = load_enhanced_lstm_model_and_scaler(market, crop)
+        if model is None or scalers is None:
+            for i in indices:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Enhanced model for {market}-{crop} not found', 'status': 404}
+            continue
+        price_scaler, input_scaler = scalers
+        
+        # Build every input for this model, then stack into one tensor
+        rows, lasts, anchors, confidences, keys, ok = [], [], [], [], [], []
+        for i in indices:
+            history = price_store.request_history(jobs[i], market, crop, SEQ_LENGTH)
+            if history is None:
+                results[i] = {'index': i, 'market': market, 'crop': crop, **price_store.missing_history(market, crop),
+                              'status': 404}
+                continue
+            try:
+                seq = pad_or_truncate_history(history)
+                result_key = forecast_key(model, market, crop, seq, jobs[i].get('anchor_price'), len(history))
+                cached = _results.get(result_key)
+                if cached is not None:
+                    results[i] = dict(cached, index=i, market=market, crop=crop)
+                    continue
+                rows.append(build_model_input(seq, price_scaler, input_scaler))
+            except Exception as e:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Invalid history: {e}', 'status': 400}
+                continue
+            lasts.append(float(seq[-1][0]))
+            anchors.append(get_anchor(jobs[i].get('anchor_price'), seq.flatten()))
+            confidences.append(min(1.0, len(history) / SEQ_LENGTH))
+            keys.append(result_key)
+            ok.append(i)
+        if not ok:
+            continue
+        
+        try:
+            X_pred = np.stack(rows)
+            pred_scaled = run_model((FAMILY, market, crop), model, X_pred)
+            model_preds = price_scaler.inverse_transform(pred_scaled[:, :1])[:, 0]
+        except Exception as e:
+            for i in ok:
+                results[i] = {'index': i, 'market': market, 'crop': crop,
+                              'error': f'Prediction error: {e}', 'status': 500}
+            continue
+        
+        blended, lo, hi = calibrate(model_preds, anchors, confidences)
+        for j, i in enumerate(ok):
+            result = _results.put(keys[j], {
+                'forecast': float(blended[j]),
+                'model_pred': float(model_preds[j]),
+                'anchor_price': float(anchors[j]),
+                'last_price': lasts[j],
+                'confidence': float(min(0.95, confidences[j] * CALIBRATION_ALPHA)),
+                'prediction_range': [float(lo[j]), float(hi[j])],
+                'enhanced': True
+            })
+            results[i] = dict(result, index=i, market=market, crop=crop)
+    
+    return jsonify({'results': results})
+
+
 if __name__ == '__main__':
     print("Starting Enhanced Crop Advisory API...")
     print("Features: Advanced LSTM + Ensemble XGBoost + Enhanced Feature Engineering")
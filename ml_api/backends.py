@@ -0,0 +1,311 @@
+"""Inference backends for the LSTM model families.
+
+Every backend loads one artifact format and returns an object with the
+``CompiledModel`` interface (``input_shape``, ``horizons``, ``retraces``,
+``warm``, ``predict``, call on a (B, T, F) float32 array):
+
+    keras   .keras/.h5   TensorFlow, traced tf.function (inference.py); an
+                         optimize_graph.py ``.inference.keras`` is preferred
+    tflite  .tflite      TFLite interpreter with the XNNPACK CPU delegate
+    onnx    .onnx        ONNX Runtime, CPU execution provider
+    numpy   .npz         pure NumPy, baseline LSTM/Dense stacks only (numpy_lstm.py)
+    bundle  .bundle      memory-mapped single-file bundle with its scalers (bundle.py)
+
+INFERENCE_BACKEND picks the preferred format; a model without that artifact
+falls back to Keras. QUANTIZED_VARIANT=int8|fp16 serves the quantised
+TFLite variant written by quantize.py ahead of either, but only while its
+measured MAPE increase stays within QUANTIZED_MAPE_TOLERANCE points.
+Runtimes are imported on first use, so a worker that serves only
+.tflite/.onnx/.npz never imports TensorFlow. Convert models and
+report parity, latency and memory per backend with
+
+    python backends.py [--to tflite onnx numpy] [lstm_*.keras ...]
+"""
+import argparse
+import glob
+import json
+import os
+import threading
+import time
+import numpy as np
+from bundle import load_bundle
+from numpy_lstm import export_npz, load_numpy_model
+from optimize_graph import OPTIMIZED_SUFFIX
+
+INFERENCE_BACKEND = os.environ.get('INFERENCE_BACKEND', '')
+# Interpreter / session threads per model (0 lets the runtime decide)
+INFERENCE_THREADS = int(os.environ.get('INFERENCE_THREADS', '0'))
+QUANTIZED_VARIANT = os.environ.get('QUANTIZED_VARIANT', '')
+QUANTIZED_MAPE_TOLERANCE = float(os.environ.get('QUANTIZED_MAPE_TOLERANCE', '0.5'))
+
+
+class TFLiteModel:
+    """TFLite interpreter behind the CompiledModel interface.
+
+    Float models run through the XNNPACK delegate, which the interpreter
+    applies by default on CPU. An interpreter is not thread-safe, so calls
+    are serialised; the input is resized only when the batch size changes.
+    """
+
+    def __init__(self, path, num_threads=INFERENCE_THREADS):
+        self.interpreter = _tflite_interpreter()(model_path=path, num_threads=num_threads or None)
+        inp = self.interpreter.get_input_details()[0]
+        self._input = inp['index']
+        self._output = self.interpreter.get_output_details()[0]['index']
+        self.input_shape = tuple(int(d) for d in inp['shape_signature'][1:])
+        self.horizons = (1,)
+        self.retraces = 0
+        self.nbytes = os.path.getsize(path)
+        self._batch = None
+        self._lock = threading.Lock()
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        with self._lock:
+            if self._batch != len(X):
+                self.interpreter.resize_tensor_input(self._input, X.shape)
+                self.interpreter.allocate_tensors()
+                self._batch = len(X)
+            self.interpreter.set_tensor(self._input, X)
+            self.interpreter.invoke()
+            return self.interpreter.get_tensor(self._output).copy()
+
+    def predict(self, X, verbose=0):
+        return self(X)
+
+    def warm(self, batch_size=1):
+        self(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+        return self
+
+
+def _tflite_interpreter():
+    # Prefer the standalone runtimes; full TensorFlow is the last resort
+    try:
+        from ai_edge_litert.interpreter import Interpreter
+    except ImportError:
+        try:
+            from tflite_runtime.interpreter import Interpreter
+        except ImportError:
+            import tensorflow as tf
+            Interpreter = tf.lite.Interpreter
+    return Interpreter
+
+
+class OnnxModel:
+    """ONNX Runtime session behind the CompiledModel interface (sessions are thread-safe)"""
+
+    def __init__(self, path, num_threads=INFERENCE_THREADS):
+        import onnxruntime as ort
+        options = ort.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.session = ort.InferenceSession(path, options, providers=['CPUExecutionProvider'])
+        inp = self.session.get_inputs()[0]
+        self._input = inp.name
+        self.input_shape = tuple(int(d) for d in inp.shape[1:])
+        self.horizons = (1,)
+        self.retraces = 0
+        self.nbytes = os.path.getsize(path)
+
+    def __call__(self, X):
+        return self.session.run(None, {self._input: np.asarray(X, dtype=np.float32)})[0]
+
+    def predict(self, X, verbose=0):
+        return self(X)
+
+    def warm(self, batch_size=1):
+        self(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+        return self
+
+
+def _load_keras(path):
+    from tensorflow.keras.models import load_model
+    from inference import compile_model
+    return compile_model(load_model(path, compile=False))
+
+
+# name -> (artifact suffixes, loader(path) -> warmed model)
+BACKENDS = {
+    'keras': ((OPTIMIZED_SUFFIX, '.keras', '.h5'), _load_keras),
+    'tflite': (('.tflite',), lambda path: TFLiteModel(path).warm()),
+    'onnx': (('.onnx',), lambda path: OnnxModel(path).warm()),
+    'numpy': (('.npz',), load_numpy_model),
+    'bundle': (('.bundle',), load_bundle),
+}
+
+
+def register_backend(name, suffixes, loader):
+    """Add or replace a backend; ``loader(path)`` returns a warmed model"""
+    BACKENDS[name] = (tuple(suffixes), loader)
+
+
+def variant_paths(stem, variant):
+    """(model path, accuracy report path) of a quantised variant"""
+    return f'{stem}.{variant}.tflite', f'{stem}.{variant}.json'
+
+
+def read_variant_report(stem, variant):
+    """quantize.py's accuracy report for a variant, or None when it has not been evaluated"""
+    try:
+        with open(variant_paths(stem, variant)[1]) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def quantized_artifact(stem, variant=QUANTIZED_VARIANT, tolerance=QUANTIZED_MAPE_TOLERANCE, exists=os.path.exists):
+    """The quantised variant's path when it exists and its MAPE cost is within ``tolerance``, else None"""
+    if not variant:
+        return None
+    path = variant_paths(stem, variant)[0]
+    if not exists(path):
+        return None
+    report = read_variant_report(stem, variant)
+    if report is None or report.get('mape_delta', float('inf')) > tolerance:
+        return None
+    return path
+
+
+def find_artifact(stem, backend=None, exists=os.path.exists):
+    """Path of the artifact to serve for ``stem`` (a model path without extension), or None.
+
+    Tries an accepted quantised variant, then ``backend`` (default
+    INFERENCE_BACKEND, else keras), then Keras. ``exists`` replaces the
+    filesystem check, e.g. with a manifest index lookup (manifest.py).
+    """
+    preferred = backend or INFERENCE_BACKEND or 'keras'
+    if preferred not in BACKENDS:
+        raise ValueError(f'Unknown inference backend {preferred!r}; choose from {sorted(BACKENDS)}')
+    quantized = quantized_artifact(stem, exists=exists)
+    if quantized:
+        return quantized
+    for name in dict.fromkeys((preferred, 'keras')):
+        for suffix in BACKENDS[name][0]:
+            if exists(stem + suffix):
+                return stem + suffix
+    return None
+
+
+def backend_for(path):
+    for name, (suffixes, _) in BACKENDS.items():
+        if path.endswith(suffixes):
+            return name
+    raise ValueError(f'No inference backend serves {path}')
+
+
+def load_artifact(path):
+    """Load and warm a model with the backend that owns its file format"""
+    return BACKENDS[backend_for(path)][1](path)
+
+
+# --- Export ---
+
+def inference_clone(model):
+    """Copy of a Keras model for export: recurrent dropout off and LSTMs/GRUs unrolled.
+
+    Dropout is the identity at inference; removing it and unrolling the fixed
+    length sequences lets converters emit plain builtin ops instead of
+    TensorList loops (which TFLite would need the Flex delegate for).
+    """
+    import tensorflow as tf
+
+    def for_inference(cfg):
+        if 'recurrent_dropout' in cfg:
+            cfg.update(dropout=0.0, recurrent_dropout=0.0, unroll=True)
+        return cfg
+
+    def clone_layer(layer):
+        cfg = layer.get_config()
+        if layer.__class__.__name__ in ('LSTM', 'GRU'):
+            for_inference(cfg)
+        elif layer.__class__.__name__ == 'Bidirectional':
+            for key in ('layer', 'backward_layer'):
+                if cfg.get(key):
+                    for_inference(cfg[key]['config'])
+        return layer.__class__.from_config(cfg)
+
+    clone = tf.keras.models.clone_model(model, clone_function=clone_layer)
+    clone.set_weights(model.get_weights())
+    return clone
+
+
+def export_tflite(model, path):
+    import tensorflow as tf
+    data = tf.lite.TFLiteConverter.from_keras_model(inference_clone(model)).convert()
+    with open(path, 'wb') as f:
+        f.write(data)
+    return path
+
+
+def export_onnx(model, path):
+    import tensorflow as tf
+    import tf2onnx
+    spec = (tf.TensorSpec((None,) + tuple(model.input_shape[1:]), tf.float32, name='input'),)
+    tf2onnx.convert.from_keras(inference_clone(model), input_signature=spec, opset=17, output_path=path)
+    return path
+
+
+EXPORTERS = {'tflite': export_tflite, 'onnx': export_onnx, 'numpy': export_npz}
+
+
+def _rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return 0
+
+
+def _latency_ms(model, X, repeats):
+    model(X)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        model(X)
+    return (time.perf_counter() - t0) / repeats * 1e3
+
+
+def export_and_report(model_path, targets, atol=1e-4, repeats=50, batch=32):
+    """Export one .keras model to each target and print parity, latency and memory per backend.
+
+    An artifact that misses ``atol`` against Keras is deleted so it is never served.
+    """
+    from tensorflow.keras.models import load_model
+    keras_model = load_model(model_path, compile=False)
+    shape = tuple(keras_model.input_shape[1:])
+    X = np.random.default_rng(0).normal(size=(batch,) + shape).astype(np.float32)
+    stem = os.path.splitext(model_path)[0]
+    rows = []
+    for name in ['keras'] + [t for t in targets if t != 'keras']:
+        path = model_path if name == 'keras' else stem + BACKENDS[name][0][0]
+        try:
+            if name != 'keras':
+                EXPORTERS[name](keras_model, path)
+            rss = _rss_bytes()
+            model = load_artifact(path)
+            loaded = _rss_bytes() - rss
+        except (ImportError, ValueError) as e:
+            print(f'  {name:<7} skipped: {e}')
+            continue
+        err = float(np.max(np.abs(model(X) - keras_model(X, training=False).numpy())))
+        if err > atol:
+            print(f'  {name:<7} FAILED parity (max abs diff {err:.2e} > {atol:g}); removed {path}')
+            os.remove(path)
+            continue
+        rows.append((name, err, _latency_ms(model, X[:1], repeats), _latency_ms(model, X, max(1, repeats // 5)),
+                     os.path.getsize(path), loaded))
+    for name, err, single_ms, batch_ms, size, loaded in rows:
+        print(f'  {name:<7} diff {err:.1e}  1 row {single_ms:7.2f} ms  {batch} rows {batch_ms:7.2f} ms  '
+              f'artifact {size / 1e6:6.2f} MB  load RSS {loaded / 1e6:6.1f} MB')
+    return rows
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Export LSTM models to lighter inference backends')
+    parser.add_argument('models', nargs='*', help='.keras files (default: every lstm_*.keras here)')
+    parser.add_argument('--to', nargs='+', default=['tflite', 'onnx', 'numpy'], choices=sorted(EXPORTERS))
+    parser.add_argument('--atol', type=float, default=1e-4, help='max abs difference from Keras')
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+    for model_path in args.models or [p for p in sorted(glob.glob('lstm_*.keras')) if not p.endswith(OPTIMIZED_SUFFIX)]:
+        print(model_path)
+        export_and_report(model_path, args.to, atol=args.atol, repeats=args.repeats)
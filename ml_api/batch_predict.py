@@ -1,13 +1,11 @@
 import os
-import re
 import json
 import csv
-import pandas as pd
 import numpy as np
 from tensorflow.keras.models import load_model
 import joblib
+from price_store import load_series
 
-DATA_DIR = '../data'
 MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
 CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -18,31 +16,13 @@ CROPS = {
 SEQ_LENGTH = 10
 
 
-def find_crop_file(folder: str, crop: str):
-    pattern = re.compile(rf'(^|[\W_]){re.escape(crop)}([\W_]|$)', re.IGNORECASE)
-    for fname in os.listdir(folder):
-        if fname.lower().endswith('.csv') and pattern.search(fname):
-            return os.path.join(folder, fname)
-    return None
-
-
 def get_last_10_prices(market: str, crop: str):
-    folder = os.path.join(DATA_DIR, market)
-    fpath = find_crop_file(folder, crop)
-    if not fpath:
-        return None, f'CSV not found for {market}-{crop}'
-    df = pd.read_csv(fpath)
-    price_col = 'Modal Price (Rs./Quintal)'
-    date_col = 'Price Date'
-    if price_col not in df.columns or date_col not in df.columns:
-        return None, f'Missing columns in {fpath}'
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df[price_col] = pd.to_numeric(df[price_col], errors='coerce')
-    df = df.dropna(subset=[date_col, price_col]).sort_values(date_col)
-    prices = df[price_col].values.tolist()
-    if len(prices) < SEQ_LENGTH:
-        return None, f'Only {len(prices)} points'
-    return prices[-SEQ_LENGTH:], None
+    series = load_series(market, crop)
+    if series is None:
+        return None, f'No price data for {market}-{crop}'
+    if len(series) < SEQ_LENGTH:
+        return None, f'Only {len(series)} points'
+    return series.modal_price[-SEQ_LENGTH:].astype(float).tolist(), None
 
 
 def predict_one(market: str, crop: str):
@@ -0,0 +1,104 @@
+import os
+import threading
+import numpy as np
+
+
+class _PendingBatch:
+    """Rows collected for one model while its window is open"""
+
+    def __init__(self, fn):
+        self.fn = fn
+        self.rows = []
+        self.dispatched = False
+        self.full = threading.Event()
+        self.done = threading.Event()
+        self.outputs = None
+        self.error = None
+
+    def run(self):
+        try:
+            self.outputs = self.fn(np.stack(self.rows))
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done.set()
+
+
+class MicroBatcher:
+    """Coalesces concurrent single-row predictions into one batched call per model.
+
+    The first caller for a key opens a batch and waits up to ``window_ms`` (or
+    until ``max_batch`` rows have joined), then runs the batched function and
+    hands every caller its own row. ``max_wait_ms`` caps how long any row can
+    sit in the queue: a follower that has waited that long dispatches the batch
+    itself instead of waiting for the leader.
+    """
+
+    def __init__(self, window_ms=3.0, max_batch=16, max_wait_ms=50.0):
+        self.window = window_ms / 1000.0
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(self.window, max_wait_ms / 1000.0)
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.batches = 0
+        self.rows = 0
+        self.timeouts = 0
+
+    @classmethod
+    def from_env(cls):
+        """Build a batcher from COALESCE_* settings; None when disabled"""
+        window_ms = float(os.environ.get('COALESCE_WINDOW_MS', '0'))
+        if window_ms <= 0:
+            return None
+        return cls(
+            window_ms=window_ms,
+            max_batch=int(os.environ.get('COALESCE_MAX_BATCH', '16')),
+            max_wait_ms=float(os.environ.get('COALESCE_MAX_WAIT_MS', '50')),
+        )
+
+    def submit(self, key, fn, row):
+        """Run ``fn`` on ``row`` as part of a batch; ``fn`` maps (B, ...) -> (B, ...)"""
+        with self._lock:
+            batch = self._pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = _PendingBatch(fn)
+                self._pending[key] = batch
+            index = len(batch.rows)
+            batch.rows.append(row)
+            if len(batch.rows) >= self.max_batch:
+                self._close(key, batch)
+
+        batch.full.wait(self.window if leader else self.max_wait)
+        with self._lock:
+            self._close(key, batch)
+            dispatch = not batch.dispatched
+            if dispatch:
+                batch.dispatched = True
+                self.batches += 1
+                self.rows += len(batch.rows)
+                if not leader:
+                    self.timeouts += 1
+        if dispatch:
+            batch.run()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.outputs[index]
+
+    def _close(self, key, batch):
+        # Caller holds the lock; later arrivals start a fresh batch
+        if self._pending.get(key) is batch:
+            del self._pending[key]
+        batch.full.set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'batches': self.batches,
+                'rows': self.rows,
+                'avg_batch_size': (self.rows / self.batches) if self.batches else 0.0,
+                'timeouts': self.timeouts,
+            }
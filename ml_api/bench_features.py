@@ -0,0 +1,96 @@
+"""Micro-benchmark for the shared feature builders in features.py.
+
+Compares ``features.build_enhanced_features`` with the per-element loop
+implementation serving used to run and with the pandas version training
+used, plus the attention builder against its pandas version, and checks
+the outputs agree.
+
+Usage: python bench_features.py [--repeat N]
+"""
+import argparse
+import time
+import numpy as np
+from features import build_attention_features, build_enhanced_features
+from test_features import ref_attention, ref_enhanced
+
+LENGTHS = [60, 250, 1000, 5000]
+
+
+def loop_features(prices):
+    """The previous serving implementation: O(n*w) Python loops, centred convolve mean"""
+    p = prices.flatten()
+
+    def roll_mean(x, w):
+        return np.convolve(x, np.ones(w)/w, mode='same')
+
+    def roll_window(x, w, fn):
+        result = np.zeros_like(x)
+        for i in range(len(x)):
+            start = max(0, i - w + 1)
+            result[i] = fn(x[start:i+1])
+        return result
+
+    ma = [roll_mean(p, w) for w in [3, 7, 14, 21, 30, 45, 60] if w <= len(p)]
+    std = [roll_window(p, w, np.std) for w in [7, 14, 21, 30] if w <= len(p)]
+    mins = [roll_window(p, w, np.min) for w in [7, 14, 30]]
+    maxs = [roll_window(p, w, np.max) for w in [7, 14, 30]]
+    eps = 1e-6
+    ratios = [p / (m + eps) for m in ma[:4]]
+    vol = [s / (roll_mean(p, 14) + eps) for s in std]
+    trend = np.zeros_like(p)
+    for i in range(1, len(p)):
+        trend[i] = p[i] - p[i-1]
+    momentum = []
+    for w in [3, 7, 14]:
+        m = np.zeros_like(p)
+        for i in range(w, len(p)):
+            m[i] = p[i] - p[i-w]
+        momentum.append(m)
+    pos = []
+    for w in [7, 14, 30]:
+        lo, hi = roll_window(p, w, np.min), roll_window(p, w, np.max)
+        pos.append((p - lo) / (hi - lo + eps))
+    return np.column_stack([p] + ma + std + mins + maxs + ratios + vol + [trend] + momentum + pos)
+
+
+def best_of(fn, x, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn(x)
+        times.append(time.perf_counter() - t0)
+    return min(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print('enhanced features')
+    print(f"{'length':>8} {'loop ms':>10} {'pandas ms':>10} {'numpy ms':>10} {'speedup':>8} {'max |diff| vs pandas':>22}")
+    for n in LENGTHS:
+        prices = (2000 + np.cumsum(rng.normal(0, 25, n))).reshape(-1, 1)
+        diff = np.abs(build_enhanced_features(prices) - ref_enhanced(prices)).max()
+        loop_ms = best_of(loop_features, prices, args.repeat)
+        pandas_ms = best_of(ref_enhanced, prices, args.repeat)
+        numpy_ms = best_of(build_enhanced_features, prices, args.repeat)
+        print(f"{n:>8} {loop_ms:>10.2f} {pandas_ms:>10.2f} {numpy_ms:>10.2f} {loop_ms / numpy_ms:>7.1f}x {diff:>22.2e}")
+
+    print('attention features')
+    print(f"{'length':>8} {'pandas ms':>10} {'numpy ms':>10} {'speedup':>8} {'max |diff| vs pandas':>22}")
+    for n in LENGTHS:
+        prices = (2000 + np.cumsum(rng.normal(0, 25, n))).reshape(-1, 1)
+        diff = np.abs(build_attention_features(prices) - ref_attention(prices)).max()
+        pandas_ms = best_of(ref_attention, prices, args.repeat)
+        numpy_ms = best_of(build_attention_features, prices, args.repeat)
+        print(f"{n:>8} {pandas_ms:>10.2f} {numpy_ms:>10.2f} {pandas_ms / numpy_ms:>7.1f}x {diff:>22.2e}")
+
+    batch = 2000 + np.cumsum(rng.normal(0, 25, (64, 60)), axis=1)
+    one_by_one = best_of(lambda b: [build_attention_features(row) for row in b], batch, args.repeat)
+    batched = best_of(build_attention_features, batch, args.repeat)
+    print(f"attention, 64 x 60 batch: {one_by_one:.2f} ms row by row, {batched:.2f} ms batched")
+
+if __name__ == '__main__':
+    main()
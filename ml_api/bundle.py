@@ -0,0 +1,228 @@
+"""Single-file model bundles with memory-mapped weights.
+
+A bundle replaces a model's ``.keras``/``.npz`` file and its pickled
+scalers with one versioned file:
+
+    8 bytes   b'AGROBNDL'
+    4 bytes   format version (little-endian uint32)
+    4 bytes   header length
+    header    JSON: engine, model spec, scaler classes and parameters,
+              feature spec (the models.json entry), source sha256, array table
+    arrays    raw little-endian arrays, each 64-byte aligned
+
+``read_bundle`` maps the file read-only, so weights and scaler parameters
+are NumPy views on the page cache. Nothing is unzipped or unpickled, and
+forked gunicorn workers that load the same bundle share its pages.
+Baseline LSTMs are stored for the NumPy engine (numpy_lstm.py) and run
+directly on the mapped weights. Every other model is stored as its Keras
+config plus weight arrays and is rebuilt with ``model_from_json``; those
+weights are copied into TensorFlow variables.
+
+Serve bundles with INFERENCE_BACKEND=bundle (see backends.py). Convert the
+trained artifacts in a directory, checking each bundle against its source:
+
+    python bundle.py [--dir .] [lstm_davangere_Maize ...]
+"""
+import argparse
+import glob
+import json
+import mmap
+import os
+import struct
+import time
+import numpy as np
+from numpy_lstm import NumpyLSTM, numpy_arrays
+
+MAGIC = b'AGROBNDL'
+FORMAT_VERSION = 1
+ALIGN = 64
+BUNDLE_SUFFIX = '.bundle'
+# sklearn scalers a bundle can carry; restored from their fitted attributes
+SCALER_CLASSES = ('MinMaxScaler', 'RobustScaler', 'StandardScaler')
+
+
+def bundle_path(stem):
+    return stem + BUNDLE_SUFFIX
+
+
+def _aligned(n):
+    return (n + ALIGN - 1) // ALIGN * ALIGN
+
+
+def write_bundle(path, arrays, header):
+    """Write ``arrays`` (name -> numeric ndarray) after a JSON ``header``; replaces ``path`` atomically"""
+    table, offset = {}, 0
+    for name, array in arrays.items():
+        array = np.asarray(array)
+        table[name] = {'offset': offset, 'dtype': array.dtype.newbyteorder('<').str, 'shape': list(array.shape)}
+        offset = _aligned(offset + array.nbytes)
+    encoded = json.dumps({**header, 'format_version': FORMAT_VERSION, 'arrays': table}).encode()
+    start = _aligned(len(MAGIC) + 8 + len(encoded))
+    tmp = f'{path}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC + struct.pack('<II', FORMAT_VERSION, len(encoded)) + encoded)
+        for name, array in arrays.items():
+            f.seek(start + table[name]['offset'])
+            f.write(np.ascontiguousarray(array, dtype=table[name]['dtype']).tobytes())
+        f.truncate(start + offset)
+    os.replace(tmp, path)
+    return path
+
+
+def read_bundle(path):
+    """(header, {name: read-only array view on the mapped file})"""
+    with open(path, 'rb') as f:
+        buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if buf[:len(MAGIC)] != MAGIC:
+        raise ValueError(f'{path} is not a model bundle')
+    version, size = struct.unpack_from('<II', buf, len(MAGIC))
+    if version > FORMAT_VERSION:
+        raise ValueError(f'{path} has bundle format {version}; this build reads up to {FORMAT_VERSION}')
+    offset = len(MAGIC) + 8
+    header = json.loads(bytes(buf[offset:offset + size]))
+    start = _aligned(offset + size)
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        shape = tuple(spec['shape'])
+        arrays[name] = np.frombuffer(buf, dtype=np.dtype(spec['dtype']), count=int(np.prod(shape)),
+                                     offset=start + spec['offset']).reshape(shape)
+    return header, arrays
+
+
+def _pack_scaler(name, scaler, arrays):
+    kind = type(scaler).__name__
+    if kind not in SCALER_CLASSES:
+        raise ValueError(f'{name}: {kind} cannot be stored in a bundle')
+    attributes = {}
+    for attr, value in vars(scaler).items():
+        if not attr.endswith('_') or attr.startswith('_'):
+            continue
+        if isinstance(value, np.ndarray) and value.dtype.kind in 'biuf':
+            arrays[f'{name}.{attr}'] = value
+            attributes[attr] = {'array': f'{name}.{attr}'}
+        elif isinstance(value, np.ndarray):
+            attributes[attr] = {'list': value.tolist()}  # e.g. feature_names_in_
+        else:
+            attributes[attr] = {'value': value.item() if isinstance(value, np.generic) else value}
+    return {'class': kind, 'params': scaler.get_params(), 'attributes': attributes}
+
+
+def _unpack_scaler(spec, arrays):
+    import sklearn.preprocessing
+    if spec['class'] not in SCALER_CLASSES:
+        raise ValueError(f"Unsupported scaler {spec['class']}")
+    scaler = getattr(sklearn.preprocessing, spec['class'])(**spec['params'])
+    for attr, stored in spec['attributes'].items():
+        if 'array' in stored:
+            value = arrays[stored['array']]
+        elif 'list' in stored:
+            value = np.asarray(stored['list'], dtype=object)
+        else:
+            value = stored['value']
+        setattr(scaler, attr, value)
+    return scaler
+
+
+def load_scalers(path):
+    """The scaler object the apps expect, from a bundle or a ``_scaler.pkl``"""
+    if not path.endswith(BUNDLE_SUFFIX):
+        import joblib
+        return joblib.load(path)
+    header, arrays = read_bundle(path)
+    scalers = {name: _unpack_scaler(spec, arrays) for name, spec in header['scalers'].items()}
+    if header.get('bare_scaler'):
+        return scalers['price_scaler']
+    return {**header.get('extra', {}), **scalers}
+
+
+def load_bundle(path):
+    """Load and warm the model in a bundle"""
+    header, arrays = read_bundle(path)
+    spec = header['model']
+    if header['engine'] == 'numpy':
+        return NumpyLSTM.from_arrays({**spec['values'], **arrays}).warm()
+    from tensorflow.keras.models import model_from_json
+    from inference import compile_model
+    model = model_from_json(json.dumps(spec['keras_config']))
+    model.set_weights([arrays[f'weight.{i}'] for i in range(spec['weights'])])
+    return compile_model(model)
+
+
+def convert(stem, out=None):
+    """Bundle the trained model saved under ``stem`` (model file + ``_scaler.pkl``); returns the path or None"""
+    import joblib
+    from manifest import describe, file_hash
+    from optimize_graph import OPTIMIZED_SUFFIX
+    entry = describe(stem)
+    if entry is None:
+        return None
+    source = stem + OPTIMIZED_SUFFIX if os.path.exists(stem + OPTIMIZED_SUFFIX) else os.path.join(
+        os.path.dirname(stem), entry['model'])
+    scaler_path = f'{stem}_scaler.pkl'
+    scaler_obj = joblib.load(scaler_path)
+
+    arrays, values = {}, {}
+    engine, spec = 'numpy', None
+    if os.path.exists(stem + '.npz'):
+        with np.load(stem + '.npz', allow_pickle=False) as data:
+            exported = {name: data[name] for name in data.files}
+    else:
+        from tensorflow.keras.models import load_model
+        keras_model = load_model(source, compile=False)
+        try:
+            exported = numpy_arrays(keras_model)
+        except ValueError:
+            engine, exported = 'keras', None
+            weights = keras_model.get_weights()
+            arrays.update({f'weight.{i}': w for i, w in enumerate(weights)})
+            spec = {'keras_config': json.loads(keras_model.to_json()), 'weights': len(weights)}
+    if engine == 'numpy':
+        # Numeric weights are mapped; layer kinds, activations and flags go in the header
+        for name, array in exported.items():
+            if array.dtype.kind == 'f' and array.ndim:
+                arrays[name] = array.astype(np.float32)
+            else:
+                values[name] = array.tolist()
+        spec = {'values': values}
+
+    scalers = scaler_obj if isinstance(scaler_obj, dict) else {'price_scaler': scaler_obj}
+    header = {
+        'engine': engine,
+        'model': spec,
+        'scalers': {name: _pack_scaler(name, s, arrays) for name, s in scalers.items()
+                    if name.endswith('_scaler') and s is not None},
+        'bare_scaler': not isinstance(scaler_obj, dict),
+        # JSON-able extras such as horizons and a student's distillation report
+        'extra': {k: v for k, v in scalers.items() if not k.endswith('_scaler') and isinstance(v, (int, float, str, list))},
+        'manifest': entry,
+        'source': {'model': os.path.basename(source), 'scaler': os.path.basename(scaler_path),
+                   'sha256': file_hash(source, scaler_path)},
+    }
+    return write_bundle(out or bundle_path(stem), arrays, header)
+
+
+def _timed(load):
+    t0 = time.perf_counter()
+    value = load()
+    return value, (time.perf_counter() - t0) * 1e3
+
+
+if __name__ == '__main__':
+    from backends import load_artifact
+    parser = argparse.ArgumentParser(description='Convert trained models to memory-mappable bundles')
+    parser.add_argument('stems', nargs='*', help='model stems (default: every trained model in --dir)')
+    parser.add_argument('--dir', default='.')
+    args = parser.parse_args()
+    stems = args.stems or [p[:-len('_scaler.pkl')] for p in sorted(glob.glob(os.path.join(args.dir, 'lstm_*_scaler.pkl')))]
+    for stem in stems:
+        out = convert(stem)
+        if out is None:
+            continue
+        header = read_bundle(out)[0]
+        source = os.path.join(os.path.dirname(stem), header['source']['model'])
+        (model, scalers), bundle_ms = _timed(lambda: (load_bundle(out), load_scalers(out)))
+        (reference, _), source_ms = _timed(lambda: (load_artifact(source), load_scalers(f'{stem}_scaler.pkl')))
+        X = np.random.default_rng(0).normal(size=(8,) + tuple(model.input_shape)).astype(np.float32)
+        err = float(np.max(np.abs(np.asarray(model(X)) - np.asarray(reference(X)))))
+        print(f"{out}: {header['engine']}, {os.path.getsize(out) / 1e6:.2f} MB, "
+              f'load {bundle_ms:.1f} ms vs {source_ms:.1f} ms, max abs diff {err:.1e}')
@@ -0,0 +1,170 @@
+"""Distil the attention LSTMs (train_attention_lstm.py) into compact students.
+
+For each trained ``lstm_attention_{market}_{crop}`` teacher, a small GRU
+and a small temporal convolution network (causal, dilated Conv1D) are fit
+to the teacher's outputs over every sliding window of the pair's series,
+using the teacher's saved scalers, so a student is a drop-in replacement.
+Both students and the teacher are then scored against the true prices on
+the training script's held-out split and timed on single-row requests.
+
+The fastest student whose MAPE is within DISTILL_MAPE_TOLERANCE points of
+the teacher's is saved as
+
+    lstm_attention_student_{market}_{crop}.keras
+    lstm_attention_student_{market}_{crop}_scaler.pkl   teacher scalers + report
+
+app_attention.py serves it by default and the teacher on request
+(``"teacher": true``). Pairs with no acceptable student keep the teacher.
+
+    python distill.py [--students gru tcn] [--pairs davangere:Maize] [--epochs 60]
+"""
+import argparse
+import os
+import time
+import joblib
+import numpy as np
+from manifest import record
+from model_cache import parse_pins
+import train_attention_lstm as teacher_training
+
+STUDENT_PREFIX = 'lstm_attention_student_'
+# Largest MAPE increase (percentage points) a student may cost over its teacher
+DISTILL_MAPE_TOLERANCE = float(os.environ.get('DISTILL_MAPE_TOLERANCE', '1.0'))
+
+
+def build_gru_student(input_dim: int, n_outputs: int = 1, units: int = 32):
+    """Single GRU layer and a linear head"""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import GRU, Dense, Input
+    return Sequential([
+        Input(shape=(teacher_training.SEQ_LENGTH, input_dim)),
+        GRU(units),
+        Dense(n_outputs, activation='linear', name='price_prediction'),
+    ])
+
+
+def build_tcn_student(input_dim: int, n_outputs: int = 1, filters: int = 32, kernel_size: int = 3):
+    """Causal dilated Conv1D stack (receptive field 31 days) read at the newest step"""
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Conv1D, Cropping1D, Dense, Flatten, Input
+    layers = [Input(shape=(teacher_training.SEQ_LENGTH, input_dim))]
+    for dilation in (1, 2, 4, 8):
+        layers.append(Conv1D(filters, kernel_size, padding='causal', dilation_rate=dilation, activation='relu'))
+    layers += [
+        Cropping1D((teacher_training.SEQ_LENGTH - 1, 0)),
+        Flatten(),
+        Dense(n_outputs, activation='linear', name='price_prediction'),
+    ]
+    return Sequential(layers)
+
+
+STUDENTS = {'gru': build_gru_student, 'tcn': build_tcn_student}
+
+
+def student_stem(market, crop):
+    return f'{STUDENT_PREFIX}{market}_{crop}'
+
+
+def transfer_set(market, crop, scaler_obj):
+    """(X_all, X_test, y_test) windows of the pair under the teacher's saved scalers"""
+    prices = teacher_training.load_price_series(market, crop)
+    if prices is None:
+        return None
+    X_train, _, X_test, y_test = teacher_training.split_sequences(
+        prices, scaler_obj['price_scaler'], scaler_obj.get('feature_scaler'), horizons=(1,))
+    if len(X_train) == 0 or len(X_test) == 0:
+        return None
+    # The test windows start SEQ_LENGTH rows before the split; together they cover every window
+    return np.concatenate([X_train, X_test]).astype(np.float32), X_test.astype(np.float32), y_test
+
+
+def mape(model, X, y, price_scaler):
+    """One-step MAPE (%) in price units, as reported by the training scripts"""
+    pred = price_scaler.inverse_transform(np.asarray(model(X), dtype=float)[:, :1])
+    actual = price_scaler.inverse_transform(y[:, :1])
+    return float(np.mean(np.abs((actual - pred) / np.maximum(1e-6, np.abs(actual)))) * 100.0)
+
+
+def row_latency_ms(model, X, repeats=50):
+    """Mean latency of a single-row request, as the apps serve it"""
+    row = X[:1]
+    model(row)
+    t0 = time.perf_counter()
+    for _ in range(repeats):
+        model(row)
+    return (time.perf_counter() - t0) / repeats * 1e3
+
+
+def fit_student(kind, X, soft_targets, epochs=60, batch_size=64):
+    from tensorflow.keras.callbacks import EarlyStopping
+    from tensorflow.keras.optimizers import Adam
+    student = STUDENTS[kind](X.shape[2], soft_targets.shape[1])
+    student.compile(optimizer=Adam(learning_rate=0.001), loss='mse')
+    # Shuffled validation: the teacher labels every window, so there is no future to leak
+    student.fit(X, soft_targets, epochs=epochs, batch_size=batch_size, validation_split=0.1, shuffle=True,
+                callbacks=[EarlyStopping(patience=10, restore_best_weights=True, monitor='val_loss')], verbose=0)
+    return student
+
+
+def distill_pair(market, crop, students=tuple(STUDENTS), epochs=60):
+    """Train the students for one pair, print the comparison and save the fastest acceptable one"""
+    from tensorflow.keras.models import load_model
+    from inference import compile_model
+    stem = f'lstm_attention_{market}_{crop}'
+    if not (os.path.exists(stem + '.keras') and os.path.exists(stem + '_scaler.pkl')):
+        return None
+    scaler_obj = joblib.load(stem + '_scaler.pkl')
+    data = transfer_set(market, crop, scaler_obj)
+    if data is None:
+        print(f'{stem}: not enough data to distil')
+        return None
+    X_all, X_test, y_test = data
+    price_scaler = scaler_obj['price_scaler']
+    teacher = compile_model(load_model(stem + '.keras', compile=False))
+    if tuple(teacher.input_shape) != X_all.shape[1:]:
+        print(f'{stem}: model input {teacher.input_shape} does not match the training features {X_all.shape[1:]}')
+        return None
+    # Soft targets: every teacher head, so multi-horizon teachers get multi-horizon students
+    soft_targets = np.concatenate([teacher(X_all[i:i + 256]) for i in range(0, len(X_all), 256)])
+
+    rows = [('teacher', teacher, mape(teacher, X_test, y_test, price_scaler), row_latency_ms(teacher, X_test))]
+    for kind in students:
+        student = fit_student(kind, X_all, soft_targets, epochs)
+        served = compile_model(student)
+        rows.append((kind, student, mape(served, X_test, y_test, price_scaler), row_latency_ms(served, X_test)))
+
+    print(f'{stem}: {len(X_all)} transfer windows, {len(X_test)} held-out')
+    for kind, _, score, latency in rows:
+        print(f'  {kind:<8} MAPE {score:6.2f}%  1 row {latency:7.2f} ms')
+
+    base, base_latency = rows[0][2], rows[0][3]
+    accepted = [r for r in rows[1:] if r[2] - base <= DISTILL_MAPE_TOLERANCE]
+    if not accepted:
+        print(f'  no student within {DISTILL_MAPE_TOLERANCE} pp of the teacher; keeping the teacher')
+        return None
+    kind, student, score, latency = min(accepted, key=lambda r: r[3])
+    out = student_stem(market, crop)
+    student.save(out + '.keras', include_optimizer=False)
+    joblib.dump({
+        **scaler_obj,
+        'student': kind,
+        'mape': round(score, 4),
+        'teacher_mape': round(base, 4),
+        'latency_ms': round(latency, 4),
+        'teacher_latency_ms': round(base_latency, 4),
+    }, out + '_scaler.pkl')
+    record(out)
+    print(f'  saved {kind} student to {out}.keras ({score - base:+.2f} pp, {base_latency / latency:.1f}x faster)')
+    return kind
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Distil attention LSTM teachers into compact students')
+    parser.add_argument('--students', nargs='+', default=list(STUDENTS), choices=list(STUDENTS))
+    parser.add_argument('--pairs', nargs='*', help='market:crop pairs (default: every trained pair)')
+    parser.add_argument('--epochs', type=int, default=60)
+    args = parser.parse_args()
+    pairs = parse_pins(','.join(args.pairs)) if args.pairs else [
+        (market, crop) for market in teacher_training.MARKETS for crop in teacher_training.CROPS[market]]
+    for market, crop in sorted(pairs):
+        distill_pair(market, crop, args.students, args.epochs)
@@ -0,0 +1,275 @@
+"""Price feature engineering shared by training and serving.
+
+Pure NumPy: every kernel works along the last axis, so a single series
+(N,), a column vector (N, 1) or a batch of series (B, N) all go through the
+same code. Rolling statistics use trailing windows with pandas semantics
+(``rolling(window=w, min_periods=...)``) and are computed in one pass:
+means and variances from cumulative sums, minima and maxima with the
+van Herk/Gil-Werman block algorithm (the vectorised equivalent of a
+monotonic deque). Windows holding a single repeated value return that value
+(and zero spread) exactly, like pandas does.
+
+Every kernel and builder also takes ``last=True`` to evaluate only the
+newest point of each series from its trailing windows. Autoregressive
+rollouts use it to append one feature row per step instead of rebuilding
+the whole window.
+"""
+import numpy as np
+
+EPS = 1e-6
+
+
+def as_batch(prices):
+    """(B, N) float array plus whether the input was a single series.
+
+    A 2-D input with one column is treated as one series, matching the
+    (N, 1) arrays the scalers work with.
+    """
+    x = np.asarray(prices, dtype=float)
+    if x.ndim == 2 and x.shape[1] == 1:
+        x = x[:, 0]
+    single = x.ndim == 1
+    return np.atleast_2d(x), single
+
+
+def _counts(n, w):
+    return np.minimum(np.arange(1, n + 1), w)
+
+
+def _window_sums(x, w):
+    # Trailing window sums from one cumulative sum: S[i] = c[i+1] - c[i+1-w]
+    n = x.shape[-1]
+    c = np.cumsum(x, axis=-1)
+    out = c.copy()
+    if n > w:
+        out[..., w:] -= c[..., :n - w]
+    return out
+
+
+def _rolling_extreme(x, w, op, fill):
+    n = x.shape[-1]
+    w = max(1, min(w, n))
+    lead = x.shape[:-1]
+    # Pad so the window ending at every point is full, then to whole blocks of w
+    y = np.concatenate([np.full(lead + (w - 1,), fill), x], axis=-1)
+    m = -(-y.shape[-1] // w) * w
+    y = np.concatenate([y, np.full(lead + (m - y.shape[-1],), fill)], axis=-1)
+    blocks = y.reshape(lead + (m // w, w))
+    prefix = op.accumulate(blocks, axis=-1).reshape(lead + (m,))
+    suffix = op.accumulate(blocks[..., ::-1], axis=-1)[..., ::-1].reshape(lead + (m,))
+    # A window spans at most two blocks: the tail of one and the head of the next
+    return op(suffix[..., :n], prefix[..., w - 1:w - 1 + n])
+
+
+def _tail(x, w):
+    # Trailing window of the newest point, as a (..., <=w) view
+    return x[..., -w:]
+
+
+def _tail_constant(seg):
+    return np.all(seg == seg[..., -1:], axis=-1, keepdims=True)
+
+
+def rolling_min(x, w, last=False):
+    x = np.asarray(x, dtype=float)
+    if last:
+        return _tail(x, w).min(axis=-1, keepdims=True)
+    return _rolling_extreme(x, w, np.minimum, np.inf)
+
+
+def rolling_max(x, w, last=False):
+    x = np.asarray(x, dtype=float)
+    if last:
+        return _tail(x, w).max(axis=-1, keepdims=True)
+    return _rolling_extreme(x, w, np.maximum, -np.inf)
+
+
+def _constant_windows(x, w):
+    # A window is constant when no value changes inside it; counting changes with
+    # an integer cumulative sum keeps the test exact
+    changes = np.zeros(x.shape, dtype=np.int64)
+    changes[..., 1:] = x[..., 1:] != x[..., :-1]
+    return _window_sums(changes, w - 1) == 0 if w > 1 else np.ones(x.shape, dtype=bool)
+
+
+def rolling_mean(x, w, min_periods=1, last=False):
+    """Trailing mean over up to ``w`` points; NaN where fewer than ``min_periods``"""
+    x = np.asarray(x, dtype=float)
+    if last:
+        seg = _tail(x, w)
+        out = np.where(_tail_constant(seg), x[..., -1:], seg.mean(axis=-1, keepdims=True))
+        return out if seg.shape[-1] >= min_periods else np.full_like(out, np.nan)
+    n = x.shape[-1]
+    counts = _counts(n, w)
+    out = _window_sums(x, w) / counts
+    out = np.where(_constant_windows(x, w), x, out)
+    out[..., counts < min_periods] = np.nan
+    return out
+
+
+def rolling_std(x, w, ddof=0, min_periods=1, last=False):
+    """Trailing standard deviation; NaN where fewer than ``min_periods`` (or ddof) points"""
+    x = np.asarray(x, dtype=float)
+    if last:
+        seg = _tail(x, w)
+        count = seg.shape[-1]
+        if count < min_periods or count <= ddof:
+            return np.full(x.shape[:-1] + (1,), np.nan)
+        return np.where(_tail_constant(seg), 0.0, seg.std(axis=-1, ddof=ddof, keepdims=True))
+    n = x.shape[-1]
+    counts = _counts(n, w)
+    # Centre each series first so the sums of squares do not cancel catastrophically
+    d = x - x.mean(axis=-1, keepdims=True)
+    s1 = _window_sums(d, w)
+    s2 = _window_sums(d * d, w)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        var = (s2 - s1 * s1 / counts) / (counts - ddof)
+    var = np.where(_constant_windows(x, w), 0.0, np.maximum(var, 0.0))
+    var[..., (counts < min_periods) | (counts <= ddof)] = np.nan
+    return np.sqrt(var)
+
+
+def diff(x, k=1, last=False):
+    """x[i] - x[i-k], 0 for the first k points (pandas ``diff(k).fillna(0)``)"""
+    x = np.asarray(x, dtype=float)
+    if last:
+        if k >= x.shape[-1]:
+            return np.zeros(x.shape[:-1] + (1,))
+        return x[..., -1:] - x[..., -1 - k:-k]
+    out = np.zeros_like(x)
+    if k < x.shape[-1]:
+        out[..., k:] = x[..., k:] - x[..., :-k]
+    return out
+
+
+def _bfill_leading(a, k):
+    # Leading NaNs come only from min_periods; fill them with the first full window
+    if a.shape[-1] > k:
+        a[..., :k] = a[..., k:k + 1]
+    return a
+
+
+def calculate_rsi(prices, window=14, last=False):
+    """Calculate Relative Strength Index"""
+    prices = np.asarray(prices, dtype=float)
+    if last:
+        # Only the deltas inside the newest window matter
+        prices = prices[..., -(window + 1):]
+    delta = diff(prices, 1)
+    gain = rolling_mean(np.maximum(delta, 0), window, min_periods=window, last=last)
+    loss = rolling_mean(np.maximum(-delta, 0), window, min_periods=window, last=last)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rsi = 100 - (100 / (1 + gain / loss))
+    return np.where(np.isnan(rsi), 50.0, rsi)
+
+
+def calculate_bollinger_bands(prices, window=20, num_std=2, last=False):
+    """Calculate Bollinger Bands"""
+    rolling = rolling_mean(prices, window, min_periods=window, last=last)
+    spread = rolling_std(prices, window, ddof=1, min_periods=window, last=last)
+    if last:
+        # The back-fill only ever touches points before the first full window
+        return rolling + spread * num_std, rolling - spread * num_std
+    upper_band = _bfill_leading(rolling + spread * num_std, window - 1)
+    lower_band = _bfill_leading(rolling - spread * num_std, window - 1)
+    return upper_band, lower_band
+
+
+def _stack(columns, single):
+    features = np.stack(columns, axis=-1)
+    return features[0] if single else features
+
+
+def build_features(prices, last=False):
+    """Baseline LSTM features: price plus scale-free MA and volatility ratios (7 columns)"""
+    p, single = as_batch(prices)
+    pn = p[..., -1:] if last else p
+    ma7, ma14, ma30 = (rolling_mean(p, w, last=last) for w in (7, 14, 30))
+    std7, std14, std30 = (np.nan_to_num(rolling_std(p, w, min_periods=2, last=last)) for w in (7, 14, 30))
+    return _stack([
+        pn,
+        pn / (ma7 + EPS), pn / (ma14 + EPS), pn / (ma30 + EPS),
+        std7 / (ma7 + EPS), std14 / (ma14 + EPS), std30 / (ma30 + EPS),
+    ], single)
+
+
+def build_enhanced_features(prices, last=False):
+    """Enhanced LSTM features: multi-window MA/std/extrema, ratios, momentum and range position"""
+    p, single = as_batch(prices)
+    pn = p[..., -1:] if last else p
+    n = p.shape[-1]
+
+    # Multiple time windows for moving averages and standard deviations
+    ma_features = [rolling_mean(p, w, last=last) for w in [3, 7, 14, 21, 30, 45, 60] if w <= n]
+    std_features = [np.nan_to_num(rolling_std(p, w, min_periods=2, last=last)) for w in [7, 14, 21, 30] if w <= n]
+
+    # Min/Max features
+    mins = {w: rolling_min(p, w, last=last) for w in (7, 14, 30)}
+    maxs = {w: rolling_max(p, w, last=last) for w in (7, 14, 30)}
+
+    # Price ratios (first 4 MAs) and volatility relative to the 14-point mean
+    price_ratios = [pn / (ma + EPS) for ma in ma_features[:4]]
+    ma_14 = rolling_mean(p, 14, last=last)
+    volatility_features = [std / (ma_14 + EPS) for std in std_features]
+
+    # Trend and momentum
+    trend_features = diff(p, 1, last=last)
+    momentum_features = [diff(p, w, last=last) for w in [3, 7, 14] if w <= n]
+
+    # Price position within recent range
+    range_position = [(pn - mins[w]) / (maxs[w] - mins[w] + EPS) for w in (7, 14, 30) if w <= n]
+
+    return _stack([pn] + ma_features + std_features + list(mins.values()) + list(maxs.values()) +
+                  price_ratios + volatility_features + [trend_features] +
+                  momentum_features + range_position, single)
+
+
+def build_attention_features(prices, last=False):
+    """Attention LSTM features: MAs, extrema, their ratios, momentum, RSI and Bollinger position (32 columns)"""
+    p, single = as_batch(prices)
+    pn = p[..., -1:] if last else p
+
+    ma7, ma14, ma30, ma60 = (rolling_mean(p, w, last=last) for w in (7, 14, 30, 60))
+    std7, std14, std30 = (np.nan_to_num(rolling_std(p, w, min_periods=2, last=last)) for w in (7, 14, 30))
+    min7, min14, min30 = (rolling_min(p, w, last=last) for w in (7, 14, 30))
+    max7, max14, max30 = (rolling_max(p, w, last=last) for w in (7, 14, 30))
+
+    # Technical indicators
+    rsi_14 = calculate_rsi(p, 14, last=last)
+    bollinger_upper, bollinger_lower = calculate_bollinger_bands(p, 20, 2, last=last)
+    bollinger_position = (pn - bollinger_lower) / (bollinger_upper - bollinger_lower + EPS)
+
+    return _stack([
+        pn,  # Original price
+        ma7, ma14, ma30, ma60,  # Moving averages
+        std7, std14, std30,  # Standard deviations
+        min7, min14, min30,  # Minimums
+        max7, max14, max30,  # Maximums
+        pn / (ma7 + EPS), pn / (ma14 + EPS), pn / (ma30 + EPS), pn / (ma60 + EPS),  # Price ratios
+        std7 / (ma7 + EPS), std14 / (ma14 + EPS), std30 / (ma30 + EPS),  # Volatility ratios
+        pn / (min7 + EPS), pn / (min14 + EPS), pn / (min30 + EPS),  # Min ratios
+        pn / (max7 + EPS), pn / (max14 + EPS), pn / (max30 + EPS),  # Max ratios
+        diff(p, 1, last=last), diff(p, 3, last=last), diff(p, 7, last=last),  # Momentum
+        rsi_14, bollinger_position,  # Technical indicators
+    ], single)
+
+
+# Column names of each builder's output, in order (recorded in the model manifest)
+FEATURE_NAMES = {
+    'baseline': [
+        'price', 'price_ma7', 'price_ma14', 'price_ma30', 'std7_ma7', 'std14_ma14', 'std30_ma30',
+    ],
+    'enhanced': (
+        ['price'] + [f'ma{w}' for w in (3, 7, 14, 21, 30, 45, 60)] + [f'std{w}' for w in (7, 14, 21, 30)] +
+        [f'min{w}' for w in (7, 14, 30)] + [f'max{w}' for w in (7, 14, 30)] +
+        [f'price_ma{w}' for w in (3, 7, 14, 21)] + [f'std{w}_ma14' for w in (7, 14, 21, 30)] +
+        ['diff1'] + [f'diff{w}' for w in (3, 7, 14)] + [f'range{w}' for w in (7, 14, 30)]
+    ),
+    'attention': (
+        ['price'] + [f'ma{w}' for w in (7, 14, 30, 60)] + [f'std{w}' for w in (7, 14, 30)] +
+        [f'min{w}' for w in (7, 14, 30)] + [f'max{w}' for w in (7, 14, 30)] +
+        [f'price_ma{w}' for w in (7, 14, 30, 60)] + [f'std{w}_ma{w}' for w in (7, 14, 30)] +
+        [f'price_min{w}' for w in (7, 14, 30)] + [f'price_max{w}' for w in (7, 14, 30)] +
+        [f'diff{w}' for w in (1, 3, 7)] + ['rsi14', 'bollinger_position']
+    ),
+}
@@ -0,0 +1,119 @@
+import os
+from statistics import NormalDist
+import numpy as np
+
+# Upper bounds on the multi-day forecast request (the UI offers up to 90 days)
+MAX_HORIZON = int(os.environ.get('MAX_HORIZON', '90'))
+MAX_SCENARIOS = int(os.environ.get('MAX_SCENARIOS', '64'))
+# Central probability mass reported between the lower and upper bounds
+FORECAST_INTERVAL = float(os.environ.get('FORECAST_INTERVAL', '0.8'))
+
+
+def parse_horizons(value):
+    """Sorted days-ahead tuple for multi-output heads from '1,7,14,30'; day 1 is always included"""
+    days = {int(d) for d in str(value).replace(' ', '').split(',') if d}
+    if any(d < 1 for d in days):
+        raise ValueError('horizons must be positive days')
+    return tuple(sorted(days | {1}))
+
+
+# Days ahead the training scripts' output heads predict jointly (LSTM_HORIZONS=1,7,14,30);
+# the default trains the usual one-step models
+TRAIN_HORIZONS = parse_horizons(os.environ.get('LSTM_HORIZONS', '1'))
+
+
+def artifact_horizons(scaler_obj):
+    """Horizons recorded in a saved scaler dict; older artifacts are one-step models"""
+    if isinstance(scaler_obj, dict) and scaler_obj.get('horizons'):
+        return tuple(int(h) for h in scaler_obj['horizons'])
+    return (1,)
+
+
+def parse_horizon(data):
+    """(horizon, scenarios) from a request body; None when no horizon was asked for.
+
+    Raises ValueError with a message suitable for a 400 response.
+    """
+    if data.get('horizon') is None:
+        return None
+    try:
+        horizon = int(data['horizon'])
+        scenarios = int(data.get('scenarios') or 0)
+    except (TypeError, ValueError):
+        raise ValueError('horizon and scenarios must be integers')
+    if not 1 <= horizon <= MAX_HORIZON:
+        raise ValueError(f'horizon must be between 1 and {MAX_HORIZON}')
+    if not 0 <= scenarios <= MAX_SCENARIOS:
+        raise ValueError(f'scenarios must be between 0 and {MAX_SCENARIOS}')
+    return horizon, scenarios
+
+
+def log_volatility(window):
+    """Standard deviation of daily log returns over a raw price window"""
+    p = np.asarray(window, dtype=float).flatten()
+    p = p[p > 0]
+    if len(p) < 2:
+        return 0.0
+    return float(np.std(np.diff(np.log(p))))
+
+
+def rollout(step, encode, window, horizon, scenarios=0, seed=0):
+    """Autoregressive multi-step forecast over a batch of paths.
+
+    ``window`` is the padded (L,) raw price window the model sees.
+    ``encode(prices, last)`` turns (K, L) raw windows into scaled model rows,
+    (K, L, F) or, with ``last=True``, only the newest (K, 1, F) row.
+    ``step(X)`` maps a (K, L, F) batch to (K,) raw next-day prices.
+
+    Path 0 is the noise-free forecast; paths 1..scenarios multiply each
+    step by a log-normal shock with the window's daily volatility. All paths
+    advance together, so each day is one batched model call, and each day
+    appends one freshly encoded row instead of rebuilding the window.
+    Returns the (1 + scenarios, horizon) raw price paths.
+    """
+    window = np.asarray(window, dtype=float).flatten()
+    k = 1 + scenarios
+    prices = np.repeat(window[np.newaxis], k, axis=0)
+    X = np.repeat(encode(prices[:1], False), k, axis=0)
+    shocks = np.zeros((k, horizon))
+    if scenarios:
+        rng = np.random.default_rng(seed)
+        shocks[1:] = rng.standard_normal((scenarios, horizon)) * log_volatility(window)
+    paths = np.empty((k, horizon))
+    for h in range(horizon):
+        paths[:, h] = np.asarray(step(X), dtype=float).reshape(k) * np.exp(shocks[:, h])
+        if h + 1 < horizon:
+            prices = np.concatenate([prices[:, 1:], paths[:, h:h + 1]], axis=1)
+            X = np.concatenate([X[:, 1:], encode(prices, True)], axis=1)
+    return paths
+
+
+def direct_path(preds, horizons, last_price, horizon):
+    """Daily (K, horizon) path from one multi-horizon prediction.
+
+    ``preds`` holds (K, len(horizons)) raw prices for the trained days ahead;
+    days between them are interpolated linearly, starting from
+    ``last_price`` on day 0. ``horizon`` must not exceed ``max(horizons)``.
+    """
+    preds = np.atleast_2d(np.asarray(preds, dtype=float))
+    days = np.concatenate([[0], horizons])
+    wanted = np.arange(1, horizon + 1)
+    return np.stack([np.interp(wanted, days, np.concatenate([[last_price], row])) for row in preds])
+
+
+def interval_bounds(paths, window, calibrate):
+    """Per-day (central, lower, upper) calibrated series for rollout paths.
+
+    With scenario paths the bounds are their empirical quantiles; otherwise
+    a random-walk band of the window's volatility widening with sqrt(day).
+    ``calibrate`` maps raw prices (any shape) to served prices.
+    """
+    tail = (1.0 - FORECAST_INTERVAL) / 2.0
+    central = calibrate(paths[0])
+    if len(paths) > 1:
+        lower, upper = np.quantile(calibrate(paths[1:]), [tail, 1.0 - tail], axis=0)
+    else:
+        z = NormalDist().inv_cdf(1.0 - tail)
+        band = z * log_volatility(window) * np.sqrt(np.arange(1, paths.shape[1] + 1))
+        lower, upper = calibrate(paths[0] * np.exp(-band)), calibrate(paths[0] * np.exp(band))
+    return central, np.minimum(lower, central), np.maximum(upper, central)
@@ -0,0 +1,172 @@
+"""Reload retrained artifacts into running workers without a restart.
+
+A reload loads the new artifact for each cached model whose files changed,
+using that family's own loader, which also warms the model with a dummy
+batch. It then swaps the model into registry.models with
+``ModelCache.replace``. Requests already holding the old model finish on
+it, and the next lookup gets the new one. Forecasts and coalesced batches
+are keyed by the model's version, so the old model's results are never
+served for the new one; the pair's result-cache entries are dropped after
+the swap. When a changed artifact fails to load, the old model stays in
+service. Recommendation tables (recommend_table.TableSource) are rebuilt
+and swapped the same way.
+
+Reloads run in two ways:
+
+- when MODEL_RELOAD_INTERVAL_SECONDS > 0, a watcher thread checks the
+  cached artifacts and models.json at that interval;
+- ``POST /admin/reload`` with an ``X-Admin-Token`` header equal to
+  ADMIN_TOKEN. The endpoint answers 403 while ADMIN_TOKEN is unset. In the
+  body, ``{"force": true}`` reloads every cached model, and
+  ``{"wait": true}`` returns the summary instead of 202.
+
+When models.json (MODEL_MANIFEST) changes, it is re-read into
+registry.artifacts first and every cached model is reloaded. That picks
+up newly trained pairs and artifacts earlier in a fallback chain, such as
+a new distilled student.
+"""
+import hmac
+import os
+import threading
+import time
+import registry
+from manifest import MANIFEST_PATH, ArtifactIndex
+from result_cache import artifact_version
+
+MODEL_RELOAD_INTERVAL_SECONDS = float(os.environ.get('MODEL_RELOAD_INTERVAL_SECONDS', '0'))
+ADMIN_TOKEN = os.environ.get('ADMIN_TOKEN')
+
+# family -> loader(market, crop, *rest) returning the warmed cache value or None
+_loaders = {}
+# family -> TableSource of its recommendation tables
+_tables = {}
+_lock = threading.Lock()
+_watcher = None
+_stats = {'reloads': 0, 'swapped': 0, 'dropped': 0, 'failed': 0, 'last_reload': None, 'last_seconds': None}
+
+
+def _version(*paths):
+    try:
+        return artifact_version(*paths)
+    except OSError:
+        return None
+
+
+_manifest_version = _version(MANIFEST_PATH)
+
+
+def register(family, loader, table=None):
+    """Make a family reloadable; ``loader`` loads the value cached under (family, market, crop, *rest)"""
+    _loaders[family] = loader
+    if table is not None:
+        _tables[family] = table
+    if MODEL_RELOAD_INTERVAL_SECONDS > 0:
+        start_watcher(MODEL_RELOAD_INTERVAL_SECONDS)
+
+
+def changed(value):
+    """True when the files a cached model was loaded from have changed or gone"""
+    model = value[0]
+    sources = getattr(model, 'sources', None)
+    return sources is not None and _version(*sources) != model.version
+
+
+def reload_key(key, old):
+    """Load the current artifact for a cached key and swap it in; returns 'swapped', 'dropped', 'failed' or None"""
+    family, market, crop, *rest = key
+    try:
+        value = _loaders[family](market, crop, *rest)
+    except Exception as e:
+        # e.g. a truncated artifact that fails to deserialise: keep serving the old model
+        print(f"Reload of {family}:{registry.label(key[1:])} failed: {e}")
+        return 'failed'
+    if value is None:
+        # A half-written or broken artifact must not take the pair out of service
+        if all(os.path.exists(p) for p in getattr(old[0], 'sources', ())):
+            return 'failed'
+        registry.models.pop(key)
+        outcome = 'dropped'
+    elif registry.models.replace(key, value):
+        outcome = 'swapped'
+    else:
+        return None  # evicted meanwhile; the next request loads it lazily
+    registry.results.invalidate(family, market, crop)
+    return outcome
+
+
+def reload(families=None, force=False):
+    """Reload changed artifacts of ``families`` (default every registered one); returns a summary"""
+    global _manifest_version
+    families = [f for f in (families or _loaders) if f in _loaders]
+    with _lock:
+        t0 = time.perf_counter()
+        manifest_version = _version(MANIFEST_PATH)
+        manifest_changed = manifest_version != _manifest_version
+        if manifest_changed:
+            print(f"Model manifest {MANIFEST_PATH} changed; reloading the artifact index")
+            registry.artifacts = ArtifactIndex.load()
+            _manifest_version = manifest_version
+
+        summary = {'manifest': manifest_changed, 'swapped': [], 'dropped': [], 'failed': [], 'tables': []}
+        for key, value in registry.models.items():
+            if key[0] not in _loaders:
+                continue
+            if not (manifest_changed or (key[0] in families and (force or changed(value)))):
+                continue
+            outcome = reload_key(key, value)
+            if outcome is not None:
+                summary[outcome].append(f'{key[0]}:{registry.label(key[1:])}')
+        for family in families:
+            table = _tables.get(family)
+            if table is None:
+                continue
+            try:
+                if table.reload(force=force):
+                    summary['tables'].append(family)
+            except Exception as e:
+                print(f"Reload of the {family} recommendation table failed: {e}")
+                summary['failed'].append(f'{family}:recommendation_table')
+
+        seconds = round(time.perf_counter() - t0, 3)
+        for outcome in ('swapped', 'dropped', 'failed'):
+            _stats[outcome] += len(summary[outcome])
+        _stats['reloads'] += 1
+        _stats['last_reload'] = time.time()
+        _stats['last_seconds'] = seconds
+    if summary['swapped'] or summary['dropped'] or summary['failed'] or summary['tables']:
+        print(f"Reloaded models in {seconds}s: {summary}")
+    return summary
+
+
+def start_watcher(interval):
+    """Check for changed artifacts every ``interval`` seconds in the background (once per process)"""
+    global _watcher
+    with _lock:
+        if _watcher is not None:
+            return
+        def loop():
+            while True:
+                time.sleep(interval)
+                try:
+                    reload()
+                except Exception as e:
+                    print(f"Model reload failed: {e}")
+        _watcher = threading.Thread(target=loop, name='model-reload-watcher', daemon=True)
+    _watcher.start()
+
+
+def handle(token, data, families):
+    """(body, status) for POST /admin/reload"""
+    if not ADMIN_TOKEN or not hmac.compare_digest(token or '', ADMIN_TOKEN):
+        return {'error': 'Forbidden'}, 403
+    data = data if isinstance(data, dict) else {}
+    force = bool(data.get('force'))
+    if data.get('wait'):
+        return reload(families, force), 200
+    threading.Thread(target=reload, args=(families, force), name='model-reload', daemon=True).start()
+    return {'status': 'reloading', 'families': list(families), 'force': force}, 202
+
+
+def stats():
+    return {**_stats, 'watch_interval_seconds': MODEL_RELOAD_INTERVAL_SECONDS or None,
+            'admin_enabled': bool(ADMIN_TOKEN)}
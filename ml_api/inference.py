@@ -0,0 +1,112 @@
+import os
+import numpy as np
+import tensorflow as tf
+
+# XLA-compile the traced forward pass (INFERENCE_JIT=1); off by default
+INFERENCE_JIT = os.environ.get('INFERENCE_JIT', '0') == '1'
+
+
+def has_dropout(config):
+    """Whether a Keras model config applies dropout anywhere (Dropout layers, recurrent or attention dropout)"""
+    if isinstance(config, dict):
+        if str(config.get('class_name', '')).endswith('Dropout'):
+            return True
+        if any(isinstance(config.get(k), (int, float)) and config[k] > 0 for k in ('dropout', 'recurrent_dropout')):
+            return True
+        return any(has_dropout(v) for v in config.values())
+    if isinstance(config, list):
+        return any(has_dropout(v) for v in config)
+    return False
+
+
+def _layers(layer):
+    for child in getattr(layer, 'layers', ()):
+        yield child
+        yield from _layers(child)
+
+
+def variable_length(model):
+    """Whether a (B, T, F) model also runs on windows of another length, as ``model.predict`` allowed.
+
+    Recurrent stacks do; anything that flattens the time axis does not.
+    """
+    shape = tuple(model.input_shape)
+    if len(shape) != 3 or shape[2] is None:
+        return False
+    if shape[1] is None:
+        return True
+    try:
+        model(np.zeros((1, shape[1] + 1, shape[2]), dtype=np.float32), training=False)
+    except Exception:
+        return False
+    return True
+
+
+class CompiledModel:
+    """Keras model wrapped in a traced tf.function with a fixed input signature.
+
+    ``model.predict`` builds a data adapter and callback stack on every call,
+    which dominates the cost of a single (1, SEQ_LENGTH, F) forecast. The
+    wrapper traces the forward pass once for a (None, T, F) float32
+    signature, so any batch size reuses the same concrete function. T is
+    None for models that accept any window length (``variable_length``):
+    the apps send SEQ_LENGTH windows, which need not match the length a
+    model was trained on.
+
+    ``retraces`` counts how many times tracing actually ran; anything above 1
+    means shapes or dtypes are forcing recompilation. ``horizons`` lists the
+    days ahead of each output column (loaders set it from the artifact's
+    metadata); column 0 is always the one-step forecast.
+    """
+
+    def __init__(self, model, jit_compile=None):
+        self.model = model
+        self.input_shape = tuple(model.input_shape[1:])
+        self.jit_compile = INFERENCE_JIT if jit_compile is None else jit_compile
+        self.retraces = 0
+        self.horizons = (1,)
+        steps = None if variable_length(model) else self.input_shape[0]
+        self._spec = tf.TensorSpec(shape=(None, steps) + self.input_shape[1:], dtype=tf.float32)
+        self._forward = tf.function(self._trace, input_signature=[self._spec], jit_compile=self.jit_compile)
+        self._stochastic = None
+
+    def _trace(self, x):
+        # Python side effects only run while tracing
+        self.retraces += 1
+        return self.model(x, training=False)
+
+    def warm(self, batch_size=1):
+        """Trace and run once on zeros so the first request pays no compile cost"""
+        shape = (batch_size,) + tuple(d or 1 for d in self.input_shape)
+        self(np.zeros(shape, dtype=np.float32))
+        return self
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        return self._forward(tf.convert_to_tensor(X)).numpy()
+
+    def predict(self, X, verbose=0):
+        """Drop-in for ``Model.predict`` on callers that still use it"""
+        return self(X)
+    
+    def mc_dropout(self, x, samples):
+        """``samples`` stochastic outputs for one (T, F) input, as one tiled batch with dropout active.
+        
+        Batch normalisation layers are frozen first so they keep their moving
+        statistics in training mode; only dropout differs between rows.
+        ValueError when the model has no dropout (e.g. an optimize_graph.py artifact).
+        """
+        if self._stochastic is None:
+            if not has_dropout(self.model.get_config()):
+                raise ValueError('Model has no dropout to sample from')
+            for layer in _layers(self.model):
+                if isinstance(layer, tf.keras.layers.BatchNormalization):
+                    layer.trainable = False
+            self._stochastic = tf.function(lambda X: self.model(X, training=True), input_signature=[self._spec])
+        X = np.repeat(np.asarray(x, dtype=np.float32)[np.newaxis], samples, axis=0)
+        return self._stochastic(tf.convert_to_tensor(X)).numpy()
+
+
+def compile_model(model, jit_compile=None):
+    """Wrap a loaded Keras model and warm it at load time"""
+    return CompiledModel(model, jit_compile=jit_compile).warm()
@@ -0,0 +1,238 @@
+"""Model manifest (models.json) and the in-memory artifact index built from it.
+
+The training scripts (and distill.py) record every model they save:
+
+    "lstm_attention_davangere_Maize": {
+        "variant": "attention", "market": "davangere", "crop": "Maize",
+        "model": "lstm_attention_davangere_Maize.keras",
+        "scaler": "lstm_attention_davangere_Maize_scaler.pkl",
+        "input_shape": [60, 32], "features": [...],
+        "scaler_type": {"price_scaler": "RobustScaler", "feature_scaler": "RobustScaler"},
+        "horizons": [1, 7, 14], "sha256": "...", "metrics": {"mape": 4.12, ...}
+    }
+
+At startup the apps load it into an ``ArtifactIndex`` (registry.artifacts),
+so availability checks, fallbacks and 404s are dictionary lookups against
+the trained models instead of ``os.path.exists`` probes on every cache miss.
+Without a models.json the index probes the filesystem as before.
+
+    python manifest.py    # (re)build models.json from the artifacts in the directory
+"""
+import glob
+import hashlib
+import json
+import os
+import zipfile
+import joblib
+from backends import backend_for, find_artifact
+from features import FEATURE_NAMES
+
+MANIFEST_PATH = os.environ.get('MODEL_MANIFEST', 'models.json')
+MANIFEST_VERSION = 1
+
+# Artifact prefix -> variant; longest first, so students are not read as attention models
+PREFIXES = (
+    ('lstm_attention_student_', 'student'),
+    ('lstm_attention_', 'attention'),
+    ('lstm_enhanced_', 'enhanced'),
+    ('lstm_', 'baseline'),
+)
+MODEL_SUFFIXES = ('.keras', '.h5')
+
+
+def parse_stem(stem):
+    """'lstm_enhanced_davangere_Maize' -> ('enhanced', 'davangere', 'Maize'), or None"""
+    name = os.path.basename(stem)
+    for prefix, variant in PREFIXES:
+        if name.startswith(prefix):
+            market, _, crop = name[len(prefix):].partition('_')
+            return (variant, market, crop) if market and crop and '_' not in crop else None
+    return None
+
+
+def file_hash(*paths):
+    """sha256 over the contents of ``paths``"""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+
+def keras_input_shape(path):
+    """Input shape (without the batch axis) from a .keras archive's config, without importing TensorFlow"""
+    try:
+        with zipfile.ZipFile(path) as archive:
+            config = json.loads(archive.read('config.json'))
+        return list(config['build_config']['input_shape'][1:])
+    except (OSError, KeyError, TypeError, ValueError, zipfile.BadZipFile):
+        return None
+
+
+def _scaler_types(scaler_obj):
+    if isinstance(scaler_obj, dict):
+        return {k: type(v).__name__ for k, v in scaler_obj.items() if k.endswith('_scaler') and v is not None}
+    return {'price_scaler': type(scaler_obj).__name__}
+
+
+def forecast_metrics(horizons, mapes, samples, **extra):
+    """Manifest metrics from a training script's held-out evaluation (MAPE per horizon, in %)"""
+    return {
+        'mape': round(float(mapes[0]), 4),
+        'mape_by_horizon': {str(h): round(float(m), 4) for h, m in zip(horizons, mapes)},
+        'test_samples': int(samples),
+        **{k: round(float(v), 4) for k, v in extra.items()},
+    }
+
+
+def describe(stem, metrics=None):
+    """Manifest entry for the trained model saved under ``stem``, or None when it is incomplete"""
+    parsed = parse_stem(stem)
+    model_path = next((stem + s for s in MODEL_SUFFIXES if os.path.exists(stem + s)), None)
+    scaler_path = stem + '_scaler.pkl'
+    if parsed is None or model_path is None or not os.path.exists(scaler_path):
+        return None
+    variant, market, crop = parsed
+    scaler_obj = joblib.load(scaler_path)
+    if metrics is None and isinstance(scaler_obj, dict) and 'mape' in scaler_obj:
+        # distill.py keeps the student's report next to the teacher's scalers
+        metrics = {k: scaler_obj[k] for k in ('student', 'mape', 'teacher_mape', 'latency_ms', 'teacher_latency_ms')
+                   if k in scaler_obj}
+    horizons = scaler_obj.get('horizons', [1]) if isinstance(scaler_obj, dict) else [1]
+    input_shape = keras_input_shape(model_path) if model_path.endswith('.keras') else None
+    features = FEATURE_NAMES['attention' if variant == 'student' else variant]
+    if input_shape and input_shape[-1] == 1:
+        features = ['price']  # older price-only models
+    return {
+        'variant': variant,
+        'market': market,
+        'crop': crop,
+        'model': os.path.basename(model_path),
+        'scaler': os.path.basename(scaler_path),
+        'input_shape': input_shape,
+        'features': features,
+        'scaler_type': _scaler_types(scaler_obj),
+        'horizons': [int(h) for h in horizons],
+        'sha256': file_hash(model_path, scaler_path),
+        'metrics': metrics or {},
+    }
+
+
+def read_manifest(path=MANIFEST_PATH):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {'version': MANIFEST_VERSION, 'models': {}}
+
+
+def write_manifest(manifest, path=MANIFEST_PATH):
+    """Atomic replace, so a serving process never reads a half-written manifest"""
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp, path)
+
+
+def record(stem, metrics=None, path=MANIFEST_PATH):
+    """Add or refresh the manifest entry of a freshly saved model; keeps earlier metrics when none are given"""
+    manifest = read_manifest(path)
+    name = os.path.basename(stem)
+    entry = describe(stem, metrics)
+    if entry is None:
+        manifest['models'].pop(name, None)
+    else:
+        if not entry['metrics']:
+            entry['metrics'] = manifest['models'].get(name, {}).get('metrics', {})
+        manifest['models'][name] = entry
+    write_manifest(manifest, path)
+    return entry
+
+
+def rebuild(directory='.', path=None):
+    """Manifest of every complete artifact in ``directory``, keeping recorded metrics"""
+    path = path or os.path.join(directory, os.path.basename(MANIFEST_PATH))
+    previous = read_manifest(path)['models']
+    models = {}
+    for scaler_path in sorted(glob.glob(os.path.join(directory, 'lstm_*_scaler.pkl'))):
+        stem = scaler_path[:-len('_scaler.pkl')]
+        name = os.path.basename(stem)
+        entry = describe(stem, previous.get(name, {}).get('metrics'))
+        if entry is not None:
+            models[name] = entry
+    write_manifest({'version': MANIFEST_VERSION, 'models': models}, path)
+    return models
+
+
+class ArtifactIndex:
+    """Dictionary view of models.json plus one listing of its directory.
+
+    ``exists`` and ``has`` answer from memory, so the loaders' fallback
+    chains never touch the filesystem. When no manifest was found the index
+    is disabled and every check falls through to ``os.path.exists``.
+    """
+
+    def __init__(self, models=None, files=(), directory='.'):
+        self.enabled = models is not None
+        self.directory = directory
+        self.models = {os.path.normpath(os.path.join(directory, name)): entry for name, entry in (models or {}).items()}
+        self.files = {os.path.normpath(os.path.join(directory, name)) for name in files}
+        self.pairs = {(e['variant'], e['market'], e['crop']) for e in self.models.values()}
+
+    @classmethod
+    def load(cls, path=MANIFEST_PATH):
+        if not os.path.exists(path):
+            print(f'No model manifest at {path}; probing the filesystem for artifacts')
+            return cls()
+        directory = os.path.dirname(path) or '.'
+        models = read_manifest(path).get('models', {})
+        print(f'Indexed {len(models)} models from {path}')
+        return cls(models, os.listdir(directory), directory)
+
+    def exists(self, path):
+        if not self.enabled:
+            return os.path.exists(path)
+        return os.path.normpath(path) in self.files
+
+    def has(self, stem):
+        """Whether the manifest lists a model under ``stem`` (always True when disabled)"""
+        return not self.enabled or os.path.normpath(stem) in self.models
+
+    def entry(self, stem):
+        return self.models.get(os.path.normpath(stem))
+
+    def servable(self, stem, backend=None):
+        """(model path, scaler path) to load for ``stem``, or None when it is not trained"""
+        if not self.has(stem):
+            return None
+        model_path = find_artifact(stem, backend, exists=self.exists)
+        # A bundle carries its own scalers
+        scaler_path = model_path if model_path and backend_for(model_path) == 'bundle' else f'{stem}_scaler.pkl'
+        if model_path is None or not self.exists(scaler_path):
+            return None
+        return model_path, scaler_path
+
+    def market_crops(self, variants, default):
+        """{market: [crops]} with a trained model in any of ``variants``; ``default`` when disabled"""
+        if not self.enabled:
+            return default
+        pairs = {}
+        for variant, market, crop in self.pairs:
+            if variant in variants:
+                pairs.setdefault(market, set()).add(crop)
+        return {market: sorted(crops) for market, crops in sorted(pairs.items())}
+
+    def trained(self, market, crop, variants):
+        """Whether any of ``variants`` has a model for the pair (always True when disabled)"""
+        return not self.enabled or any((variant, market, crop) in self.pairs for variant in variants)
+
+    def stats(self):
+        return {'manifest': self.enabled, 'models': len(self.models), 'files': len(self.files)}
+
+
+if __name__ == '__main__':
+    models = rebuild()
+    print(f'Wrote {len(models)} models to {MANIFEST_PATH}')
+    for name, entry in models.items():
+        print(f"  {name}: {entry['variant']} {entry['input_shape']} {entry['metrics'].get('mape', '-')}")
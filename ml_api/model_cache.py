@@ -0,0 +1,310 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+import numpy as np
+
+# Rough fixed cost of a loaded Keras model on top of its weights (graph, traces, Python objects)
+MODEL_OVERHEAD_BYTES = int(float(os.environ.get('MODEL_OVERHEAD_MB', '4')) * 1024 * 1024)
+
+
+def estimate_nbytes(obj, _seen=None):
+    """Approximate resident size of a cache value (models, scalers, tuples/dicts of them)"""
+    if _seen is None:
+        _seen = set()
+    if obj is None or id(obj) in _seen:
+        return 0
+    _seen.add(id(obj))
+    if isinstance(obj, np.ndarray):
+        return obj.nbytes
+    if isinstance(obj, (tuple, list)):
+        return sum(estimate_nbytes(o, _seen) for o in obj)
+    if isinstance(obj, dict):
+        return sum(estimate_nbytes(o, _seen) for o in obj.values())
+    # Objects that report their own footprint (NumPy LSTM engine) carry no graph overhead
+    nbytes = getattr(obj, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+    # CompiledModel wraps the Keras model
+    model = getattr(obj, 'model', obj)
+    weights = getattr(model, 'weights', None)
+    if weights is not None and hasattr(model, 'count_params'):
+        return MODEL_OVERHEAD_BYTES + sum(_weight_nbytes(w) for w in weights)
+    # sklearn estimators keep their fitted state as ndarray attributes
+    state = getattr(obj, '__dict__', None)
+    if state:
+        return sum(estimate_nbytes(v, _seen) for v in state.values() if isinstance(v, np.ndarray))
+    return 0
+
+
+def _weight_nbytes(w):
+    # tf.DType exposes .size; Keras 3 variables report dtype as a string
+    itemsize = getattr(w.dtype, 'size', None) or np.dtype(w.dtype).itemsize
+    return int(np.prod(w.shape)) * itemsize
+
+
+def parse_pins(spec):
+    """'davangere:Maize,hospet:Tomato' -> {('davangere', 'Maize'), ('hospet', 'Tomato')}"""
+    pins = set()
+    for item in (spec or '').split(','):
+        if ':' in item:
+            market, crop = item.split(':', 1)
+            pins.add((market.strip(), crop.strip()))
+    return pins
+
+
+class _Entry:
+    __slots__ = ('value', 'nbytes', 'last_used')
+
+    def __init__(self, value, nbytes):
+        self.value = value
+        self.nbytes = nbytes
+        self.last_used = time.monotonic()
+
+
+class ModelCache:
+    """Thread-safe model cache with a byte budget, LRU eviction and idle expiry.
+
+    Values are whatever a loader returns (usually a tuple of model and
+    scalers); their footprint is estimated with ``estimate_nbytes``. Entries
+    are evicted least-recently-used first once ``max_bytes`` is exceeded, and
+    unloaded after ``ttl`` seconds without a hit. Pinned keys are never
+    evicted or expired; a pinned (market, crop) pair also pins that pair's
+    entries in every family (see registry.py).
+
+    ``get_or_load`` loads each key at most once at a time: concurrent misses
+    wait on the first caller's future instead of loading the same artifact
+    again, and a key whose loader found nothing (or failed) is remembered for
+    ``negative_ttl`` seconds so repeated requests skip the filesystem.
+    """
+
+    def __init__(self, max_bytes=None, ttl=None, pinned=(), negative_ttl=30.0):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.pinned = set(pinned)
+        self.negative_ttl = negative_ttl
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._negative = {}
+        self._lock = threading.RLock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.loads = 0
+        self.load_failures = 0
+        self.shared_loads = 0
+        self.negative_hits = 0
+        self.replacements = 0
+
+    @classmethod
+    def from_env(cls):
+        """MODEL_CACHE_MAX_MB, MODEL_CACHE_TTL_SECONDS and MODEL_CACHE_PIN (0/empty = unbounded)"""
+        max_mb = float(os.environ.get('MODEL_CACHE_MAX_MB', '0'))
+        ttl = float(os.environ.get('MODEL_CACHE_TTL_SECONDS', '0'))
+        cache = cls(
+            max_bytes=int(max_mb * 1024 * 1024) if max_mb > 0 else None,
+            ttl=ttl if ttl > 0 else None,
+            pinned=parse_pins(os.environ.get('MODEL_CACHE_PIN')),
+            negative_ttl=float(os.environ.get('MODEL_CACHE_NEGATIVE_TTL_SECONDS', '30')),
+        )
+        if cache.ttl is not None:
+            cache.start_reaper(interval=min(60.0, cache.ttl))
+        return cache
+
+    def get(self, key):
+        """Return the cached value (marking it recently used) or None"""
+        with self._lock:
+            self._expire_idle()
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            entry.last_used = time.monotonic()
+            self._entries.move_to_end(key)
+            return entry.value
+
+    def get_or_load(self, key, loader):
+        """Return the cached value, loading it once via ``loader()`` on a miss.
+
+        ``loader`` returns the value to cache, or None when the artifact does
+        not exist. Returns None for missing or recently failed keys.
+        """
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry.value
+            expires = self._negative.get(key)
+            if expires is not None:
+                if expires > time.monotonic():
+                    self.negative_hits += 1
+                    return None
+                del self._negative[key]
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+            else:
+                self.shared_loads += 1
+        if not owner:
+            return future.result()
+
+        try:
+            value = loader()
+        except Exception as e:
+            with self._lock:
+                self.load_failures += 1
+                self._remember_missing(key)
+                del self._inflight[key]
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self.loads += 1
+            if value is None:
+                self._remember_missing(key)
+            else:
+                self.put(key, value)
+            del self._inflight[key]
+        future.set_result(value)
+        return value
+
+    def _remember_missing(self, key):
+        # Caller holds the lock
+        if self.negative_ttl > 0:
+            self._negative[key] = time.monotonic() + self.negative_ttl
+
+    def put(self, key, value, nbytes=None):
+        """Insert ``value`` and evict LRU entries until the budget holds"""
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old.nbytes
+            self._entries[key] = _Entry(value, nbytes)
+            self._bytes += nbytes
+            self._negative.pop(key, None)
+            self._evict(keep=key)
+        return value
+
+    def replace(self, key, value, nbytes=None):
+        """Swap in a new value for a cached key, keeping its LRU position; False if the key is gone.
+        
+        Callers already holding the old value keep using it, so in-flight
+        requests finish on the previous model while new lookups get ``value``.
+        """
+        if nbytes is None:
+            nbytes = estimate_nbytes(value)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return False
+            self._bytes += nbytes - entry.nbytes
+            entry.value = value
+            entry.nbytes = nbytes
+            self.replacements += 1
+            self._evict(keep=key)
+            return True
+    
+    def pop(self, key):
+        """Drop one entry; returns its value or None"""
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return None
+            self._bytes -= entry.nbytes
+            return entry.value
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._negative.clear()
+            self._bytes = 0
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def keys(self):
+        """Snapshot of cached keys (does not count as a hit)"""
+        with self._lock:
+            return list(self._entries.keys())
+
+    def items(self):
+        """Snapshot of (key, value) pairs (does not count as a hit)"""
+        with self._lock:
+            return [(k, e.value) for k, e in self._entries.items()]
+
+    def is_pinned(self, key):
+        """True for a pinned key, or a (family, market, crop, ...) key of a pinned pair"""
+        return key in self.pinned or tuple(key[1:3]) in self.pinned
+
+    def _evict(self, keep=None):
+        # Caller holds the lock
+        if self.max_bytes is None:
+            return
+        for key in list(self._entries.keys()):
+            if self._bytes <= self.max_bytes:
+                break
+            if key == keep or self.is_pinned(key):
+                continue
+            entry = self._entries.pop(key)
+            self._bytes -= entry.nbytes
+            self.evictions += 1
+            print(f"Evicted model {key} ({entry.nbytes / 1e6:.1f} MB) to stay within cache budget")
+
+    def _expire_idle(self):
+        # Caller holds the lock
+        if self.ttl is None:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for key in [k for k, e in self._entries.items() if e.last_used < cutoff and not self.is_pinned(k)]:
+            entry = self._entries.pop(key)
+            self._bytes -= entry.nbytes
+            self.expirations += 1
+
+    def expire_idle(self):
+        """Unload entries idle longer than the TTL"""
+        with self._lock:
+            self._expire_idle()
+
+    def start_reaper(self, interval):
+        """Expire idle entries in the background even when no requests arrive"""
+        def loop():
+            while True:
+                time.sleep(interval)
+                self.expire_idle()
+        threading.Thread(target=loop, name='model-cache-reaper', daemon=True).start()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'max_bytes': self.max_bytes,
+                'ttl_seconds': self.ttl,
+                'pinned': sorted('-'.join(map(str, k)) for k in self.pinned),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'loads': self.loads,
+                'load_failures': self.load_failures,
+                'shared_loads': self.shared_loads,
+                'negative_hits': self.negative_hits,
+                'replacements': self.replacements,
+                'negative_entries': len(self._negative),
+            }
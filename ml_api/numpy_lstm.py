@@ -0,0 +1,215 @@
+"""Pure-NumPy inference for the baseline LSTM models (train_lstm.build_model).
+
+A Keras model made of LSTM, Dropout and Dense layers is exported once to a
+``.npz`` of its weights; ``NumpyLSTM`` then evaluates it without importing
+TensorFlow. Export every baseline model in the current directory with
+
+    python numpy_lstm.py [lstm_davangere_Maize.keras ...]
+"""
+import glob
+import os
+import sys
+import threading
+import numpy as np
+
+ACTIVATIONS = ('linear', 'relu', 'tanh', 'sigmoid')
+SKIPPED_LAYERS = ('InputLayer', 'Dropout')
+
+
+def npz_path(model_path):
+    """lstm_davangere_Maize.keras -> lstm_davangere_Maize.npz"""
+    return os.path.splitext(model_path)[0] + '.npz'
+
+
+def export_npz(model, path):
+    """Write a Keras LSTM/Dropout/Dense model's weights to ``path``; ValueError for anything else"""
+    with open(path, 'wb') as f:
+        np.savez(f, **numpy_arrays(model))
+    return path
+
+
+def numpy_arrays(model):
+    """The arrays ``NumpyLSTM.from_arrays`` evaluates, from a Keras LSTM/Dropout/Dense model"""
+    arrays = {}
+    kinds = []
+    for layer in model.layers:
+        kind = layer.__class__.__name__
+        if kind in SKIPPED_LAYERS:
+            continue  # Dropout is the identity at inference time
+        cfg = layer.get_config()
+        prefix = f'{len(kinds)}_'
+        if kind == 'LSTM':
+            if cfg.get('activation') not in ACTIVATIONS or cfg.get('recurrent_activation') != 'sigmoid' or not cfg.get('use_bias', True):
+                raise ValueError(f'{layer.name}: only sigmoid-gated LSTMs with a bias can be exported')
+            kernel, recurrent, bias = layer.get_weights()
+            arrays[prefix + 'kernel'] = kernel
+            arrays[prefix + 'recurrent'] = recurrent
+            arrays[prefix + 'bias'] = bias
+            arrays[prefix + 'return_sequences'] = np.array(bool(cfg.get('return_sequences')))
+            arrays[prefix + 'activation'] = np.array(cfg.get('activation'))
+        elif kind == 'Dense':
+            if cfg.get('activation', 'linear') not in ACTIVATIONS:
+                raise ValueError(f'{layer.name}: unsupported activation {cfg.get("activation")}')
+            weights = layer.get_weights()
+            arrays[prefix + 'kernel'] = weights[0]
+            arrays[prefix + 'bias'] = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[1], dtype=weights[0].dtype)
+            arrays[prefix + 'activation'] = np.array(cfg.get('activation', 'linear'))
+        else:
+            raise ValueError(f'{layer.name}: {kind} layers are not supported by the NumPy engine')
+        kinds.append(kind)
+    arrays['layers'] = np.array(kinds)
+    arrays['input_shape'] = np.array(model.input_shape[1:])
+    return arrays
+
+
+def _sigmoid(z):
+    # In place; exp overflow for very negative inputs correctly saturates to 0
+    with np.errstate(over='ignore'):
+        np.negative(z, out=z)
+        np.exp(z, out=z)
+    z += 1.0
+    np.reciprocal(z, out=z)
+
+
+def _activate(x, activation):
+    if activation == 'relu':
+        np.maximum(x, 0.0, out=x)
+    elif activation == 'tanh':
+        np.tanh(x, out=x)
+    elif activation == 'sigmoid':
+        _sigmoid(x)
+    return x
+
+
+class NumpyLSTM:
+    """Batched float32 forward pass for an exported LSTM/Dense stack.
+
+    Mirrors the ``CompiledModel`` interface (``input_shape``, ``horizons``,
+    ``retraces``, ``warm``, ``predict``, call on a (B, T, F) array), so the
+    apps can use either engine. The input projection for all timesteps is one
+    matmul per layer; only the recurrent term runs per step. Gate, state and
+    sequence buffers are allocated once per thread at the largest batch seen
+    and reused across calls.
+    """
+
+    def __init__(self, layers, input_shape):
+        self.layers = layers
+        self.input_shape = tuple(int(d) for d in input_shape)
+        self.horizons = (1,)
+        self.retraces = 0  # nothing is traced; kept for /metrics parity with CompiledModel
+        self._local = threading.local()
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path, allow_pickle=False) as data:
+            return cls.from_arrays(data)
+    
+    @classmethod
+    def from_arrays(cls, data):
+        """Build from a mapping laid out like ``numpy_arrays``; float32 weights are used without copying"""
+        layers = []
+        for i, kind in enumerate(np.asarray(data['layers']).tolist()):
+            prefix = f'{i}_'
+            layer = {'kind': kind,
+                     'kernel': np.asarray(data[prefix + 'kernel'], dtype=np.float32),
+                     'bias': np.asarray(data[prefix + 'bias'], dtype=np.float32)}
+            layer['activation'] = str(data[prefix + 'activation'])
+            if kind == 'LSTM':
+                layer['recurrent'] = np.asarray(data[prefix + 'recurrent'], dtype=np.float32)
+                layer['return_sequences'] = bool(data[prefix + 'return_sequences'])
+            layers.append(layer)
+        return cls(layers, data['input_shape'])
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for layer in self.layers for a in layer.values() if isinstance(a, np.ndarray))
+
+    def _buffers(self, batch, steps):
+        local = self._local
+        if getattr(local, 'capacity', 0) < batch or local.steps != steps:
+            capacity = max(batch, getattr(local, 'capacity', 0))
+            local.buffers = []
+            for layer in self.layers:
+                if layer['kind'] != 'LSTM':
+                    local.buffers.append(None)
+                    continue
+                units = layer['recurrent'].shape[0]
+                local.buffers.append({
+                    'xw': np.empty((capacity, steps, 4 * units), dtype=np.float32),
+                    'z': np.empty((capacity, 4 * units), dtype=np.float32),
+                    'h': np.empty((capacity, units), dtype=np.float32),
+                    'c': np.empty((capacity, units), dtype=np.float32),
+                    'tmp': np.empty((capacity, units), dtype=np.float32),
+                    'seq': np.empty((capacity, steps, units), dtype=np.float32) if layer['return_sequences'] else None,
+                })
+            local.capacity = capacity
+            local.steps = steps
+        return local.buffers
+
+    @staticmethod
+    def _lstm(x, layer, buf, batch):
+        units = layer['recurrent'].shape[0]
+        xw, z = buf['xw'][:batch], buf['z'][:batch]
+        h, c, tmp = buf['h'][:batch], buf['c'][:batch], buf['tmp'][:batch]
+        seq = buf['seq'][:batch] if buf['seq'] is not None else None
+        activation = layer['activation']
+        # Input projection for every timestep at once; Keras gate order is i, f, c, o
+        np.matmul(x, layer['kernel'], out=xw)
+        xw += layer['bias']
+        h.fill(0.0)
+        c.fill(0.0)
+        i_f, g, o = z[:, :2 * units], z[:, 2 * units:3 * units], z[:, 3 * units:]
+        for t in range(x.shape[1]):
+            np.matmul(h, layer['recurrent'], out=z)
+            z += xw[:, t]
+            _sigmoid(i_f)
+            _sigmoid(o)
+            _activate(g, activation)
+            c *= z[:, units:2 * units]
+            np.multiply(z[:, :units], g, out=tmp)
+            c += tmp
+            tmp[...] = c
+            _activate(tmp, activation)
+            np.multiply(o, tmp, out=h)
+            if seq is not None:
+                seq[:, t] = h
+        return seq if seq is not None else h
+
+    def __call__(self, X):
+        X = np.asarray(X, dtype=np.float32)
+        buffers = self._buffers(len(X), X.shape[1])
+        out = X
+        for layer, buf in zip(self.layers, buffers):
+            if layer['kind'] == 'LSTM':
+                out = self._lstm(out, layer, buf, len(X))
+            else:
+                out = _activate(out @ layer['kernel'] + layer['bias'], layer['activation'])
+        # Never hand out views of the reused buffers
+        return np.array(out, copy=True)
+
+    def predict(self, X, verbose=0):
+        return self(X)
+
+    def warm(self, batch_size=1):
+        """Allocate buffers and run once so the first request pays no setup cost"""
+        self(np.zeros((batch_size,) + self.input_shape, dtype=np.float32))
+        return self
+
+
+def load_numpy_model(path):
+    """Load and warm an exported model"""
+    return NumpyLSTM.load(path).warm()
+
+
+if __name__ == '__main__':
+    from tensorflow.keras.models import load_model
+
+    paths = sys.argv[1:] or [p for p in sorted(glob.glob('lstm_*.keras'))
+                             if not p.startswith(('lstm_enhanced_', 'lstm_attention_')) and '.inference.' not in p]
+    for model_path in paths:
+        keras_model = load_model(model_path, compile=False)
+        out = export_npz(keras_model, npz_path(model_path))
+        # Check the export against Keras on random inputs before trusting it
+        X = np.random.default_rng(0).normal(size=(8,) + tuple(keras_model.input_shape[1:])).astype(np.float32)
+        err = float(np.max(np.abs(NumpyLSTM.load(out)(X) - keras_model(X, training=False).numpy())))
+        print(f'Exported {model_path} -> {out} (max abs diff vs Keras {err:.2e})')
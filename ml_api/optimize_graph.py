@@ -0,0 +1,308 @@
+"""Export-time graph optimisation for the Keras LSTM families.
+
+``build_hybrid_model`` (train_lstm_enhanced.py) and
+``build_attention_lstm_model`` (train_attention_lstm.py) carry
+BatchNormalization, LayerNormalization and Dropout layers that are either
+fixed affine maps or the identity at inference time. ``optimize_model``
+returns an equivalent inference-only model:
+
+* Dropout layers are removed, and dropout rates inside LSTM/GRU and
+  MultiHeadAttention layers are set to zero.
+* A BatchNormalization directly after a linear Dense/Conv1D is folded into
+  that layer's kernel and bias.
+* Any other BatchNormalization is folded into the Dense, LSTM/GRU
+  (including Bidirectional) or 'valid' Conv1D layer that consumes it. The
+  fold can pass through Dropout, GlobalAveragePooling1D and Cropping1D,
+  and through MaxPooling1D when every scale is positive.
+* A LayerNormalization's gamma/beta are folded the same way, leaving a
+  parameter-free normalisation in place.
+
+Norm layers whose output is shared (e.g. the residual around attention) or
+padded are left as they are. ``python optimize_graph.py`` writes
+``{stem}.inference.keras`` only when it matches the original within
+``--atol``, and prints per-layer timings before and after;
+backends.find_artifact serves it ahead of the training artifact.
+
+    python optimize_graph.py [lstm_enhanced_davangere_Maize.keras ...] [--atol 1e-4]
+"""
+import argparse
+import glob
+import os
+import time
+import numpy as np
+
+OPTIMIZED_SUFFIX = '.inference.keras'
+# Layers an affine map commutes with on its way to the consumer (MaxPooling1D only for positive scales)
+PASS_THROUGH = ('Dropout', 'GlobalAveragePooling1D', 'Cropping1D', 'MaxPooling1D')
+RECURRENT = ('LSTM', 'GRU')
+
+
+def optimized_path(model_path):
+    """lstm_enhanced_davangere_Maize.keras -> lstm_enhanced_davangere_Maize.inference.keras"""
+    return os.path.splitext(model_path)[0] + OPTIMIZED_SUFFIX
+
+
+def _kind(op):
+    return op.__class__.__name__
+
+
+def _graph(model):
+    """(producer, consumers) maps over the model's own operations, keyed by id"""
+    ops = list(getattr(model, 'operations', None) or model.layers)
+    own = {id(op) for op in ops}
+    producer, consumers = {}, {}
+    for op in ops:
+        users = []
+        for node in op._outbound_nodes:
+            if id(node.operation) in own and all(id(u) != id(node.operation) for u in users):
+                users.append(node.operation)
+        consumers[id(op)] = users
+        for node in op._inbound_nodes:
+            parents = [t._keras_history[0] for t in node.input_tensors]
+            if parents and all(id(p) in own for p in parents):
+                producer[id(op)] = parents[0] if len(parents) == 1 else None
+                break
+    return ops, producer, consumers
+
+
+def _affine(layer):
+    """Per-channel (scale, shift) the norm layer applies at inference, or None if it is not per last axis"""
+    cfg = layer.get_config()
+    axis = cfg.get('axis', -1)
+    axis = axis[0] if isinstance(axis, (list, tuple)) and len(axis) == 1 else axis
+    if axis not in (-1, len(layer.input.shape) - 1):
+        return None
+    weights = {w.path.split('/')[-1]: np.asarray(w.numpy(), dtype=np.float64) for w in layer.weights}
+    channels = layer.input.shape[-1]
+    gamma = weights.get('gamma', np.ones(channels))
+    beta = weights.get('beta', np.zeros(channels))
+    if _kind(layer) == 'LayerNormalization':
+        return gamma, beta
+    scale = gamma / np.sqrt(weights['moving_variance'] + cfg['epsilon'])
+    return scale, beta - weights['moving_mean'] * scale
+
+
+def _fold_into_input(weights, kind, layer, scale, shift):
+    """Consumer weights with ``x -> scale * x + shift`` applied to its input folded in"""
+    if kind == 'Bidirectional':
+        half = len(weights) // 2
+        inner = _kind(layer.forward_layer)
+        return (_fold_into_input(weights[:half], inner, layer.forward_layer, scale, shift)
+                + _fold_into_input(weights[half:], inner, layer.backward_layer, scale, shift))
+    kernel = weights[0]
+    if kind == 'Conv1D':
+        bias_delta = np.einsum('i,tio->o', shift, kernel)
+        new_kernel = kernel * scale[np.newaxis, :, np.newaxis]
+    else:
+        bias_delta = shift @ kernel
+        new_kernel = kernel * scale[:, np.newaxis]
+    rest = list(weights[1:])
+    bias_at = 2 if kind in RECURRENT else 1
+    bias = rest[bias_at - 1] if len(weights) > bias_at else np.zeros(kernel.shape[-1])
+    if bias.ndim == 2:
+        bias = bias.copy()
+        bias[0] += bias_delta  # GRU reset_after: row 0 is the input bias
+    else:
+        bias = bias + bias_delta
+    if len(weights) > bias_at:
+        rest[bias_at - 1] = bias
+    else:
+        rest.append(bias)
+    return [new_kernel] + rest
+
+
+def _foldable_consumer(op):
+    """True when ``op`` takes one input and an affine map of it can be folded into its weights"""
+    kind = _kind(op)
+    if kind == 'Dense':
+        return True
+    if kind == 'Conv1D':
+        cfg = op.get_config()
+        return cfg['padding'] == 'valid' or tuple(cfg['kernel_size']) == (1,)
+    if kind in RECURRENT:
+        return True
+    if kind == 'Bidirectional':
+        return _kind(op.forward_layer) in RECURRENT
+    return False
+
+
+def plan_folds(model):
+    """Which layers to drop, fold or rewrite; returns (skip, folds, rewrites, notes)
+
+    ``skip``: names of layers removed from the graph. ``folds``: layer
+    name -> list of (kind, scale, shift) applied to its input (or output,
+    for backward folds). ``rewrites``: names of LayerNormalizations made
+    parameter-free. ``notes``: human readable reasons for unfolded norms.
+    """
+    ops, producer, consumers = _graph(model)
+    skip, rewrites, notes = set(), set(), []
+    folds = {}
+    for op in ops:
+        kind = _kind(op)
+        if kind == 'Dropout':
+            skip.add(op.name)
+        if kind not in ('BatchNormalization', 'LayerNormalization'):
+            continue
+        affine = _affine(op)
+        if affine is None:
+            notes.append(f'{op.name}: not normalising the last axis')
+            continue
+        scale, shift = affine
+        parent = producer.get(id(op))
+        # Backward: linear Dense/Conv1D -> BN with no other reader of the Dense output
+        if (kind == 'BatchNormalization' and parent is not None and _kind(parent) in ('Dense', 'Conv1D')
+                and parent.get_config().get('activation') == 'linear' and len(consumers[id(parent)]) == 1):
+            folds.setdefault(parent.name, []).append(('output', scale, shift))
+            skip.add(op.name)
+            continue
+        # Forward: walk single-consumer pass-through layers to a foldable consumer
+        target, reason = op, None
+        while reason is None:
+            users = consumers[id(target)]
+            if len(users) != 1:
+                reason = f'{target.name} output is read by {len(users)} layers'
+                break
+            target = users[0]
+            if _kind(target) == 'MaxPooling1D' and not np.all(scale > 0):
+                reason = 'negative scales do not commute with max pooling'
+            elif _kind(target) not in PASS_THROUGH:
+                break
+        if reason is None and (not _foldable_consumer(target)
+                               or any(d == 'input' for d, _, _ in folds.get(target.name, []))):
+            reason = f'{_kind(target)} {target.name} cannot absorb it'
+        if reason:
+            notes.append(f'{op.name}: {reason}')
+            continue
+        folds.setdefault(target.name, []).append(('input', scale, shift))
+        if kind == 'BatchNormalization':
+            skip.add(op.name)
+        else:
+            rewrites.add(op.name)
+    return skip, folds, rewrites, notes
+
+
+def _inference_config(layer, rewrites, folds):
+    cfg = layer.get_config()
+    kind = _kind(layer)
+    if layer.name in rewrites:
+        cfg.update(center=False, scale=False)
+    if kind in RECURRENT:
+        cfg.update(dropout=0.0, recurrent_dropout=0.0)
+    elif kind == 'Bidirectional':
+        for key in ('layer', 'backward_layer'):
+            if cfg.get(key) and 'recurrent_dropout' in cfg[key]['config']:
+                cfg[key]['config'].update(dropout=0.0, recurrent_dropout=0.0)
+    elif kind == 'MultiHeadAttention':
+        cfg.update(dropout=0.0)
+    if layer.name in folds and cfg.get('use_bias') is False:
+        cfg.update(use_bias=True)  # folded shifts land in the bias
+    return cfg
+
+
+def optimize_model(model):
+    """Inference-only copy of a Keras model with norms folded and dropout removed; returns (model, notes)"""
+    import tensorflow as tf
+    skip, folds, rewrites, notes = plan_folds(model)
+
+    def clone_layer(layer):
+        return layer.__class__.from_config(_inference_config(layer, rewrites, folds))
+
+    def call_layer(layer, *args, **kwargs):
+        if layer.name in skip:
+            return args[0]
+        return layer(*args, **kwargs)
+
+    if isinstance(model, tf.keras.Sequential):
+        layers = [clone_layer(layer) for layer in model.layers if layer.name not in skip]
+        optimized = tf.keras.Sequential([tf.keras.Input(shape=model.input_shape[1:])] + layers, name=model.name)
+    else:
+        optimized = tf.keras.models.clone_model(model, clone_function=clone_layer, call_function=call_layer)
+
+    for layer in model.layers:
+        if layer.name in skip or layer.name in rewrites or not layer.weights:
+            continue
+        weights = [np.asarray(w, dtype=np.float64) for w in layer.get_weights()]
+        for direction, scale, shift in folds.get(layer.name, []):
+            if direction == 'input':
+                weights = _fold_into_input(weights, _kind(layer), layer, scale, shift)
+        for direction, scale, shift in folds.get(layer.name, []):
+            if direction == 'output':
+                bias = weights[1] if len(weights) > 1 else np.zeros(weights[0].shape[-1])
+                weights = [weights[0] * scale, bias * scale + shift]
+        target = optimized.get_layer(layer.name)
+        target.set_weights([w.astype(v.dtype) for w, v in zip(weights, target.get_weights())])
+    return optimized, notes
+
+
+def layer_timings(model, X, repeats=20):
+    """{layer name: (kind, ms)} for each layer run alone on its real inputs"""
+    import tensorflow as tf
+    ops, _, _ = _graph(model)
+    timings = {}
+    for op in ops:
+        node = next((n for n in op._inbound_nodes if n.input_tensors), None)
+        if node is None or _kind(op) == 'InputLayer':
+            continue
+        feeder = tf.keras.Model(model.inputs, node.input_tensors)
+        values = feeder([X], training=False)
+        values = values if isinstance(values, (list, tuple)) else [values]
+        args, kwargs = node.arguments.fill_in({id(t): v for t, v in zip(node.input_tensors, values)})
+        if getattr(op, '_call_has_training_arg', False):
+            kwargs['training'] = False
+        fn = tf.function(lambda: op(*args, **kwargs))
+        fn()
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            fn()
+        timings[op.name] = (_kind(op), (time.perf_counter() - t0) / repeats * 1e3)
+    return timings
+
+
+def optimize_and_report(model_path, atol=1e-4, repeats=20, batch=1):
+    """Write and verify the inference artifact for one model and print per-layer timings; returns its path"""
+    from tensorflow.keras.models import load_model
+    from inference import compile_model
+    model = load_model(model_path, compile=False)
+    optimized, notes = optimize_model(model)
+    if [layer.get_config() for layer in optimized.layers] == [layer.get_config() for layer in model.layers]:
+        print(f'{model_path}: nothing to optimise')
+        return None
+    X = np.random.default_rng(0).normal(size=(max(batch, 8),) + tuple(model.input_shape[1:])).astype(np.float32)
+    err = float(np.max(np.abs(optimized(X, training=False).numpy() - model(X, training=False).numpy())))
+    print(f'{model_path}: {len(model.layers)} -> {len(optimized.layers)} layers, max abs diff {err:.1e}')
+    for note in notes:
+        print(f'  kept {note}')
+    if err > atol:
+        print(f'  FAILED parity (> {atol:g}); nothing written')
+        return None
+
+    before, after = layer_timings(model, X[:batch], repeats), layer_timings(optimized, X[:batch], repeats)
+    print(f'  {"layer":<28} {"kind":<22} {"before ms":>10} {"after ms":>10}')
+    for name, (kind, ms) in before.items():
+        new = after.get(name)
+        print(f'  {name:<28} {kind:<22} {ms:10.3f} {new[1] if new else 0.0:10.3f}{"" if new else "  removed"}')
+    totals = []
+    for m in (model, optimized):
+        compiled = compile_model(m)
+        t0 = time.perf_counter()
+        for _ in range(repeats):
+            compiled(X[:batch])
+        totals.append((time.perf_counter() - t0) / repeats * 1e3)
+    print(f'  {"whole model (traced)":<51} {totals[0]:10.3f} {totals[1]:10.3f}')
+
+    out = optimized_path(model_path)
+    optimized.save(out, include_optimizer=False)
+    return out
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Fold norm layers and strip dropout from trained LSTM models')
+    parser.add_argument('models', nargs='*',
+                        help='.keras files (default: every lstm_enhanced_*/lstm_attention_* model here)')
+    parser.add_argument('--atol', type=float, default=1e-4, help='max abs difference from the original')
+    parser.add_argument('--repeats', type=int, default=20)
+    args = parser.parse_args()
+    paths = args.models or [p for p in sorted(glob.glob('lstm_enhanced_*.keras') + glob.glob('lstm_attention_*.keras'))
+                            if not p.endswith(OPTIMIZED_SUFFIX)]
+    for model_path in paths:
+        optimize_and_report(model_path, atol=args.atol, repeats=args.repeats)
@@ -0,0 +1,67 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+# Load every available model at worker start (PRELOAD_MODELS=1) instead of lazily
+PRELOAD_MODELS = os.environ.get('PRELOAD_MODELS', '0') == '1'
+PRELOAD_WORKERS = int(os.environ.get('PRELOAD_WORKERS', '4'))
+
+
+class Preloader:
+    """Runs model-loading tasks on a thread pool and tracks readiness.
+
+    ``tasks`` maps a display name to a callable that loads (and warms) one
+    artifact and returns True when it was found, False when it is missing.
+    Loading happens in a background thread so the worker can answer /ready
+    while it warms up.
+    """
+
+    def __init__(self, tasks, workers=PRELOAD_WORKERS):
+        self.tasks = dict(tasks)
+        self.workers = max(1, workers)
+        self.started = False
+        self.finished = False
+        self.seconds = None
+        self._lock = threading.Lock()
+        self._status = {name: {'status': 'pending'} for name in self.tasks}
+
+    def start(self):
+        """Kick off loading in the background; returns immediately"""
+        with self._lock:
+            if self.started:
+                return self
+            self.started = True
+        threading.Thread(target=self._run, name='model-preload', daemon=True).start()
+        return self
+
+    def _run(self):
+        t0 = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='preload') as pool:
+            for name in self.tasks:
+                pool.submit(self._load, name)
+        self.seconds = round(time.perf_counter() - t0, 3)
+        self.finished = True
+        print(f"Preloaded {len(self.tasks)} artifacts in {self.seconds}s")
+
+    def _load(self, name):
+        t0 = time.perf_counter()
+        try:
+            status = 'loaded' if self.tasks[name]() else 'missing'
+            entry = {'status': status}
+        except Exception as e:
+            entry = {'status': 'error', 'error': str(e)}
+        entry['seconds'] = round(time.perf_counter() - t0, 3)
+        with self._lock:
+            self._status[name] = entry
+
+    def report(self):
+        """Readiness payload for the /ready endpoint"""
+        with self._lock:
+            models = {name: dict(entry) for name, entry in self._status.items()}
+        return {
+            'ready': self.finished,
+            'seconds': self.seconds,
+            'loaded': sorted(n for n, e in models.items() if e['status'] == 'loaded'),
+            'models': models,
+        }
@@ -0,0 +1,291 @@
+"""Columnar, cached price series parsed from the Agmarknet CSVs.
+
+Each ``data/<market>/*<crop>*.csv`` is parsed once, with the explicit
+``%d %b %Y`` date format. Rows are sorted by date, and rows sharing a date
+(several varieties on one day) are merged into one day: the lowest min
+price, the highest max price and the mean modal price. The result is
+written next to the data as an ``.npz`` with int32 day numbers (days since
+1970-01-01) and float32 min/max/modal prices:
+
+    <PRICE_CACHE_DIR>/<market>/<csv name>.npz
+
+A cache file records the size, mtime and sha256 of its CSV. A changed
+size or mtime re-hashes the CSV, and a changed hash re-parses it. Training,
+batch scoring and the APIs all read through ``load_series``. Within a
+process, parsed series stay in memory and are re-checked at most every
+PRICE_STORE_CHECK_SECONDS.
+
+The APIs keep every market-crop series in memory (``preload`` at startup).
+A ``price_forecast`` request may then omit ``history``: ``request_history``
+returns a read-only view of the newest stored prices instead. Without
+either, the forecast is refused (``missing_history``) rather than run on
+padding.
+
+    python price_store.py [--dir ../data]    # build the cache, timing CSV vs cache reads
+"""
+import argparse
+import hashlib
+import os
+import re
+import threading
+import time
+import numpy as np
+
+DATA_DIR = os.environ.get('PRICE_DATA_DIR', '../data')
+PRICE_CACHE_DIR = os.environ.get('PRICE_CACHE_DIR') or os.path.join(DATA_DIR, '.price_cache')
+PRICE_STORE_CHECK_SECONDS = float(os.environ.get('PRICE_STORE_CHECK_SECONDS', '5'))
+CACHE_FORMAT = 1
+
+DATE_FORMAT = '%d %b %Y'
+DATE_COLUMN = 'Price Date'
+PRICE_COLUMNS = {
+    'min_price': 'Min Price (Rs./Quintal)',
+    'max_price': 'Max Price (Rs./Quintal)',
+    'modal_price': 'Modal Price (Rs./Quintal)',
+}
+
+
+def find_crop_file(folder: str, crop: str):
+    pattern = re.compile(rf'(^|[\W_]){re.escape(crop)}([\W_]|$)', re.IGNORECASE)
+    if not os.path.isdir(folder):
+        return None
+    for fname in sorted(os.listdir(folder)):
+        if fname.lower().endswith('.csv') and pattern.search(fname):
+            return os.path.join(folder, fname)
+    return None
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class PriceSeries:
+    """One market-crop series: ``days`` (int32, ascending, unique) and float32 price columns"""
+
+    def __init__(self, days, min_price, max_price, modal_price, path=None):
+        self.days = days
+        self.min_price = min_price
+        self.max_price = max_price
+        self.modal_price = modal_price
+        self.path = path
+        # Requests get views into these arrays
+        for values in (days, min_price, max_price, modal_price):
+            values.flags.writeable = False
+
+    def __len__(self):
+        return len(self.days)
+
+    @property
+    def dates(self):
+        return self.days.astype('datetime64[D]')
+
+    @property
+    def nbytes(self):
+        return sum(a.nbytes for a in (self.days, self.min_price, self.max_price, self.modal_price))
+
+    def arrays(self):
+        return {'days': self.days, 'min_price': self.min_price, 'max_price': self.max_price,
+                'modal_price': self.modal_price}
+
+
+def parse_csv(path):
+    """PriceSeries from an Agmarknet export; None when the date or modal price column is missing"""
+    import pandas as pd
+    df = pd.read_csv(path, encoding='utf-8-sig')
+    # Some exports wrap header names across lines ("Price\nDate")
+    df.columns = [' '.join(str(c).split()) for c in df.columns]
+    if DATE_COLUMN not in df.columns or PRICE_COLUMNS['modal_price'] not in df.columns:
+        print(f"Missing required columns in {path}")
+        return None
+    dates = pd.to_datetime(df[DATE_COLUMN].astype(str).str.strip(), format=DATE_FORMAT, errors='coerce')
+    columns = {name: pd.to_numeric(df[col], errors='coerce').to_numpy(dtype=np.float64) if col in df.columns
+               else np.full(len(df), np.nan) for name, col in PRICE_COLUMNS.items()}
+    keep = dates.notna().to_numpy() & ~np.isnan(columns['modal_price'])
+    days = (dates[keep].to_numpy().astype('datetime64[D]').astype(np.int64)).astype(np.int32)
+    order = np.argsort(days, kind='stable')
+    days = days[order]
+    columns = {name: values[keep][order] for name, values in columns.items()}
+
+    # One row per day: lowest min, highest max, mean modal price
+    days, starts, counts = np.unique(days, return_index=True, return_counts=True)
+    return PriceSeries(
+        days.astype(np.int32),
+        np.fmin.reduceat(columns['min_price'], starts).astype(np.float32) if len(days) else np.empty(0, np.float32),
+        np.fmax.reduceat(columns['max_price'], starts).astype(np.float32) if len(days) else np.empty(0, np.float32),
+        (np.add.reduceat(columns['modal_price'], starts) / counts).astype(np.float32) if len(days)
+        else np.empty(0, np.float32),
+        path=path,
+    )
+
+
+def cache_path(csv_path, data_dir=DATA_DIR, cache_dir=PRICE_CACHE_DIR):
+    relative = os.path.relpath(os.path.abspath(csv_path), os.path.abspath(data_dir))
+    return os.path.join(cache_dir, relative + '.npz')
+
+
+class PriceStore:
+    """Price series per (market, crop), read through the ``.npz`` cache and kept in memory"""
+
+    def __init__(self, data_dir=DATA_DIR, cache_dir=None, check_interval=PRICE_STORE_CHECK_SECONDS):
+        self.data_dir = data_dir
+        self.cache_dir = cache_dir or (PRICE_CACHE_DIR if data_dir == DATA_DIR else os.path.join(data_dir, '.price_cache'))
+        self.check_interval = check_interval
+        self._series = {}
+        self._lock = threading.Lock()
+        self.parses = 0
+        self.cache_reads = 0
+
+    def path(self, market, crop):
+        return find_crop_file(os.path.join(self.data_dir, market), crop)
+
+    def load(self, market, crop):
+        """PriceSeries for the pair, or None when there is no usable CSV"""
+        key = (market, crop)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._series.get(key)
+            if entry is not None and now - entry[0] < self.check_interval:
+                return entry[2]
+        path = self.path(market, crop)
+        if path is None:
+            return None
+        st = os.stat(path)
+        stamp = (path, st.st_size, st.st_mtime_ns)
+        if entry is not None and entry[1] == stamp:
+            series = entry[2]
+        else:
+            series = self._read(path, st)
+        with self._lock:
+            self._series[key] = (now, stamp, series)
+        return series
+
+    def _read(self, path, st):
+        cached = cache_path(path, self.data_dir, self.cache_dir)
+        digest = None
+        try:
+            with np.load(cached, allow_pickle=False) as data:
+                meta = data['meta']
+                if int(meta[0]) == CACHE_FORMAT:
+                    fresh = (int(meta[1]), int(meta[2])) == (st.st_size, st.st_mtime_ns)
+                    if not fresh:
+                        digest = _file_hash(path)
+                        fresh = str(data['sha256']) == digest
+                    if fresh:
+                        self.cache_reads += 1
+                        return PriceSeries(data['days'], data['min_price'], data['max_price'],
+                                           data['modal_price'], path=path)
+        except (OSError, KeyError, ValueError):
+            pass
+        series = parse_csv(path)
+        self.parses += 1
+        if series is not None:
+            self._write(cached, series, st, digest or _file_hash(path))
+        return series
+
+    def _write(self, cached, series, st, digest):
+        try:
+            os.makedirs(os.path.dirname(cached), exist_ok=True)
+            tmp = f'{cached}.{os.getpid()}.{threading.get_ident()}.tmp.npz'
+            np.savez(tmp, meta=np.array([CACHE_FORMAT, st.st_size, st.st_mtime_ns], dtype=np.int64),
+                     sha256=np.array(digest), **series.arrays())
+            os.replace(tmp, cached)
+        except OSError as e:
+            # A read-only data directory still serves from memory
+            print(f"Could not write price cache {cached}: {e}")
+
+    def clear(self):
+        with self._lock:
+            self._series.clear()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'series': len(self._series),
+                'bytes': sum(e[2].nbytes for e in self._series.values() if e[2] is not None),
+                'parses': self.parses,
+                'cache_reads': self.cache_reads,
+            }
+
+
+# Process-wide store for DATA_DIR
+store = PriceStore()
+
+
+def load_series(market, crop):
+    """PriceSeries for a market-crop pair from DATA_DIR, or None"""
+    return store.load(market, crop)
+
+
+def recent_prices(market, crop, n):
+    """The newest ``n`` modal prices (a view, oldest first), or None when the pair has no prices"""
+    series = store.load(market, crop) if market and crop else None
+    if series is None or not len(series):
+        return None
+    return series.modal_price[-n:]
+
+
+def request_history(data, market, crop, n):
+    """The ``history`` a request sent, else the newest ``n`` stored prices; None when neither has any"""
+    history = data.get('history')
+    if history not in (None, []):
+        return history
+    return recent_prices(market, crop, n)
+
+
+def missing_history(market, crop):
+    """Error body (sent with a 404) for a forecast that has no history on either side.
+
+    ``history_required`` tells the Node backend to retry with the prices
+    from its own copy of the CSVs, e.g. when DATA_DIR is not in the image.
+    """
+    return {'error': f'No price history for {market}-{crop}', 'history_required': True}
+
+
+_preloaded = set()
+_preload_lock = threading.Lock()
+
+
+def preload(market_crops):
+    """Load every {market: [crop, ...]} series in a background thread; returns the thread (None if all queued)"""
+    with _preload_lock:
+        # server.py imports every app; each pair is loaded by the first one only
+        pairs = [(m, c) for m, crops in market_crops.items() for c in crops if (m, c) not in _preloaded]
+        _preloaded.update(pairs)
+    if not pairs:
+        return None
+
+    def run():
+        t0 = time.perf_counter()
+        for market, crop in pairs:
+            try:
+                store.load(market, crop)
+            except Exception as e:
+                print(f"Could not load prices for {market}-{crop}: {e}")
+        print(f"Loaded {len(pairs)} price series in {time.perf_counter() - t0:.3f}s")
+    thread = threading.Thread(target=run, name='price-preload', daemon=True)
+    thread.start()
+    return thread
+
+
+if __name__ == '__main__':
+    import glob
+    parser = argparse.ArgumentParser(description='Build the columnar price cache and time it against the CSVs')
+    parser.add_argument('--dir', default=DATA_DIR)
+    args = parser.parse_args()
+    timed = PriceStore(args.dir, check_interval=0)
+    for path in sorted(glob.glob(os.path.join(args.dir, '*', '*.csv'))):
+        t0 = time.perf_counter()
+        series = parse_csv(path)
+        parse_ms = (time.perf_counter() - t0) * 1e3
+        if series is None:
+            continue
+        timed._read(path, os.stat(path))
+        t0 = time.perf_counter()
+        cached = timed._read(path, os.stat(path))
+        cache_ms = (time.perf_counter() - t0) * 1e3
+        assert np.array_equal(cached.modal_price, series.modal_price)
+        print(f'{os.path.relpath(path, args.dir)}: {len(series)} days, parse {parse_ms:.1f} ms, cache {cache_ms:.2f} ms')
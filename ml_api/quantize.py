@@ -0,0 +1,124 @@
+"""Post-training quantisation of the LSTM model families.
+
+For every trained ``lstm_*``, ``lstm_enhanced_*``, ``lstm_attention_*`` and
+distilled ``lstm_attention_student_*`` model this writes side-by-side
+TFLite variants
+
+    lstm_attention_davangere_Maize.int8.tflite   dynamic-range int8 weights
+    lstm_attention_davangere_Maize.fp16.tflite   float16 weights
+
+and a ``.int8.json`` / ``.fp16.json`` report with the MAPE of the variant
+and of the float32 model on the training script's held-out split. The apps
+serve a variant (QUANTIZED_VARIANT=int8|fp16) only when its report shows
+a MAPE increase within QUANTIZED_MAPE_TOLERANCE percentage points; see
+``backends.find_artifact``.
+
+    python quantize.py [--families baseline enhanced attention] [--variants int8 fp16] [--pairs davangere:Maize]
+"""
+import argparse
+import importlib
+import json
+import os
+import joblib
+import numpy as np
+from backends import TFLiteModel, inference_clone, variant_paths
+from model_cache import parse_pins
+
+VARIANTS = ('int8', 'fp16')
+
+# family -> (artifact prefix, training module that defines the data split)
+FAMILIES = {
+    'baseline': ('lstm_', 'train_lstm'),
+    'enhanced': ('lstm_enhanced_', 'train_lstm_enhanced'),
+    'attention': ('lstm_attention_', 'train_attention_lstm'),
+    'student': ('lstm_attention_student_', 'train_attention_lstm'),  # distill.py, teacher's scalers
+}
+
+
+def quantize(keras_model, variant):
+    """TFLite flatbuffer with dynamic-range int8 or float16 weights"""
+    import tensorflow as tf
+    converter = tf.lite.TFLiteConverter.from_keras_model(inference_clone(keras_model))
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if variant == 'fp16':
+        converter.target_spec.supported_types = [tf.float16]
+    return converter.convert()
+
+
+def held_out(module, market, crop, scaler_obj):
+    """(X_test, y_test, price_scaler) from the training script's split with the saved scalers"""
+    prices = module.load_price_series(market, crop)
+    if prices is None:
+        return None
+    if isinstance(scaler_obj, dict):
+        price_scaler, feature_scaler = scaler_obj['price_scaler'], scaler_obj.get('feature_scaler')
+    else:
+        price_scaler, feature_scaler = scaler_obj, None
+    if module.__name__ == 'train_lstm':
+        _, _, X_test, y_test = module.split_sequences(prices, price_scaler, horizons=(1,))
+    else:
+        _, _, X_test, y_test = module.split_sequences(prices, price_scaler, feature_scaler, horizons=(1,))
+    return X_test, y_test, price_scaler
+
+
+def mape(predict, X, y, price_scaler):
+    """One-step MAPE (%) in price units, as reported by the training scripts"""
+    pred = np.asarray(predict(X.astype(np.float32)))[:, :1]
+    actual = price_scaler.inverse_transform(y[:, :1])
+    pred = price_scaler.inverse_transform(pred)
+    return float(np.mean(np.abs((actual - pred) / np.maximum(1e-6, np.abs(actual)))) * 100.0)
+
+
+def quantize_pair(family, market, crop, variants=VARIANTS):
+    """Write and evaluate every variant for one model; returns the reports written"""
+    from tensorflow.keras.models import load_model
+    prefix, module_name = FAMILIES[family]
+    stem = f'{prefix}{market}_{crop}'
+    model_path, scaler_path = stem + '.keras', stem + '_scaler.pkl'
+    if not (os.path.exists(model_path) and os.path.exists(scaler_path)):
+        return []
+    keras_model = load_model(model_path, compile=False)
+    data = held_out(importlib.import_module(module_name), market, crop, joblib.load(scaler_path))
+    if data is None or len(data[0]) == 0:
+        print(f'{stem}: no held-out data')
+        return []
+    X, y, price_scaler = data
+    if tuple(keras_model.input_shape[1:]) != X.shape[1:]:
+        print(f'{stem}: model input {keras_model.input_shape[1:]} does not match the training features {X.shape[1:]}')
+        return []
+    base = mape(lambda batch: keras_model(batch, training=False).numpy(), X, y, price_scaler)
+    reports = []
+    for variant in variants:
+        out_path, report_path = variant_paths(stem, variant)
+        with open(out_path, 'wb') as f:
+            f.write(quantize(keras_model, variant))
+        score = mape(TFLiteModel(out_path), X, y, price_scaler)
+        report = {
+            'variant': variant,
+            'mape_float32': round(base, 4),
+            'mape': round(score, 4),
+            'mape_delta': round(score - base, 4),
+            'samples': int(len(X)),
+            'bytes': os.path.getsize(out_path),
+            'float32_bytes': int(sum(np.asarray(w).nbytes for w in keras_model.get_weights())),
+        }
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"{out_path}: MAPE {base:.2f}% -> {score:.2f}% ({report['mape_delta']:+.2f} pp), "
+              f"weights {report['float32_bytes'] / 1e6:.2f} MB -> {report['bytes'] / 1e6:.2f} MB")
+        reports.append(report)
+    return reports
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Quantise trained LSTM models and measure the accuracy cost')
+    parser.add_argument('--families', nargs='+', default=list(FAMILIES), choices=list(FAMILIES))
+    parser.add_argument('--variants', nargs='+', default=list(VARIANTS), choices=list(VARIANTS))
+    parser.add_argument('--pairs', nargs='*', help='market:crop pairs (default: every trained pair)')
+    args = parser.parse_args()
+    for family in args.families:
+        module = importlib.import_module(FAMILIES[family][1])
+        pairs = parse_pins(','.join(args.pairs)) if args.pairs else [
+            (market, crop) for market in module.MARKETS for crop in module.CROPS[market]]
+        for market, crop in sorted(pairs):
+            quantize_pair(family, market, crop, args.variants)
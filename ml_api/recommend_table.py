@@ -0,0 +1,164 @@
+import os
+import threading
+import time
+import numpy as np
+from result_cache import artifact_version
+
+# How often (seconds) a lookup re-checks the recommendation pickles for changes
+RECOMMEND_TABLE_CHECK_SECONDS = float(os.environ.get('RECOMMEND_TABLE_CHECK_SECONDS', '5'))
+# Year slices kept for models that take the year as a feature
+RECOMMEND_TABLE_MAX_YEARS = int(os.environ.get('RECOMMEND_TABLE_MAX_YEARS', '8'))
+
+MONTHS = np.arange(1, 13)
+
+
+class ProbabilityTable:
+    """Crop scores for every (market, month) cell, ranked once at build time.
+
+    ``scores`` has shape (len(markets), 12, len(crops)). ``lookup`` is a
+    dict hit plus two array indexings, so a recommendation costs the same
+    regardless of how many models produced the scores.
+    """
+
+    def __init__(self, markets, crops, scores):
+        self.markets = list(markets)
+        self.crops = np.asarray(crops)
+        self.scores = np.asarray(scores, dtype=np.float64)
+        self.order = np.argsort(-self.scores, axis=-1, kind='stable')
+        self._index = {m: i for i, m in enumerate(self.markets)}
+
+    @classmethod
+    def build(cls, markets, crops, score_fn):
+        """Evaluate ``score_fn(market_idx, months) -> (N, len(crops))`` over the full grid in one call"""
+        market_idx, months = np.meshgrid(np.arange(len(markets)), MONTHS, indexing='ij')
+        scores = np.asarray(score_fn(market_idx.ravel(), months.ravel()))
+        return cls(markets, crops, scores.reshape(len(markets), len(MONTHS), -1))
+
+    def __contains__(self, market):
+        return market in self._index
+
+    def lookup(self, market, month):
+        """(ranked crop names, their scores) or None when the cell is off the grid"""
+        i = self._index.get(market)
+        if i is None or not 1 <= month <= 12:
+            return None
+        order = self.order[i, month - 1]
+        return list(self.crops[order]), self.scores[i, month - 1, order].tolist()
+
+    @property
+    def nbytes(self):
+        return self.scores.nbytes + self.order.nbytes
+
+
+class TableSource:
+    """Builds probability tables from pickled models and rebuilds them when the pickles change.
+
+    ``build(part)`` returns a ProbabilityTable (or None when the models are
+    unavailable); ``part`` distinguishes slices such as the year for models
+    that use it, and is None otherwise. At most every ``check_interval``
+    seconds a lookup stats ``paths``; a changed size/mtime starts ``reload``
+    in the background. Lookups keep answering from the current tables until
+    the rebuilt ones are swapped in. A build that raises is remembered until
+    the artifacts change: later lookups of that part re-raise its error
+    instead of rebuilding the whole grid on every request.
+    """
+
+    def __init__(self, paths, build, reset=None, check_interval=RECOMMEND_TABLE_CHECK_SECONDS,
+                 max_parts=RECOMMEND_TABLE_MAX_YEARS):
+        self.paths = list(paths)
+        self.build = build
+        self.reset = reset
+        self.check_interval = check_interval
+        self.max_parts = max(1, max_parts)
+        self._lock = threading.Lock()
+        self._tables = {}
+        self._failed = {}
+        self._version = None
+        self._checked = None
+        self._reloading = False
+        self.builds = 0
+        self.reloads = 0
+        self.build_seconds = 0.0
+        self.lookups = 0
+
+    def _current_version(self):
+        return artifact_version(*[p for p in self.paths if os.path.exists(p)])
+
+    def _refresh(self):
+        # Caller holds the lock
+        now = time.monotonic()
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        version = self._current_version()
+        if self._version is None:
+            self._version = version
+        elif version != self._version and not self._reloading:
+            print("Recommendation artifacts changed; rebuilding lookup tables")
+            threading.Thread(target=self.reload, name='recommend-table-reload', daemon=True).start()
+    
+    def _build(self, part):
+        t0 = time.perf_counter()
+        table = self.build(part)
+        self.build_seconds += time.perf_counter() - t0
+        self.builds += 1
+        return table
+    
+    def reload(self, force=False):
+        """Rebuild the cached slices from changed artifacts, then swap them in at once.
+        
+        ``reset()`` drops the cached models first so ``build`` reads the new
+        files. Returns True when new tables were swapped in.
+        """
+        version = self._current_version()
+        with self._lock:
+            if self._reloading or not (force or self._version not in (None, version)):
+                return False
+            self._reloading = True
+            parts = list(self._tables)
+        try:
+            if self.reset is not None:
+                self.reset()
+            tables = {part: self._build(part) for part in parts}
+        finally:
+            with self._lock:
+                self._reloading = False
+        with self._lock:
+            self._tables = {part: table for part, table in tables.items() if table is not None}
+            self._failed = {}
+            self._version = version
+            self.reloads += 1
+        return True
+
+    def get(self, part=None):
+        """Current table for ``part``, building it on first use"""
+        with self._lock:
+            self._refresh()
+            self.lookups += 1
+            if part in self._tables:
+                return self._tables[part]
+            if part in self._failed:
+                raise self._failed[part].with_traceback(None)
+            try:
+                table = self._build(part)
+            except Exception as e:
+                self._failed[part] = e
+                raise
+            if table is not None:
+                while len(self._tables) >= self.max_parts:
+                    self._tables.pop(next(iter(self._tables)))
+                self._tables[part] = table
+            return table
+
+    def stats(self):
+        with self._lock:
+            return {
+                'version': self._version,
+                'tables': len(self._tables),
+                'bytes': sum(t.nbytes for t in self._tables.values()),
+                'builds': self.builds,
+                'failed': len(self._failed),
+                'reloads': self.reloads,
+                'build_seconds': round(self.build_seconds, 3),
+                'lookups': self.lookups,
+            }
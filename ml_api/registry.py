@@ -0,0 +1,42 @@
+"""Process-wide model registry shared by every forecast family.
+
+app.py (baseline), app_enhanced.py and app_attention.py can each run on
+their own, and server.py serves all three from one process. In both cases a
+family's models, forecasts and coalesced batches live in these shared
+instances under keys that start with the family name, e.g.
+``('attention', 'davangere', 'Maize')``, so one MODEL_CACHE_MAX_MB budget
+covers whichever families are actually requested.
+"""
+import os
+from batching import MicroBatcher
+from manifest import ArtifactIndex
+from model_cache import ModelCache
+from result_cache import ResultCache
+
+FAMILIES = ('baseline', 'enhanced', 'attention')
+
+# Families warmed at worker start when PRELOAD_MODELS=1 (comma list; default every family)
+PRELOAD_VARIANTS = [v.strip() for v in os.environ.get('PRELOAD_VARIANTS', ','.join(FAMILIES)).split(',')
+                    if v.strip() in FAMILIES]
+
+# Trained artifacts listed in models.json (MODEL_MANIFEST); filesystem probing when there is none
+artifacts = ArtifactIndex.load()
+
+# Lazy LSTM models of every family, bounded by MODEL_CACHE_MAX_MB / MODEL_CACHE_TTL_SECONDS
+models = ModelCache.from_env()
+
+# Forecast responses keyed by variant, input fingerprint and model artifact version
+results = ResultCache.from_env()
+
+# Optional micro-batching of concurrent single-row forecasts (COALESCE_WINDOW_MS > 0)
+batcher = MicroBatcher.from_env()
+
+
+def family_items(family):
+    """(key without the family, model entry) pairs cached for one family"""
+    return [(key[1:], value) for key, value in models.items() if key[0] == family]
+
+
+def label(key):
+    """'davangere-Maize' for a (market, crop[, 'teacher']) key"""
+    return '-'.join(key)
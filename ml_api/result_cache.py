@@ -0,0 +1,112 @@
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+
+
+def artifact_version(*paths):
+    """Version tag for a set of artifact files: name, size and mtime of each"""
+    parts = []
+    for path in paths:
+        st = os.stat(path)
+        parts.append(f'{os.path.basename(path)}:{st.st_size}:{st.st_mtime_ns}')
+    return '|'.join(parts)
+
+
+def fingerprint(values):
+    """Stable hash of an input array (the padded history)"""
+    arr = np.ascontiguousarray(np.asarray(values, dtype=np.float64))
+    return hashlib.blake2b(arr.tobytes(), digest_size=16).hexdigest()
+
+
+def _anchor_key(anchor_price):
+    try:
+        return None if anchor_price is None else float(anchor_price)
+    except (TypeError, ValueError):
+        return str(anchor_price)
+
+
+class ResultCache:
+    """TTL + LRU cache of forecast responses.
+
+    Keys are ``(variant, market, crop, history_hash, anchor_price, version,
+    *extra)``. ``version`` comes from ``artifact_version`` of the model that
+    produced the result, so a reloaded model never serves stale forecasts;
+    loaders also call ``invalidate`` when they (re)load a pair.
+    """
+
+    def __init__(self, max_entries=4096, ttl=300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    @classmethod
+    def from_env(cls):
+        """RESULT_CACHE_MAX_ENTRIES (0 disables) and RESULT_CACHE_TTL_SECONDS"""
+        return cls(
+            max_entries=int(os.environ.get('RESULT_CACHE_MAX_ENTRIES', '4096')),
+            ttl=float(os.environ.get('RESULT_CACHE_TTL_SECONDS', '300')),
+        )
+
+    @property
+    def enabled(self):
+        return self.max_entries > 0
+
+    @staticmethod
+    def make_key(variant, market, crop, history, anchor_price, version, *extra):
+        return (variant, market, crop, fingerprint(history), _anchor_key(anchor_price), version) + extra
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        if not self.enabled:
+            return value
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, variant=None, market=None, crop=None):
+        """Drop entries matching the given (variant, market, crop) prefix; None matches anything"""
+        with self._lock:
+            stale = [k for k in self._entries
+                     if (variant is None or k[0] == variant)
+                     and (market is None or k[1] == market)
+                     and (crop is None or k[2] == crop)]
+            for k in stale:
+                del self._entries[k]
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': (self.hits / lookups) if lookups else 0.0,
+                'invalidations': self.invalidations,
+            }
@@ -0,0 +1,196 @@
+"""One API process for every model family.
+
+    gunicorn server:app
+
+``/predict`` and ``/predict/batch`` take the same bodies as app.py,
+app_enhanced.py and app_attention.py plus a ``variant`` field:
+``baseline``, ``enhanced``, ``attention`` or ``auto`` (default
+DEFAULT_VARIANT). ``auto`` picks, per market-crop pair, the first family
+with a trained artifact in the order of app_attention's fallback chain
+(distilled student / attention, enhanced, baseline); crop recommendations
+go to the first family whose recommendation models exist, in the same
+order (recommendation_chain). The request is then
+handled by that family's own endpoint, so responses are unchanged apart
+from the ``X-Model-Variant`` header.
+
+All families share registry.py's model cache, result cache and coalescer,
+and models load lazily on first use, so a family nobody requests is never
+loaded. PRELOAD_MODELS=1 warms only the families in PRELOAD_VARIANTS.
+"""
+import os
+from flask import Flask, request, jsonify
+import registry
+import hot_reload
+import price_store
+import app as baseline
+import app_enhanced as enhanced
+import app_attention as attention
+
+app = Flask(__name__)
+
+MODULES = {'baseline': baseline, 'enhanced': enhanced, 'attention': attention}
+VARIANTS = tuple(MODULES) + ('auto',)
+DEFAULT_VARIANT = os.environ.get('DEFAULT_VARIANT', 'auto')
+MAX_BATCH_JOBS = int(os.environ.get('MAX_BATCH_JOBS', '64'))
+
+
+def artifact_chain(market: str, crop: str):
+    """(family, model stem) in app_attention's fallback order"""
+    return [
+        ('attention', f'lstm_attention_student_{market}_{crop}'),
+        ('attention', f'lstm_attention_{market}_{crop}'),
+        ('enhanced', f'lstm_enhanced_{market}_{crop}'),
+        ('baseline', os.path.join(baseline.MODEL_DIR, f'lstm_{market}_{crop}')),
+    ]
+
+
+def recommendation_chain():
+    """(family, artifact paths its crop_recommendation needs) in the same fallback order"""
+    return [
+        ('attention', attention.RECOMMENDATION_PATHS),
+        # xgb_crop_recommendation.pkl is only the enhanced table's fallback, which expects enhanced features
+        ('enhanced', [p for p in enhanced.RECOMMENDATION_PATHS if os.path.basename(p) != 'xgb_crop_recommendation.pkl']),
+        ('baseline', baseline.XGB_PATHS),
+    ]
+
+
+def resolve_variant(variant: str, market: str = None, crop: str = None, task: str = 'price_forecast'):
+    """Concrete family for a request; ``auto`` picks the first trained one for the pair (or task)"""
+    if variant != 'auto':
+        return variant
+    if task == 'crop_recommendation':
+        for family, paths in recommendation_chain():
+            if all(os.path.exists(p) for p in paths):
+                return family
+        return 'attention'
+    if not (market and crop):
+        return 'attention'
+    for family, stem in artifact_chain(market, crop):
+        backend = baseline.LSTM_BACKEND if family == 'baseline' else None
+        if registry.artifacts.servable(stem, backend):
+            return family
+    # Nothing trained: let the attention endpoint report the missing model
+    return 'attention'
+
+
+def _variant(data):
+    variant = (data.get('variant') or DEFAULT_VARIANT) if isinstance(data, dict) else DEFAULT_VARIANT
+    return variant if variant in VARIANTS else None
+
+
+def _tagged(response, family):
+    response = app.make_response(response)
+    response.headers['X-Model-Variant'] = family
+    return response
+
+
+@app.route('/health', methods=['GET'])
+def health():
+    return jsonify({'status': 'ok', 'variants': list(VARIANTS), 'default_variant': DEFAULT_VARIANT})
+
+
+@app.route('/ready', methods=['GET'])
+def ready():
+    """Readiness probe: 503 until every preloaded family has loaded and warmed"""
+    preloaders = {family: module._preloader for family, module in MODULES.items() if module._preloader is not None}
+    if not preloaders:
+        return jsonify({
+            'ready': True,
+            'preload': False,
+            'loaded': sorted(f"{key[0]}:{registry.label(key[1:])}" for key in registry.models.keys()),
+        })
+    reports = {family: preloader.report() for family, preloader in preloaders.items()}
+    report = {
+        'ready': all(r['ready'] for r in reports.values()),
+        'loaded': sorted(f'{family}:{name}' for family, r in reports.items() for name in r['loaded']),
+        'variants': reports,
+    }
+    return jsonify(report), 200 if report['ready'] else 503
+
+
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return jsonify({
+        'coalescer': registry.batcher.stats() if registry.batcher is not None else None,
+        'retraces': {
+            f'{family}:{registry.label(key)}': entry[0].retraces
+            for family in MODULES for key, entry in registry.family_items(family)
+        },
+        'artifacts': registry.artifacts.stats(),
+        'model_cache': registry.models.stats(),
+        'result_cache': registry.results.stats(),
+        'recommendation_tables': {family: module._recommendations.stats() for family, module in MODULES.items()},
+        'hot_reload': hot_reload.stats(),
+        'price_store': price_store.store.stats(),
+    })
+
+
+@app.route('/admin/reload', methods=['POST'])
+def admin_reload():
+    """Reload retrained artifacts of every family (or body "variants") without a restart; see hot_reload.py"""
+    data = request.get_json(silent=True)
+    data = data if isinstance(data, dict) else {}
+    families = [v for v in data.get('variants') or MODULES if v in MODULES]
+    body, status = hot_reload.handle(request.headers.get('X-Admin-Token'), data, families)
+    return jsonify(body), status
+
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    # Same body as the family endpoints plus "variant"; served by that family's view in this request
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    variant = _variant(data)
+    if variant is None:
+        return jsonify({'error': f'Invalid variant (choose from {", ".join(VARIANTS)})'}), 400
+    task = data.get('task', 'price_forecast')
+    family = resolve_variant(variant, data.get('market'), data.get('crop'), task)
+    return _tagged(MODULES[family].predict(), family)
+
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    # Body: {"variant": ..., "jobs": [{"market", "crop", ..., "variant"?}, ...]}; a job's own variant wins
+    data = request.get_json(silent=True) or {}
+    if not isinstance(data, dict):
+        return jsonify({'error': 'Request body must be a JSON object'}), 400
+    jobs = data.get('jobs')
+    if not isinstance(jobs, list) or not jobs:
+        return jsonify({'error': 'Missing jobs'}), 400
+    if len(jobs) > MAX_BATCH_JOBS:
+        return jsonify({'error': f'Too many jobs (max {MAX_BATCH_JOBS})'}), 400
+    default = _variant(data)
+    if default is None:
+        return jsonify({'error': f'Invalid variant (choose from {", ".join(VARIANTS)})'}), 400
+
+    results = [None] * len(jobs)
+    groups = {}
+    for i, job in enumerate(jobs):
+        job = job if isinstance(job, dict) else {}
+        variant = _variant(job) if job.get('variant') else default
+        if variant is None:
+            results[i] = {'index': i, 'error': 'Invalid variant', 'status': 400}
+            continue
+        groups.setdefault(resolve_variant(variant, job.get('market'), job.get('crop')), []).append(i)
+
+    # Each family scores its share of the jobs with its own batched endpoint
+    for family, indices in groups.items():
+        with app.test_request_context('/predict/batch', method='POST', json={'jobs': [jobs[i] for i in indices]}):
+            response = app.make_response(MODULES[family].predict_batch())
+        body = response.get_json(silent=True) or {}
+        if 'results' not in body:
+            error = body.get('error', 'Batch failed')
+            for i in indices:
+                results[i] = {'index': i, 'variant': family, 'error': error, 'status': response.status_code}
+            continue
+        for i, result in zip(indices, body['results']):
+            results[i] = {**result, 'index': i, 'variant': family}
+
+    return jsonify({'results': results})
+
+
+if __name__ == '__main__':
+    port = int(os.environ.get('PORT', '5000'))
+    print(f"Serving {', '.join(MODULES)} on port {port} (default variant: {DEFAULT_VARIANT})")
+    app.run(host='0.0.0.0', port=port, debug=False)
@@ -0,0 +1,72 @@
+"""Fused scalers (affine_scaler.py) must reproduce sklearn bit for bit.
+
+Run with ``python -m pytest test_affine_scaler.py`` or ``python test_affine_scaler.py``.
+"""
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler, RobustScaler, StandardScaler
+from affine_scaler import AffineScaler, fuse, fuse_columns, fuse_scalers
+
+RNG = np.random.default_rng(0)
+SCALERS = [MinMaxScaler(), MinMaxScaler(feature_range=(-1, 1), clip=True), RobustScaler(),
+           RobustScaler(with_centering=False), StandardScaler(), StandardScaler(with_mean=False)]
+
+
+def assert_identical(a, b):
+    assert a.dtype == b.dtype
+    np.testing.assert_array_equal(a, b)
+
+
+@pytest.mark.parametrize('scaler', SCALERS, ids=lambda s: repr(s))
+def test_matches_sklearn(scaler):
+    scaler.fit(RNG.uniform(500, 4000, (200, 5)))
+    fused = fuse(scaler)
+    X = RNG.uniform(0, 5000, (30, 5))
+    assert_identical(fused.transform(X), scaler.transform(X))
+    for dtype in (np.float64, np.float32):  # model outputs are float32
+        Y = RNG.normal(0, 1, (30, 5)).astype(dtype)
+        assert_identical(fused.inverse_transform(Y), scaler.inverse_transform(Y))
+    # Nested lists of float32 model outputs are converted to float64, as sklearn does
+    row = [list(Y[0])]
+    assert_identical(fused.inverse_transform(row), scaler.inverse_transform(row))
+
+
+def test_price_scaler_takes_any_shape():
+    scaler = MinMaxScaler().fit(RNG.uniform(1000, 3000, (100, 1)))
+    windows = RNG.uniform(1000, 3000, (4, 60))
+    assert_identical(fuse(scaler).transform(windows), scaler.transform(windows.reshape(-1, 1)).reshape(windows.shape))
+
+
+def test_fused_row_scaler_matches_the_two_step_path():
+    price = MinMaxScaler().fit(RNG.uniform(1000, 3000, (100, 1)))
+    features = RobustScaler().fit(RNG.uniform(0, 3000, (100, 32)))
+    rows = RNG.uniform(0, 3000, (3, 60, 32))
+    expected = features.transform(rows.reshape(-1, 32)).reshape(rows.shape)
+    expected[..., 0] = price.transform(rows[..., 0].reshape(-1, 1)).reshape(rows.shape[:2])
+
+    price_scaler, row_scaler = fuse_scalers({'price_scaler': price, 'feature_scaler': features}, 32)
+    assert_identical(row_scaler.transform(rows), expected)
+
+    # Without a feature scaler only the price column is scaled
+    unscaled = rows.copy()
+    unscaled[..., 0] = expected[..., 0]
+    assert_identical(fuse_columns(price_scaler, None, 32).transform(rows), unscaled)
+    assert fuse_scalers(price, 7)[1] is None  # older artifacts pickled the price scaler alone
+
+
+def test_rejects_what_it_cannot_fuse():
+    with pytest.raises(ValueError):
+        fuse(object())
+    price = fuse(MinMaxScaler().fit(RNG.uniform(size=(10, 1))))
+    with pytest.raises(ValueError):
+        fuse_columns(price, AffineScaler(sub=np.zeros(5)), 32)
+
+
+if __name__ == '__main__':
+    for scaler in SCALERS:
+        test_matches_sklearn(scaler)
+    print('test_matches_sklearn: ok')
+    for test in (test_price_scaler_takes_any_shape, test_fused_row_scaler_matches_the_two_step_path,
+                 test_rejects_what_it_cannot_fuse):
+        test()
+        print(f'{test.__name__}: ok')
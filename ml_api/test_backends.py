@@ -0,0 +1,55 @@
+"""Artifact selection in the inference backend registry (no runtimes needed).
+
+Run with ``python -m pytest test_backends.py`` or ``python test_backends.py``.
+"""
+import json
+import os
+import tempfile
+import pytest
+from backends import backend_for, find_artifact, quantized_artifact
+
+
+def touch(directory, *names):
+    for name in names:
+        open(os.path.join(directory, name), 'wb').close()
+
+
+def test_prefers_requested_backend_then_keras():
+    with tempfile.TemporaryDirectory() as tmp:
+        stem = os.path.join(tmp, 'lstm_davangere_Maize')
+        assert find_artifact(stem, 'tflite') is None
+        touch(tmp, 'lstm_davangere_Maize.h5')
+        assert find_artifact(stem, 'tflite') == stem + '.h5'
+        touch(tmp, 'lstm_davangere_Maize.keras', 'lstm_davangere_Maize.tflite')
+        assert find_artifact(stem, 'tflite') == stem + '.tflite'
+        assert find_artifact(stem, 'keras') == stem + '.keras'
+        assert find_artifact(stem, 'onnx') == stem + '.keras'
+
+
+def test_quantized_variant_needs_an_accepted_report():
+    with tempfile.TemporaryDirectory() as tmp:
+        stem = os.path.join(tmp, 'lstm_davangere_Maize')
+        touch(tmp, 'lstm_davangere_Maize.keras', 'lstm_davangere_Maize.int8.tflite')
+        assert quantized_artifact(stem, 'int8', 0.5) is None  # never evaluated
+        with open(stem + '.int8.json', 'w') as f:
+            json.dump({'variant': 'int8', 'mape_delta': 0.3}, f)
+        assert quantized_artifact(stem, 'int8', 0.5) == stem + '.int8.tflite'
+        assert quantized_artifact(stem, 'int8', 0.2) is None
+        assert quantized_artifact(stem, 'fp16', 0.5) is None
+        assert quantized_artifact(stem, '', 0.5) is None
+
+
+def test_backend_names_and_formats():
+    assert backend_for('lstm_attention_hospet_Rice.onnx') == 'onnx'
+    assert backend_for('lstm_hospet_Rice.npz') == 'numpy'
+    with pytest.raises(ValueError):
+        find_artifact('lstm_hospet_Rice', 'tensorrt')
+    with pytest.raises(ValueError):
+        backend_for('lstm_hospet_Rice.pt')
+
+
+if __name__ == '__main__':
+    for test in (test_prefers_requested_backend_then_keras, test_quantized_variant_needs_an_accepted_report,
+                 test_backend_names_and_formats):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,95 @@
+"""Round-trip tests for memory-mapped model bundles (bundle.py); no TensorFlow needed.
+
+Run with ``python -m pytest test_bundle.py`` or ``python test_bundle.py``.
+"""
+import json
+import os
+import struct
+import tempfile
+import zipfile
+import joblib
+import numpy as np
+import pytest
+from sklearn.preprocessing import MinMaxScaler, RobustScaler
+from bundle import ALIGN, MAGIC, convert, load_bundle, load_scalers, read_bundle
+from numpy_lstm import NumpyLSTM
+
+
+def lstm_arrays(seed=0, steps=30, features=7, units=8):
+    """numpy_lstm.export_npz layout of a random LSTM -> Dense stack"""
+    rng = np.random.default_rng(seed)
+    return {
+        'layers': np.array(['LSTM', 'Dense']),
+        'input_shape': np.array([steps, features]),
+        '0_kernel': rng.normal(0, 0.3, (features, 4 * units)).astype(np.float32),
+        '0_recurrent': rng.normal(0, 0.3, (units, 4 * units)).astype(np.float32),
+        '0_bias': rng.normal(0, 0.1, 4 * units).astype(np.float32),
+        '0_return_sequences': np.array(False),
+        '0_activation': np.array('tanh'),
+        '1_kernel': rng.normal(0, 0.3, (units, 2)).astype(np.float32),
+        '1_bias': np.zeros(2, dtype=np.float32),
+        '1_activation': np.array('linear'),
+    }
+
+
+def trained_pair(directory, scaler_obj):
+    """A baseline artifact set as train_lstm.py + numpy_lstm.py leave it"""
+    stem = os.path.join(directory, 'lstm_davangere_Maize')
+    with zipfile.ZipFile(stem + '.keras', 'w') as archive:
+        archive.writestr('config.json', json.dumps({'build_config': {'input_shape': [None, 30, 7]}}))
+    np.savez(stem + '.npz', **lstm_arrays())
+    joblib.dump(scaler_obj, stem + '_scaler.pkl')
+    return stem
+
+
+def fitted(scaler, columns=1, seed=1):
+    return scaler.fit(np.random.default_rng(seed).uniform(1000, 3000, (50, columns)))
+
+
+def test_numpy_bundle_matches_the_npz():
+    with tempfile.TemporaryDirectory() as d:
+        stem = trained_pair(d, {'price_scaler': fitted(MinMaxScaler()), 'feature_scaler': fitted(RobustScaler(), 7),
+                                'horizons': [1, 7]})
+        path = convert(stem)
+        X = np.random.default_rng(2).normal(size=(4, 30, 7)).astype(np.float32)
+        np.testing.assert_allclose(load_bundle(path)(X), NumpyLSTM.load(stem + '.npz')(X), rtol=1e-6)
+
+        header, arrays = read_bundle(path)
+        assert header['engine'] == 'numpy' and header['manifest']['input_shape'] == [30, 7]
+        # Weights are aligned read-only views on the mapped file, not copies
+        start = arrays['0_kernel'].ctypes.data
+        assert all((a.ctypes.data - start) % ALIGN == 0 and not a.flags.writeable for a in arrays.values())
+
+
+def test_scalers_round_trip():
+    with tempfile.TemporaryDirectory() as d:
+        saved = {'price_scaler': fitted(MinMaxScaler()), 'feature_scaler': fitted(RobustScaler(), 7), 'horizons': [1, 7]}
+        stem = trained_pair(d, saved)
+        restored = load_scalers(convert(stem))
+        assert restored['horizons'] == [1, 7]
+        X = np.random.default_rng(3).uniform(1000, 3000, (6, 7))
+        np.testing.assert_array_equal(restored['feature_scaler'].transform(X), saved['feature_scaler'].transform(X))
+        np.testing.assert_array_equal(restored['price_scaler'].inverse_transform(X[:, :1]),
+                                      saved['price_scaler'].inverse_transform(X[:, :1]))
+
+        bare = trained_pair(d, fitted(MinMaxScaler()))  # older artifacts pickled the scaler itself
+        assert isinstance(load_scalers(convert(bare)), MinMaxScaler)
+
+
+def test_rejects_foreign_and_newer_files():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'x.bundle')
+        with open(path, 'wb') as f:
+            f.write(b'PK\x03\x04' + bytes(60))
+        with pytest.raises(ValueError):
+            read_bundle(path)
+        with open(path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<II', 99, 2) + b'{}')
+        with pytest.raises(ValueError):
+            read_bundle(path)
+
+
+if __name__ == '__main__':
+    for test in (test_numpy_bundle_matches_the_npz, test_scalers_round_trip, test_rejects_foreign_and_newer_files):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,176 @@
+"""Parity tests: features.py against the pandas implementations it replaced.
+
+Run with ``python -m pytest test_features.py`` or ``python test_features.py``.
+"""
+import numpy as np
+import pandas as pd
+import features
+
+RTOL = 1e-7
+ATOL = 1e-7
+
+
+# --- Reference pandas implementations (as previously copied across training and serving) ---
+
+def roll_mean(x, w):
+    return pd.Series(x).rolling(window=w, min_periods=1).mean().values
+
+
+def roll_std(x, w):
+    return pd.Series(x).rolling(window=w, min_periods=2).std(ddof=0).fillna(0).values
+
+
+def roll_min(x, w):
+    return pd.Series(x).rolling(window=w, min_periods=1).min().values
+
+
+def roll_max(x, w):
+    return pd.Series(x).rolling(window=w, min_periods=1).max().values
+
+
+def ref_rsi(prices, window=14):
+    delta = pd.Series(prices).diff()
+    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
+    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
+    rs = gain / loss
+    rsi = 100 - (100 / (1 + rs))
+    return rsi.fillna(50).values
+
+
+def ref_bollinger(prices, window=20, num_std=2):
+    rolling_mean = pd.Series(prices).rolling(window=window).mean()
+    rolling_std = pd.Series(prices).rolling(window=window).std()
+    upper_band = rolling_mean + (rolling_std * num_std)
+    lower_band = rolling_mean - (rolling_std * num_std)
+    return upper_band.bfill().values, lower_band.bfill().values
+
+
+def ref_baseline(prices_np):
+    p = prices_np.flatten()
+    ma7, ma14, ma30 = roll_mean(p, 7), roll_mean(p, 14), roll_mean(p, 30)
+    std7, std14, std30 = roll_std(p, 7), roll_std(p, 14), roll_std(p, 30)
+    eps = 1e-6
+    return np.column_stack([p, p / (ma7 + eps), p / (ma14 + eps), p / (ma30 + eps),
+                            std7 / (ma7 + eps), std14 / (ma14 + eps), std30 / (ma30 + eps)])
+
+
+def ref_enhanced(prices_np):
+    p = prices_np.flatten()
+    ma_features = [roll_mean(p, w) for w in [3, 7, 14, 21, 30, 45, 60] if w <= len(p)]
+    std_features = [roll_std(p, w) for w in [7, 14, 21, 30] if w <= len(p)]
+    min_features = [roll_min(p, 7), roll_min(p, 14), roll_min(p, 30)]
+    max_features = [roll_max(p, 7), roll_max(p, 14), roll_max(p, 30)]
+    eps = 1e-6
+    price_ratios = [p / (ma + eps) for ma in ma_features[:4]]
+    volatility_features = [std / (roll_mean(p, 14) + eps) for std in std_features]
+    trend_features = np.array([0] + [p[i] - p[i-1] for i in range(1, len(p))])
+    momentum_features = [pd.Series(p).diff(w).fillna(0).values for w in [3, 7, 14] if w <= len(p)]
+    range_position = [(p - roll_min(p, w)) / (roll_max(p, w) - roll_min(p, w) + eps)
+                      for w in [7, 14, 30] if w <= len(p)]
+    return np.column_stack([p] + ma_features + std_features + min_features + max_features +
+                           price_ratios + volatility_features + [trend_features] +
+                           momentum_features + range_position)
+
+
+def ref_attention(prices_np):
+    p = prices_np.flatten()
+    ma7, ma14, ma30, ma60 = (roll_mean(p, w) for w in (7, 14, 30, 60))
+    std7, std14, std30 = (roll_std(p, w) for w in (7, 14, 30))
+    min7, min14, min30 = (roll_min(p, w) for w in (7, 14, 30))
+    max7, max14, max30 = (roll_max(p, w) for w in (7, 14, 30))
+    eps = 1e-6
+    upper, lower = ref_bollinger(p, 20, 2)
+    return np.column_stack([
+        p, ma7, ma14, ma30, ma60, std7, std14, std30, min7, min14, min30, max7, max14, max30,
+        p / (ma7 + eps), p / (ma14 + eps), p / (ma30 + eps), p / (ma60 + eps),
+        std7 / (ma7 + eps), std14 / (ma14 + eps), std30 / (ma30 + eps),
+        p / (min7 + eps), p / (min14 + eps), p / (min30 + eps),
+        p / (max7 + eps), p / (max14 + eps), p / (max30 + eps),
+        np.diff(p, prepend=p[0]), pd.Series(p).diff(3).fillna(0).values, pd.Series(p).diff(7).fillna(0).values,
+        ref_rsi(p, 14), (p - lower) / (upper - lower + eps),
+    ])
+
+
+# --- Inputs: random walks, flat stretches (repeated mandi prices), padded histories, short series ---
+
+def series():
+    rng = np.random.default_rng(42)
+    walk = 2000 + np.cumsum(rng.normal(0, 25, 400))
+    flat = np.repeat(rng.integers(1500, 2500, 40).astype(float), 10)
+    steps = np.concatenate([np.full(30, 1800.0), np.full(45, 1950.0), 1950 + np.cumsum(rng.normal(0, 5, 25))])
+    return {
+        'walk': walk,
+        'flat_runs': flat,
+        'steps': steps,
+        'constant': np.full(60, 2050.5),
+        'monotonic': np.linspace(1000, 3000, 90),
+        'short': walk[:5],
+        'single': walk[:1],
+    }
+
+
+def check(actual, expected, name):
+    assert actual.shape == expected.shape, f'{name}: shape {actual.shape} != {expected.shape}'
+    np.testing.assert_allclose(actual, expected, rtol=RTOL, atol=ATOL, err_msg=name)
+
+
+def test_rolling_kernels():
+    for name, x in series().items():
+        for w in (3, 7, 14, 20, 30, 60):
+            check(features.rolling_mean(x, w), roll_mean(x, w), f'{name} mean w={w}')
+            check(np.nan_to_num(features.rolling_std(x, w, min_periods=2)), roll_std(x, w), f'{name} std w={w}')
+            check(features.rolling_min(x, w), roll_min(x, w), f'{name} min w={w}')
+            check(features.rolling_max(x, w), roll_max(x, w), f'{name} max w={w}')
+            np.testing.assert_array_equal(features.rolling_min(x, w), roll_min(x, w))
+
+
+def test_rsi_and_bollinger():
+    for name, x in series().items():
+        check(features.calculate_rsi(x, 14), ref_rsi(x, 14), f'{name} rsi')
+        upper, lower = features.calculate_bollinger_bands(x, 20, 2)
+        ref_upper, ref_lower = ref_bollinger(x, 20, 2)
+        check(upper, ref_upper, f'{name} bollinger upper')
+        check(lower, ref_lower, f'{name} bollinger lower')
+
+
+def test_feature_builders():
+    builders = [
+        (features.build_features, ref_baseline),
+        (features.build_enhanced_features, ref_enhanced),
+        (features.build_attention_features, ref_attention),
+    ]
+    for name, x in series().items():
+        for build, ref in builders:
+            if build is features.build_attention_features and len(x) < 20:
+                continue  # Bollinger bands are undefined (NaN) below one full window
+            check(build(x.reshape(-1, 1)), ref(x.reshape(-1, 1)), f'{name} {build.__name__}')
+
+
+def test_batched_matches_single():
+    rng = np.random.default_rng(7)
+    batch = 2000 + np.cumsum(rng.normal(0, 25, (5, 60)), axis=1)
+    batch[2] = 1800.0
+    for build in (features.build_features, features.build_enhanced_features, features.build_attention_features):
+        stacked = build(batch)
+        assert stacked.ndim == 3 and stacked.shape[0] == len(batch)
+        for i, row in enumerate(batch):
+            np.testing.assert_allclose(stacked[i], build(row), rtol=1e-12, atol=1e-9)
+
+
+def test_last_row_matches_full_build():
+    builders = (features.build_features, features.build_enhanced_features, features.build_attention_features)
+    for name, x in series().items():
+        for build in builders:
+            if build is features.build_attention_features and len(x) < 20:
+                continue
+            for end in sorted({len(x), min(len(x), 60), min(len(x), 21)}):
+                full = build(x[:end])
+                np.testing.assert_allclose(build(x[:end], last=True)[-1], full[-1], rtol=1e-9, atol=1e-9,
+                                           err_msg=f'{name}[:{end}] {build.__name__} last row')
+
+
+if __name__ == '__main__':
+    for test in (test_rolling_kernels, test_rsi_and_bollinger, test_feature_builders, test_batched_matches_single,
+                 test_last_row_matches_full_build):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,162 @@
+"""Tests for in-place model and recommendation-table reloads (hot_reload.py); no TensorFlow needed.
+
+Run with ``python -m pytest test_hot_reload.py`` or ``python test_hot_reload.py``.
+"""
+import os
+import tempfile
+import threading
+import time
+import registry
+import hot_reload
+from model_cache import ModelCache
+from recommend_table import TableSource
+from result_cache import ResultCache, artifact_version
+
+
+class FakeModel:
+    nbytes = 100
+
+    def __init__(self, path):
+        with open(path) as f:
+            self.weight = f.read()
+        self.sources = (path,)
+        self.version = artifact_version(path)
+
+
+def write(path, text):
+    with open(path, 'w') as f:
+        f.write(text)
+    # Bump the mtime so the version changes even within one filesystem tick
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_replace_keeps_the_slot_and_old_references():
+    cache = ModelCache()
+    cache.put('k', ('old',), nbytes=10)
+    held = cache.get('k')
+    assert cache.replace('k', ('new',), nbytes=30)
+    assert held == ('old',) and cache.get('k') == ('new',)
+    assert cache.stats()['bytes'] == 30 and cache.stats()['replacements'] == 1
+    assert not cache.replace('gone', ('x',))
+    assert 'gone' not in cache
+
+
+def test_reload_swaps_changed_models_only():
+    with tempfile.TemporaryDirectory() as d:
+        paths = {crop: os.path.join(d, f'lstm_test_{crop}.keras') for crop in ('Maize', 'Rice')}
+        for path in paths.values():
+            write(path, 'v1')
+        # Like the apps' loaders: None when the artifact is gone
+        hot_reload.register('test', lambda market, crop: (FakeModel(paths[crop]), None)
+                            if os.path.exists(paths[crop]) else None)
+        try:
+            for crop in paths:
+                registry.models.get_or_load(('test', 'davangere', crop), lambda c=crop: (FakeModel(paths[c]), None))
+            key = ResultCache.make_key('test', 'davangere', 'Maize', [1.0], None, 'v1')
+            registry.results.put(key, {'prediction': 1.0})
+
+            write(paths['Maize'], 'v2')
+            summary = hot_reload.reload(['test'])
+            assert summary['swapped'] == ['test:davangere-Maize']
+            assert registry.models.get(('test', 'davangere', 'Maize'))[0].weight == 'v2'
+            assert registry.results.get(key) is None
+
+            # A missing artifact unloads the pair; nothing else is touched
+            os.remove(paths['Rice'])
+            assert hot_reload.reload(['test'])['dropped'] == ['test:davangere-Rice']
+            assert ('test', 'davangere', 'Rice') not in registry.models
+            assert hot_reload.reload(['test'])['swapped'] == []
+        finally:
+            hot_reload._loaders.pop('test')
+            for crop in paths:
+                registry.models.pop(('test', 'davangere', crop))
+
+
+def test_a_loader_error_keeps_the_old_model_and_other_keys_still_swap():
+    with tempfile.TemporaryDirectory() as d:
+        paths = {crop: os.path.join(d, f'lstm_test_{crop}.keras') for crop in ('Maize', 'Rice')}
+        for path in paths.values():
+            write(path, 'v1')
+
+        def load(market, crop):
+            if crop == 'Maize' and FakeModel(paths[crop]).weight == 'truncated':
+                raise OSError('truncated artifact')
+            return FakeModel(paths[crop]), None
+
+        hot_reload.register('test', load)
+        try:
+            for crop in paths:
+                registry.models.get_or_load(('test', 'davangere', crop), lambda c=crop: load('davangere', c))
+            write(paths['Maize'], 'truncated')
+            write(paths['Rice'], 'v2')
+            summary = hot_reload.reload(['test'])
+            assert summary['failed'] == ['test:davangere-Maize'] and summary['swapped'] == ['test:davangere-Rice']
+            assert registry.models.get(('test', 'davangere', 'Maize'))[0].weight == 'v1'
+            assert registry.models.get(('test', 'davangere', 'Rice'))[0].weight == 'v2'
+        finally:
+            hot_reload._loaders.pop('test')
+            for crop in paths:
+                registry.models.pop(('test', 'davangere', crop))
+
+
+def test_table_lookups_never_wait_for_a_rebuild():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'xgb.pkl')
+        write(path, 'v1')
+        release = threading.Event()
+
+        def build(part):
+            with open(path) as f:
+                text = f.read()
+            if text == 'v2':
+                release.wait(5)
+            return text
+
+        source = TableSource([path], build, check_interval=0)
+        assert source.get() == 'v1'
+        write(path, 'v2')
+        thread = threading.Thread(target=source.reload)
+        thread.start()
+        time.sleep(0.05)
+        assert source.get() == 'v1'  # old table keeps serving while v2 builds
+        release.set()
+        thread.join()
+        assert source.get() == 'v2' and source.reloads == 1
+        assert not source.reload()
+
+
+def test_failed_table_builds_are_not_retried_until_the_artifacts_change():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'xgb.pkl')
+        write(path, 'broken')
+        calls = []
+
+        def build(part):
+            calls.append(part)
+            with open(path) as f:
+                text = f.read()
+            if text == 'broken':
+                raise ValueError('Feature shape mismatch')
+            return text
+
+        source = TableSource([path], build, check_interval=0)
+        for _ in range(3):
+            try:
+                source.get(2024)
+                assert False, 'expected the build error'
+            except ValueError as e:
+                assert 'Feature shape mismatch' in str(e)
+        assert calls == [2024]
+        write(path, 'fixed')
+        assert source.reload()
+        assert source.get(2024) == 'fixed' and calls == [2024, 2024]
+
+
+if __name__ == '__main__':
+    for test in (test_replace_keeps_the_slot_and_old_references, test_reload_swaps_changed_models_only,
+                 test_a_loader_error_keeps_the_old_model_and_other_keys_still_swap,
+                 test_table_lookups_never_wait_for_a_rebuild,
+                 test_failed_table_builds_are_not_retried_until_the_artifacts_change):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,68 @@
+"""Tests for MC-dropout sampling on the compiled Keras wrapper (inference.py).
+
+Run with ``python -m pytest test_inference.py`` or ``python test_inference.py``.
+"""
+import numpy as np
+import pytest
+
+tf = pytest.importorskip('tensorflow')
+
+
+def keras_model(dropout):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense, Dropout, BatchNormalization
+    tf.keras.utils.set_random_seed(0)
+    model = Sequential([Input(shape=(60, 5)), LSTM(8, return_sequences=True), BatchNormalization(),
+                        Dropout(dropout), LSTM(4), Dense(1)])
+    bn = model.layers[1]
+    bn.moving_mean.assign(np.full(8, 0.3, dtype=np.float32))
+    bn.moving_variance.assign(np.full(8, 2.0, dtype=np.float32))
+    return model
+
+
+def test_samples_vary_only_through_dropout():
+    from inference import compile_model
+    x = np.random.default_rng(0).normal(size=(60, 5)).astype(np.float32)
+    samples = compile_model(keras_model(0.3)).mc_dropout(x, 32)
+    assert samples.shape == (32, 1) and samples.std() > 0
+
+    # A negligible rate reproduces the deterministic forecast: batch norm kept its moving statistics
+    # even though every row of the tiled batch is identical
+    model = compile_model(keras_model(1e-7))
+    np.testing.assert_allclose(model.mc_dropout(x, 8), np.repeat(model(x[np.newaxis]), 8, axis=0), rtol=1e-5)
+    np.testing.assert_array_equal(model.model.layers[1].moving_mean.numpy(), np.full(8, 0.3, dtype=np.float32))
+
+
+def test_models_without_dropout_cannot_be_sampled():
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense
+    from inference import compile_model, has_dropout
+    model = Sequential([Input(shape=(60, 5)), LSTM(4, recurrent_dropout=0.0), Dense(1)])
+    assert not has_dropout(model.get_config())
+    assert has_dropout(Sequential([Input(shape=(60, 5)), LSTM(4, dropout=0.1), Dense(1)]).get_config())
+    with pytest.raises(ValueError):
+        compile_model(model).mc_dropout(np.zeros((60, 5), dtype=np.float32), 4)
+
+
+def test_recurrent_models_take_any_window_length():
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense, Flatten
+    from inference import compile_model, variable_length
+    # e.g. a model trained on 10-day windows served with SEQ_LENGTH=30 windows
+    model = Sequential([Input(shape=(10, 1)), LSTM(4), Dense(1)])
+    X = np.random.default_rng(0).normal(size=(2, 30, 1)).astype(np.float32)
+    compiled = compile_model(model)
+    np.testing.assert_allclose(compiled(X), model.predict(X, verbose=0), rtol=1e-5)
+    assert compiled.input_shape == (10, 1) and compiled.retraces == 1
+
+    flat = Sequential([Input(shape=(10, 1)), Flatten(), Dense(1)])
+    assert not variable_length(flat)
+    with pytest.raises(Exception):
+        compile_model(flat)(X)
+
+
+if __name__ == '__main__':
+    for test in (test_samples_vary_only_through_dropout, test_models_without_dropout_cannot_be_sampled,
+                 test_recurrent_models_take_any_window_length):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,83 @@
+"""Tests for the model manifest and the artifact index built from it (manifest.py).
+
+Run with ``python -m pytest test_manifest.py`` or ``python test_manifest.py``.
+"""
+import json
+import os
+import tempfile
+import zipfile
+import joblib
+from sklearn.preprocessing import MinMaxScaler, RobustScaler
+from manifest import ArtifactIndex, parse_stem, rebuild, record
+
+
+def fake_keras(path, input_shape):
+    """A .keras archive carrying only the config the manifest reads"""
+    with zipfile.ZipFile(path, 'w') as archive:
+        archive.writestr('config.json', json.dumps({'build_config': {'input_shape': [None] + list(input_shape)}}))
+
+
+def trained(directory, stem, input_shape, scalers):
+    fake_keras(os.path.join(directory, stem + '.keras'), input_shape)
+    joblib.dump(scalers, os.path.join(directory, stem + '_scaler.pkl'))
+
+
+def test_parse_stem():
+    assert parse_stem('lstm_davangere_Maize') == ('baseline', 'davangere', 'Maize')
+    assert parse_stem('./lstm_enhanced_HBhalli_Ragi') == ('enhanced', 'HBhalli', 'Ragi')
+    assert parse_stem('lstm_attention_student_hospet_Tomato') == ('student', 'hospet', 'Tomato')
+    assert parse_stem('xgb_crop_recommendation') is None
+
+
+def test_record_and_rebuild():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'models.json')
+        trained(d, 'lstm_davangere_Maize', (30, 7), {'price_scaler': MinMaxScaler(), 'horizons': [1, 7]})
+        entry = record(os.path.join(d, 'lstm_davangere_Maize'), {'mape': 4.5}, path=path)
+        assert entry['input_shape'] == [30, 7] and len(entry['features']) == 7
+        assert entry['scaler_type'] == {'price_scaler': 'MinMaxScaler'} and entry['horizons'] == [1, 7]
+
+        trained(d, 'lstm_attention_davangere_Maize', (60, 32),
+                {'price_scaler': RobustScaler(), 'feature_scaler': RobustScaler()})
+        joblib.dump({}, os.path.join(d, 'lstm_enhanced_davangere_Maize_scaler.pkl'))  # scaler without a model
+        models = rebuild(d, path)
+        assert sorted(models) == ['lstm_attention_davangere_Maize', 'lstm_davangere_Maize']
+        assert models['lstm_davangere_Maize']['metrics'] == {'mape': 4.5}  # kept across rebuilds
+        assert models['lstm_attention_davangere_Maize']['features'][-1] == 'bollinger_position'
+
+
+def test_index_answers_from_memory():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'models.json')
+        trained(d, 'lstm_davangere_Maize', (30, 7), {'price_scaler': MinMaxScaler()})
+        trained(d, 'lstm_enhanced_hospet_Rice', (60, 33), {'price_scaler': MinMaxScaler()})
+        rebuild(d, path)
+        index = ArtifactIndex.load(path)
+        stem = os.path.join(d, 'lstm_davangere_Maize')
+
+        # Files added after startup are invisible until the manifest is rebuilt and reloaded
+        trained(d, 'lstm_davangere_Rice', (30, 7), {'price_scaler': MinMaxScaler()})
+        open(stem + '.tflite', 'wb').close()
+        assert index.servable(stem, 'tflite') == (stem + '.keras', stem + '_scaler.pkl')
+        assert index.servable(os.path.join(d, 'lstm_davangere_Rice')) is None
+        assert index.market_crops(('baseline',), {}) == {'davangere': ['Maize']}
+        assert index.market_crops(('baseline', 'enhanced'), {}) == {'davangere': ['Maize'], 'hospet': ['Rice']}
+        assert index.trained('hospet', 'Rice', ('attention', 'enhanced'))
+        assert not index.trained('hospet', 'Rice', ('baseline',))
+
+
+def test_without_manifest_probes_the_filesystem():
+    with tempfile.TemporaryDirectory() as d:
+        index = ArtifactIndex.load(os.path.join(d, 'models.json'))
+        stem = os.path.join(d, 'lstm_davangere_Maize')
+        assert not index.enabled and index.servable(stem) is None
+        trained(d, 'lstm_davangere_Maize', (30, 7), {'price_scaler': MinMaxScaler()})
+        assert index.servable(stem) == (stem + '.keras', stem + '_scaler.pkl')
+        assert index.market_crops(('baseline',), {'x': ['y']}) == {'x': ['y']} and index.trained('a', 'b', ())
+
+
+if __name__ == '__main__':
+    for test in (test_parse_stem, test_record_and_rebuild, test_index_answers_from_memory,
+                 test_without_manifest_probes_the_filesystem):
+        test()
+        print(f'{test.__name__}: ok')
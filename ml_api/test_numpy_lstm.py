@@ -0,0 +1,50 @@
+"""Parity tests: the NumPy LSTM engine against Keras on train_lstm-shaped models.
+
+Run with ``python -m pytest test_numpy_lstm.py`` or ``python test_numpy_lstm.py``.
+"""
+import os
+import tempfile
+import numpy as np
+import pytest
+from numpy_lstm import NumpyLSTM, export_npz
+
+tf = pytest.importorskip('tensorflow')
+
+
+def keras_model(n_features=7, n_outputs=1):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Input, LSTM, Dense, Dropout
+    tf.keras.utils.set_random_seed(0)
+    return Sequential([Input(shape=(30, n_features)), LSTM(96, return_sequences=True), Dropout(0.2),
+                       LSTM(48), Dense(n_outputs)])
+
+
+def exported(model):
+    with tempfile.TemporaryDirectory() as tmp:
+        path = export_npz(model, os.path.join(tmp, 'model.npz'))
+        return NumpyLSTM.load(path)
+
+
+def test_matches_keras():
+    for n_features, n_outputs in ((1, 1), (7, 1), (7, 4)):
+        model = keras_model(n_features, n_outputs)
+        engine = exported(model)
+        X = np.random.default_rng(1).normal(size=(16, 30, n_features)).astype(np.float32)
+        np.testing.assert_allclose(engine(X), model(X, training=False).numpy(), rtol=1e-4, atol=1e-5)
+        assert engine.input_shape == (30, n_features)
+
+
+def test_batches_reuse_buffers():
+    engine = exported(keras_model())
+    X = np.random.default_rng(2).normal(size=(9, 30, 7)).astype(np.float32)
+    full = engine(X)
+    # Smaller batches after a larger one run on views of the same buffers
+    singles = np.concatenate([engine(X[i:i + 1]) for i in range(len(X))])
+    np.testing.assert_allclose(singles, full, rtol=1e-6, atol=1e-6)
+    assert not np.shares_memory(engine(X[:2]), engine(X[:2]))
+
+
+if __name__ == '__main__':
+    for test in (test_matches_keras, test_batches_reuse_buffers):
+        test()
+        print(f'{test.__name__}: ok')
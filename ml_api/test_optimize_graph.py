@@ -0,0 +1,87 @@
+"""Parity tests: folded inference graphs (optimize_graph.py) against the original Keras models.
+
+Run with ``python -m pytest test_optimize_graph.py`` or ``python test_optimize_graph.py``.
+"""
+import numpy as np
+import pytest
+from optimize_graph import optimize_model
+
+tf = pytest.importorskip('tensorflow')
+
+
+def with_trained_norms(model, seed=0):
+    """Give every norm layer non-trivial statistics, as training would"""
+    rng = np.random.default_rng(seed)
+    for layer in model.layers:
+        if layer.__class__.__name__ in ('BatchNormalization', 'LayerNormalization'):
+            weights = [rng.normal(0.0, 0.5, w.shape) for w in layer.get_weights()]
+            weights[0] = np.abs(weights[0]) + 0.5  # positive scales, so folds may pass max pooling
+            if layer.__class__.__name__ == 'BatchNormalization':
+                weights[3] = rng.uniform(0.5, 2.0, weights[3].shape)
+            layer.set_weights([w.astype(np.float32) for w in weights])
+    return model
+
+
+def hybrid_like():
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import (Input, Conv1D, BatchNormalization, Dropout, MaxPooling1D, Bidirectional,
+                                         LSTM, Dense)
+    tf.keras.utils.set_random_seed(0)
+    inputs = Input(shape=(12, 5))
+    x = Conv1D(8, 3, activation='relu', padding='same')(inputs)
+    x = BatchNormalization()(x)  # feeds a 'same'-padded Conv1D: kept
+    x = Dropout(0.2)(x)
+    x = Conv1D(8, 3, activation='relu', padding='same')(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.2)(x)
+    x = MaxPooling1D(2)(x)
+    x = Bidirectional(LSTM(6, return_sequences=True, recurrent_dropout=0.2))(x)
+    x = BatchNormalization()(x)
+    x = LSTM(4, dropout=0.2)(x)
+    x = Dense(8)(x)
+    x = BatchNormalization()(x)  # after a linear Dense: folds backwards
+    x = Dense(8, activation='relu')(x)
+    x = BatchNormalization()(x)
+    x = Dropout(0.3)(x)
+    return with_trained_norms(Model(inputs, Dense(2)(x)))
+
+
+def attention_like():
+    from tensorflow.keras.models import Model
+    from tensorflow.keras.layers import (Input, Bidirectional, LSTM, LayerNormalization, MultiHeadAttention,
+                                         GlobalAveragePooling1D, Dense)
+    tf.keras.utils.set_random_seed(1)
+    inputs = Input(shape=(10, 4))
+    x = LayerNormalization()(Bidirectional(LSTM(6, return_sequences=True))(inputs))
+    x = LayerNormalization()(Bidirectional(LSTM(4, return_sequences=True))(x))
+    x = LayerNormalization()(MultiHeadAttention(num_heads=2, key_dim=4, dropout=0.1)(x, x) + x)  # shared: kept
+    x = LayerNormalization()(Bidirectional(LSTM(3, return_sequences=True))(x))
+    return with_trained_norms(Model(inputs, Dense(1)(GlobalAveragePooling1D()(x))))
+
+
+def kinds(model):
+    return [layer.__class__.__name__ for layer in model.layers]
+
+
+def test_folds_match_original():
+    for model in (hybrid_like(), attention_like()):
+        optimized, notes = optimize_model(model)
+        X = np.random.default_rng(2).normal(size=(6,) + tuple(model.input_shape[1:])).astype(np.float32)
+        np.testing.assert_allclose(optimized(X, training=False).numpy(), model(X, training=False).numpy(),
+                                   rtol=1e-4, atol=1e-5)
+        assert 'Dropout' not in kinds(optimized)
+
+
+def test_what_is_folded_and_kept():
+    optimized, notes = optimize_model(hybrid_like())
+    # Only the BN in front of the 'same'-padded Conv1D survives
+    assert kinds(optimized).count('BatchNormalization') == 1 and len(notes) == 1
+    optimized, notes = optimize_model(attention_like())
+    norms = [layer for layer in optimized.layers if layer.__class__.__name__ == 'LayerNormalization']
+    assert sum(not layer.get_config()['scale'] for layer in norms) == 3 and len(notes) == 1
+
+
+if __name__ == '__main__':
+    for test in (test_folds_match_original, test_what_is_folded_and_kept):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,89 @@
+"""Tests for the columnar price cache (price_store.py).
+
+Run with ``python -m pytest test_price_store.py`` or ``python test_price_store.py``.
+"""
+import os
+import tempfile
+import numpy as np
+import price_store
+from price_store import PriceStore, cache_path, find_crop_file, parse_csv
+
+HEADER = '\ufeff"State Name","District Name","Market Name","Variety","Group","Arrivals (Tonnes)",' \
+         '"Min Price (Rs./Quintal)","Max Price (Rs./Quintal)","Modal Price (Rs./Quintal)","Price\nDate"\n'
+
+
+def write_csv(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(HEADER)
+        for date, low, high, modal in rows:
+            f.write(f'Karnataka,Davangere,Davangere,Local,Cereals,10,{low},{high},{modal},{date}\n')
+    # Bump the mtime so a rewrite is visible even within one filesystem tick
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+
+
+def test_parse_sorts_and_merges_days():
+    with tempfile.TemporaryDirectory() as d:
+        path = os.path.join(d, 'Agmarknet_Price_Report_Maize_Davangere.csv')
+        write_csv(path, [('03 Jan 2024', 1900, 2100, 2000), ('01 Jan 2024', 1800, 2000, 1900),
+                         ('03 Jan 2024', 2000, 2300, 2200), ('not a date', 1, 2, 3), ('02 Jan 2024', 1, 2, '')])
+        series = parse_csv(path)
+        np.testing.assert_array_equal(series.dates, np.array(['2024-01-01', '2024-01-03'], dtype='datetime64[D]'))
+        assert series.days.dtype == np.int32 and series.modal_price.dtype == np.float32
+        np.testing.assert_array_equal(series.min_price, [1800, 1900])
+        np.testing.assert_array_equal(series.max_price, [2000, 2300])
+        np.testing.assert_array_equal(series.modal_price, [1900, 2100])
+
+
+def test_cache_is_reused_until_the_csv_changes():
+    with tempfile.TemporaryDirectory() as d:
+        os.mkdir(os.path.join(d, 'davangere'))
+        path = os.path.join(d, 'davangere', 'Agmarknet_Price_Report_maize_Davangere.csv')
+        write_csv(path, [('01 Jan 2024', 1800, 2000, 1900)])
+        assert find_crop_file(os.path.join(d, 'davangere'), 'Maize') == path
+        assert find_crop_file(os.path.join(d, 'hospet'), 'Maize') is None
+
+        store = PriceStore(d, check_interval=0)
+        assert store.load('davangere', 'Maize').modal_price.tolist() == [1900]
+        assert os.path.exists(cache_path(path, d, store.cache_dir))
+        # A fresh process reads the .npz instead of the CSV
+        other = PriceStore(d, check_interval=0)
+        assert other.load('davangere', 'Maize').modal_price.tolist() == [1900]
+        assert (other.parses, other.cache_reads) == (0, 1)
+
+        # Touching the CSV re-hashes it but keeps the cache; new content re-parses
+        st = os.stat(path)
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 1_000_000))
+        other.load('davangere', 'Maize')
+        assert (other.parses, other.cache_reads) == (0, 2)
+        write_csv(path, [('01 Jan 2024', 1800, 2000, 1900), ('02 Jan 2024', 1800, 2000, 1950)])
+        assert other.load('davangere', 'Maize').modal_price.tolist() == [1900, 1950]
+        assert other.parses == 1
+        assert other.load('hospet', 'Maize') is None
+
+
+def test_requests_without_history_get_a_view_of_stored_prices():
+    with tempfile.TemporaryDirectory() as d:
+        os.mkdir(os.path.join(d, 'davangere'))
+        write_csv(os.path.join(d, 'davangere', 'Agmarknet_Price_Report_Maize_Davangere.csv'),
+                  [(f'{day:02d} Jan 2024', 1800, 2000, 1900 + day) for day in range(1, 11)])
+        default, price_store.store = price_store.store, PriceStore(d, check_interval=0)
+        try:
+            window = price_store.request_history({}, 'davangere', 'Maize', 4)
+            assert window.tolist() == [1907, 1908, 1909, 1910]
+            assert np.shares_memory(window, price_store.store.load('davangere', 'Maize').modal_price)
+            assert not window.flags.writeable
+            assert price_store.request_history({'history': [1, 2]}, 'davangere', 'Maize', 4) == [1, 2]
+            # An empty history counts as none; with no stored prices either the caller gets None
+            assert price_store.request_history({'history': []}, 'davangere', 'Maize', 4).tolist() == window.tolist()
+            assert price_store.request_history({'history': []}, 'davangere', 'Rice', 4) is None
+            assert price_store.request_history({}, 'davangere', '', 4) is None
+        finally:
+            price_store.store = default
+
+
+if __name__ == '__main__':
+    for test in (test_parse_sorts_and_merges_days, test_cache_is_reused_until_the_csv_changes,
+                 test_requests_without_history_get_a_view_of_stored_prices):
+        test()
+        print(f'{test.__name__}: ok')
@@ -0,0 +1,44 @@
+"""Tests for variant routing in the combined API (server.py); no trained models needed.
+
+Run with ``python -m pytest test_server.py`` or ``python test_server.py``.
+"""
+import os
+import tempfile
+import server
+
+
+def test_auto_routes_crop_recommendation_to_a_family_with_its_models():
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as d:
+        os.chdir(d)
+        try:
+            # Model paths are relative to MODEL_DIR ('.')
+            assert server.resolve_variant('auto', 'davangere', None, 'crop_recommendation') == 'attention'
+            for path in server.baseline.XGB_PATHS:
+                open(path, 'w').close()
+            assert server.resolve_variant('auto', 'davangere', None, 'crop_recommendation') == 'baseline'
+            for _, paths in server.recommendation_chain()[:2]:
+                for path in paths:
+                    open(path, 'w').close()
+            assert server.resolve_variant('auto', 'davangere', None, 'crop_recommendation') == 'attention'
+            # Without the shared ensemble pickle neither ensemble family can recommend
+            os.remove(server.attention.RECOMMENDATION_PATHS[0])
+            assert server.resolve_variant('auto', 'davangere', None, 'crop_recommendation') == 'baseline'
+            assert server.resolve_variant('baseline', 'davangere', None, 'crop_recommendation') == 'baseline'
+        finally:
+            os.chdir(cwd)
+
+
+def test_non_object_bodies_are_rejected_as_json():
+    client = server.app.test_client()
+    for route in ('/predict', '/predict/batch'):
+        response = client.post(route, json=[1, 2])
+        assert response.status_code == 400 and response.is_json
+        assert 'JSON object' in response.get_json()['error']
+
+
+if __name__ == '__main__':
+    for test in (test_auto_routes_crop_recommendation_to_a_family_with_its_models,
+                 test_non_object_bodies_are_rejected_as_json):
+        test()
+        print(f'{test.__name__}: ok')
@@ -1,6 +1,4 @@
 import os
-import re
-import pandas as pd
 import numpy as np
 from tensorflow.keras.models import Model
 from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, Input, concatenate, BatchNormalization, Attention, MultiHeadAttention, LayerNormalization, GlobalAveragePooling1D
@@ -8,10 +6,13 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCh
 from tensorflow.keras.optimizers import Adam
 from sklearn.preprocessing import RobustScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error
+from features import build_attention_features
+from horizon import TRAIN_HORIZONS
+from manifest import forecast_metrics, record
+from price_store import load_series
 import warnings
 warnings.filterwarnings('ignore')
 
-DATA_DIR = '../data'
 MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
 CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -23,34 +24,14 @@ CROPS = {
 SEQ_LENGTH = 60  # Enhanced sequence length
 MIN_DATA_POINTS = 100  # Minimum data points required
 
-def find_crop_file(folder: str, crop: str):
-    pattern = re.compile(rf'(^|[\W_]){re.escape(crop)}([\W_]|$)', re.IGNORECASE)
-    for fname in os.listdir(folder):
-        if fname.lower().endswith('.csv') and pattern.search(fname):
-            return os.path.join(folder, fname)
-    return None
-
 def load_price_series(market, crop):
-    folder = os.path.join(DATA_DIR, market)
-    fpath = find_crop_file(folder, crop)
-    if not fpath:
-        print(f"No matching CSV for {market}-{crop}")
-        return None
-    
-    df = pd.read_csv(fpath)
-    price_col = 'Modal Price (Rs./Quintal)'
-    date_col = 'Price Date'
-    
-    if price_col not in df.columns or date_col not in df.columns:
-        print(f"Missing required columns in {fpath}")
+    series = load_series(market, crop)
+    if series is None:
+        print(f"No price data for {market}-{crop}")
         return None
     
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df[price_col] = pd.to_numeric(df[price_col], errors='coerce')
-    df = df.dropna(subset=[date_col, price_col]).sort_values(date_col)
-    
     # Enhanced data preprocessing
-    prices = df[price_col].values
+    prices = series.modal_price.astype(float)
     
     # Outlier detection and removal using IQR
     Q1 = np.percentile(prices, 25)
@@ -77,113 +58,46 @@ def load_price_series(market, crop):
     
     return prices_clean.reshape(-1, 1)
 
-def build_advanced_features(prices_np: np.ndarray):
-    """Enhanced feature engineering with more sophisticated features"""
-    p = prices_np.flatten()
-    
-    def roll_mean(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).mean().values
-    
-    def roll_std(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=2).std(ddof=0).fillna(0).values
-    
-    def roll_min(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).min().values
-    
-    def roll_max(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).max().values
-    
-    # Multiple time windows
-    ma7 = roll_mean(p, 7)
-    ma14 = roll_mean(p, 14)
-    ma30 = roll_mean(p, 30)
-    ma60 = roll_mean(p, 60)
-    
-    std7 = roll_std(p, 7)
-    std14 = roll_std(p, 14)
-    std30 = roll_std(p, 30)
-    
-    min7 = roll_min(p, 7)
-    min14 = roll_min(p, 14)
-    min30 = roll_min(p, 30)
-    
-    max7 = roll_max(p, 7)
-    max14 = roll_max(p, 14)
-    max30 = roll_max(p, 30)
-    
-    # Price ratios (scale-free features)
-    eps = 1e-6
-    r_ma7 = p / (ma7 + eps)
-    r_ma14 = p / (ma14 + eps)
-    r_ma30 = p / (ma30 + eps)
-    r_ma60 = p / (ma60 + eps)
-    
-    # Volatility ratios
-    r_std7 = std7 / (ma7 + eps)
-    r_std14 = std14 / (ma14 + eps)
-    r_std30 = std30 / (ma30 + eps)
-    
-    # Range ratios
-    r_min7 = p / (min7 + eps)
-    r_min14 = p / (min14 + eps)
-    r_min30 = p / (min30 + eps)
-    
-    r_max7 = p / (max7 + eps)
-    r_max14 = p / (max14 + eps)
-    r_max30 = p / (max30 + eps)
-    
-    # Price momentum (rate of change)
-    momentum_1 = np.diff(p, prepend=p[0])
-    momentum_3 = pd.Series(p).diff(3).fillna(0).values
-    momentum_7 = pd.Series(p).diff(7).fillna(0).values
-    
-    # Technical indicators
-    rsi_14 = calculate_rsi(p, 14)
-    bollinger_upper, bollinger_lower = calculate_bollinger_bands(p, 20, 2)
-    bollinger_position = (p - bollinger_lower) / (bollinger_upper - bollinger_lower + eps)
-    
-    # Combine all features
-    features = np.column_stack([
-        p,  # Original price
-        ma7, ma14, ma30, ma60,  # Moving averages
-        std7, std14, std30,  # Standard deviations
-        min7, min14, min30,  # Minimums
-        max7, max14, max30,  # Maximums
-        r_ma7, r_ma14, r_ma30, r_ma60,  # Price ratios
-        r_std7, r_std14, r_std30,  # Volatility ratios
-        r_min7, r_min14, r_min30,  # Min ratios
-        r_max7, r_max14, r_max30,  # Max ratios
-        momentum_1, momentum_3, momentum_7,  # Momentum
-        rsi_14, bollinger_position  # Technical indicators
-    ])
-    
-    return features
-
-def calculate_rsi(prices, window=14):
-    """Calculate Relative Strength Index"""
-    delta = pd.Series(prices).diff()
-    gain = (delta.where(delta > 0, 0)).rolling(window=window).mean()
-    loss = (-delta.where(delta < 0, 0)).rolling(window=window).mean()
-    rs = gain / loss
-    rsi = 100 - (100 / (1 + rs))
-    return rsi.fillna(50).values
-
-def calculate_bollinger_bands(prices, window=20, num_std=2):
-    """Calculate Bollinger Bands"""
-    rolling_mean = pd.Series(prices).rolling(window=window).mean()
-    rolling_std = pd.Series(prices).rolling(window=window).std()
-    upper_band = rolling_mean + (rolling_std * num_std)
-    lower_band = rolling_mean - (rolling_std * num_std)
-    return upper_band.fillna(method='bfill').values, lower_band.fillna(method='bfill').values
-
-def create_sequences(feats: np.ndarray, targets: np.ndarray, seq_length: int):
+def create_sequences(feats: np.ndarray, targets: np.ndarray, seq_length: int, horizons=(1,)):
+    """Windows of ``seq_length`` rows; y[:, j] is the target ``horizons[j]`` steps after each window"""
     Xs, ys = [], []
-    for i in range(len(feats) - seq_length):
+    for i in range(len(feats) - seq_length - max(horizons) + 1):
         Xs.append(feats[i:i+seq_length, :])
-        ys.append(targets[i+seq_length])
+        ys.append([targets[i + seq_length + h - 1, 0] for h in horizons])
     return np.array(Xs), np.array(ys)
 
-def build_attention_lstm_model(input_dim: int):
+def split_sequences(prices, price_scaler, feature_scaler, fit=False, horizons=TRAIN_HORIZONS):
+    """(X_train, y_train, X_test, y_test) with the training features, scaling and 80/20 time split
+
+    ``fit`` fits both scalers on ``prices`` first; otherwise the given (saved) scalers are applied.
+    """
+    # Build advanced features
+    feats = build_attention_features(prices)
+    if fit:
+        price_scaler.fit(prices)
+        feature_scaler.fit(feats)
+    price_scaled = price_scaler.transform(prices).flatten()
+    
+    # Scale features
+    feats_scaled = feature_scaler.transform(feats)
+    
+    # Replace first column with scaled price
+    feats_scaled[:, 0] = price_scaled
+    targets = price_scaled.reshape(-1, 1)
+    
+    # Better train-test split with time series considerations
+    split_idx = int(len(feats_scaled) * 0.8)  # 80-20 split
+    
+    train_feats = feats_scaled[:split_idx]
+    test_feats = feats_scaled[split_idx - SEQ_LENGTH:]
+    train_t = targets[:split_idx]
+    test_t = targets[split_idx - SEQ_LENGTH:]
+    
+    X_train, y_train = create_sequences(train_feats, train_t, SEQ_LENGTH, horizons)
+    X_test, y_test = create_sequences(test_feats, test_t, SEQ_LENGTH, horizons)
+    return X_train, y_train, X_test, y_test
+
+def build_attention_lstm_model(input_dim: int, n_outputs: int = 1):
     """Build Attention-Enhanced LSTM model with Multi-Head Attention"""
     
     # Input layer
@@ -227,7 +141,7 @@ def build_attention_lstm_model(input_dim: int):
     dense3 = Dropout(0.1)(dense3)
     
     # Output layer
-    output = Dense(1, activation='linear', name='price_prediction')(dense3)
+    output = Dense(n_outputs, activation='linear', name='price_prediction')(dense3)
     
     model = Model(inputs=input_layer, outputs=output)
     
@@ -254,36 +168,15 @@ def train_attention_lstm_for_crop(market, crop):
     
     # Use RobustScaler for better outlier handling
     price_scaler = RobustScaler()
-    price_scaled = price_scaler.fit_transform(prices).flatten()
-    
-    # Build advanced features
-    feats = build_advanced_features(prices)
-    
-    # Scale features
     feature_scaler = RobustScaler()
-    feats_scaled = feature_scaler.fit_transform(feats)
-    
-    # Replace first column with scaled price
-    feats_scaled[:, 0] = price_scaled
-    targets = price_scaled.reshape(-1, 1)
-    
-    # Better train-test split with time series considerations
-    split_idx = int(len(feats_scaled) * 0.8)  # 80-20 split
-    
-    train_feats = feats_scaled[:split_idx]
-    test_feats = feats_scaled[split_idx - SEQ_LENGTH:]
-    train_t = targets[:split_idx]
-    test_t = targets[split_idx - SEQ_LENGTH:]
-    
-    X_train, y_train = create_sequences(train_feats, train_t, SEQ_LENGTH)
-    X_test, y_test = create_sequences(test_feats, test_t, SEQ_LENGTH)
+    X_train, y_train, X_test, y_test = split_sequences(prices, price_scaler, feature_scaler, fit=True)
     
     if len(X_train) == 0 or len(X_test) == 0:
         print(f"Insufficient sequences for {market}-{crop}")
         return None, None
     
     # Build attention-enhanced model
-    model = build_attention_lstm_model(input_dim=feats_scaled.shape[1])
+    model = build_attention_lstm_model(input_dim=X_train.shape[2], n_outputs=len(TRAIN_HORIZONS))
     
     # Enhanced callbacks
     callbacks = [
@@ -326,23 +219,26 @@ def train_attention_lstm_for_crop(market, crop):
     # Enhanced evaluation
     y_pred = model.predict(X_test, verbose=0)
     
-    # Invert scaling
-    y_test_inv = price_scaler.inverse_transform(y_test)
-    y_pred_inv = price_scaler.inverse_transform(y_pred)
+    # Invert scaling (one column per horizon)
+    y_test_inv = price_scaler.inverse_transform(y_test.reshape(-1, 1)).reshape(y_test.shape)
+    y_pred_inv = price_scaler.inverse_transform(y_pred.reshape(-1, 1)).reshape(y_pred.shape)
     
-    # Calculate multiple metrics
-    mape = np.mean(np.abs((y_test_inv - y_pred_inv) / np.maximum(1e-6, np.abs(y_test_inv)))) * 100.0
-    mae = mean_absolute_error(y_test_inv, y_pred_inv)
-    mse = mean_squared_error(y_test_inv, y_pred_inv)
+    # Calculate multiple metrics (headline numbers are for the one-step head)
+    mapes = np.mean(np.abs((y_test_inv - y_pred_inv) / np.maximum(1e-6, np.abs(y_test_inv))), axis=0) * 100.0
+    mape = mapes[0]
+    mae = mean_absolute_error(y_test_inv[:, 0], y_pred_inv[:, 0])
+    mse = mean_squared_error(y_test_inv[:, 0], y_pred_inv[:, 0])
     rmse = np.sqrt(mse)
     
     # Calculate directional accuracy (trend prediction accuracy)
-    actual_direction = np.diff(y_test_inv.flatten())
-    predicted_direction = np.diff(y_pred_inv.flatten())
+    actual_direction = np.diff(y_test_inv[:, 0])
+    predicted_direction = np.diff(y_pred_inv[:, 0])
     directional_accuracy = np.mean(np.sign(actual_direction) == np.sign(predicted_direction)) * 100
     
     print(f"Attention-Enhanced LSTM Results for {market}-{crop}:")
     print(f"  MAPE: {mape:.2f}%")
+    for h, h_mape in zip(TRAIN_HORIZONS[1:], mapes[1:]):
+        print(f"  MAPE at {h}d: {h_mape:.2f}%")
     print(f"  MAE: {mae:.2f}")
     print(f"  RMSE: {rmse:.2f}")
     print(f"  Directional Accuracy: {directional_accuracy:.2f}%")
@@ -357,9 +253,12 @@ def train_attention_lstm_for_crop(market, crop):
     import joblib
     joblib.dump({
         'price_scaler': price_scaler,
-        'feature_scaler': feature_scaler
+        'feature_scaler': feature_scaler,
+        'horizons': list(TRAIN_HORIZONS)
     }, scaler_path)
     
+    record(model_path[:-len('.keras')], forecast_metrics(TRAIN_HORIZONS, mapes, len(y_test_inv), mae=mae, rmse=rmse,
+                                                         directional_accuracy=directional_accuracy))
     print(f'Saved attention-enhanced model to {model_path} and scalers to {scaler_path}')
     
     return model, {'price_scaler': price_scaler, 'feature_scaler': feature_scaler}
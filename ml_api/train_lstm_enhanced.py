@@ -1,8 +1,6 @@
 
 import os
-import re
 import glob
-import pandas as pd
 import numpy as np
 from tensorflow.keras.models import Sequential, Model
 from tensorflow.keras.layers import LSTM, Dense, Dropout, Bidirectional, Conv1D, MaxPooling1D, Flatten, Input, concatenate, BatchNormalization
@@ -10,10 +8,13 @@ from tensorflow.keras.callbacks import EarlyStopping, ReduceLROnPlateau, ModelCh
 from tensorflow.keras.optimizers import Adam
 from sklearn.preprocessing import MinMaxScaler, RobustScaler
 from sklearn.metrics import mean_absolute_error, mean_squared_error
+from features import build_enhanced_features
+from horizon import TRAIN_HORIZONS
+from manifest import forecast_metrics, record
+from price_store import load_series
 import warnings
 warnings.filterwarnings('ignore')
 
-DATA_DIR = '../data'
 MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
 CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -26,35 +27,14 @@ SEQ_LENGTH = 60  # Increased sequence length for better context
 MIN_DATA_POINTS = 100  # Reduced minimum data points
 
 
-def find_crop_file(folder: str, crop: str):
-    pattern = re.compile(rf'(^|[\W_]){re.escape(crop)}([\W_]|$)', re.IGNORECASE)
-    for fname in os.listdir(folder):
-        if fname.lower().endswith('.csv') and pattern.search(fname):
-            return os.path.join(folder, fname)
-    return None
-
-
 def load_price_series(market, crop):
-    folder = os.path.join(DATA_DIR, market)
-    fpath = find_crop_file(folder, crop)
-    if not fpath:
-        print(f"No matching CSV for {market}-{crop}")
-        return None
-    
-    df = pd.read_csv(fpath)
-    price_col = 'Modal Price (Rs./Quintal)'
-    date_col = 'Price Date'
-    
-    if price_col not in df.columns or date_col not in df.columns:
-        print(f"Missing required columns in {fpath}")
+    series = load_series(market, crop)
+    if series is None:
+        print(f"No price data for {market}-{crop}")
         return None
     
-    df[date_col] = pd.to_datetime(df[date_col], errors='coerce')
-    df[price_col] = pd.to_numeric(df[price_col], errors='coerce')
-    df = df.dropna(subset=[date_col, price_col]).sort_values(date_col)
-    
     # Enhanced data preprocessing
-    prices = df[price_col].values
+    prices = series.modal_price.astype(float)
     
     # Outlier detection and removal using IQR
     Q1 = np.percentile(prices, 25)
@@ -82,94 +62,48 @@ def load_price_series(market, crop):
     return prices_clean.reshape(-1, 1)
 
 
-def build_advanced_features(prices_np: np.ndarray):
-    """Enhanced feature engineering with more sophisticated features"""
-    p = prices_np.flatten()
-    
-    def roll_mean(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).mean().values
-    
-    def roll_std(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=2).std(ddof=0).fillna(0).values
-    
-    def roll_min(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).min().values
-    
-    def roll_max(x, w):
-        return pd.Series(x).rolling(window=w, min_periods=1).max().values
-    
-    # Multiple time windows for moving averages
-    ma_windows = [3, 7, 14, 21, 30, 45, 60]
-    ma_features = []
-    for w in ma_windows:
-        if w <= len(p):
-            ma_features.append(roll_mean(p, w))
-    
-    # Multiple time windows for standard deviation
-    std_windows = [7, 14, 21, 30]
-    std_features = []
-    for w in std_windows:
-        if w <= len(p):
-            std_features.append(roll_std(p, w))
-    
-    # Min/Max features
-    min_features = [roll_min(p, 7), roll_min(p, 14), roll_min(p, 30)]
-    max_features = [roll_max(p, 7), roll_max(p, 14), roll_max(p, 30)]
-    
-    # Price ratios and relative positions
-    eps = 1e-6
-    price_ratios = []
-    for i, ma in enumerate(ma_features[:4]):  # Use first 4 MA features
-        price_ratios.append(p / (ma + eps))
-    
-    # Volatility features
-    volatility_features = []
-    for std in std_features:
-        volatility_features.append(std / (roll_mean(p, 14) + eps))
-    
-    # Trend features
-    trend_features = []
-    for i in range(1, len(p)):
-        trend_features.append(p[i] - p[i-1])
-    trend_features = np.array([0] + trend_features)  # Add 0 for first element
-    
-    # Momentum features
-    momentum_features = []
-    for w in [3, 7, 14]:
-        if w <= len(p):
-            momentum = pd.Series(p).diff(w).fillna(0).values
-            momentum_features.append(momentum)
-    
-    # Price position within recent range
-    range_position = []
-    for w in [7, 14, 30]:
-        if w <= len(p):
-            min_vals = roll_min(p, w)
-            max_vals = roll_max(p, w)
-            pos = (p - min_vals) / (max_vals - min_vals + eps)
-            range_position.append(pos)
-    
-    # Combine all features
-    all_features = [p] + ma_features + std_features + min_features + max_features + \
-                   price_ratios + volatility_features + [trend_features] + \
-                   momentum_features + range_position
-    
-    # Ensure all features have the same length
-    min_length = min(len(f) for f in all_features if len(f) > 0)
-    features_array = np.column_stack([f[:min_length] for f in all_features])
-    
-    return features_array
-
-
-def create_sequences(feats: np.ndarray, targets: np.ndarray, seq_length: int):
+def create_sequences(feats: np.ndarray, targets: np.ndarray, seq_length: int, horizons=(1,)):
+    """Windows of ``seq_length`` rows; y[:, j] is the target ``horizons[j]`` steps after each window"""
     Xs, ys = [], []
-    for i in range(len(feats) - seq_length):
+    for i in range(len(feats) - seq_length - max(horizons) + 1):
         Xs.append(feats[i:(i + seq_length)])
-        ys.append(targets[i + seq_length])
+        ys.append([targets[i + seq_length + h - 1, 0] for h in horizons])
     return np.array(Xs), np.array(ys)
 
 
-def build_hybrid_model(input_dim: int):
+def split_sequences(prices, price_scaler, feature_scaler, fit=False, horizons=TRAIN_HORIZONS):
+    """(X_train, y_train, X_test, y_test) with the training features, scaling and 80/20 time split
+
+    ``fit`` fits both scalers on ``prices`` first; otherwise the given (saved) scalers are applied.
+    """
+    # Build advanced features
+    feats = build_enhanced_features(prices)
+    if fit:
+        price_scaler.fit(prices)
+        feature_scaler.fit(feats)
+    price_scaled = price_scaler.transform(prices).flatten()
+    
+    # Scale features
+    feats_scaled = feature_scaler.transform(feats)
+    
+    # Replace first column with scaled price
+    feats_scaled[:, 0] = price_scaled
+    targets = price_scaled.reshape(-1, 1)
+    
+    # Better train-test split with time series considerations
+    split_idx = int(len(feats_scaled) * 0.8)  # 80-20 split for more training data
+    
+    train_feats = feats_scaled[:split_idx]
+    test_feats = feats_scaled[split_idx - SEQ_LENGTH:]
+    train_t = targets[:split_idx]
+    test_t = targets[split_idx - SEQ_LENGTH:]
+    
+    X_train, y_train = create_sequences(train_feats, train_t, SEQ_LENGTH, horizons)
+    X_test, y_test = create_sequences(test_feats, test_t, SEQ_LENGTH, horizons)
+    return X_train, y_train, X_test, y_test
+
+
+def build_hybrid_model(input_dim: int, n_outputs: int = 1):
     """Enhanced hybrid model with CNN + Bidirectional LSTM"""
     
     # Input layer
@@ -205,7 +139,7 @@ def build_hybrid_model(input_dim: int):
     dense2 = BatchNormalization()(dense2)
     dense2 = Dropout(0.2)(dense2)
     
-    output = Dense(1, activation='linear')(dense2)
+    output = Dense(n_outputs, activation='linear')(dense2)
     
     model = Model(inputs=input_layer, outputs=output)
     
@@ -229,36 +163,15 @@ def train_enhanced_lstm_for_crop(market, crop):
     
     # Use RobustScaler for better outlier handling
     price_scaler = RobustScaler()
-    price_scaled = price_scaler.fit_transform(prices).flatten()
-    
-    # Build advanced features
-    feats = build_advanced_features(prices)
-    
-    # Scale features
     feature_scaler = RobustScaler()
-    feats_scaled = feature_scaler.fit_transform(feats)
-    
-    # Replace first column with scaled price
-    feats_scaled[:, 0] = price_scaled
-    targets = price_scaled.reshape(-1, 1)
-    
-    # Better train-test split with time series considerations
-    split_idx = int(len(feats_scaled) * 0.8)  # 80-20 split for more training data
-    
-    train_feats = feats_scaled[:split_idx]
-    test_feats = feats_scaled[split_idx - SEQ_LENGTH:]
-    train_t = targets[:split_idx]
-    test_t = targets[split_idx - SEQ_LENGTH:]
-    
-    X_train, y_train = create_sequences(train_feats, train_t, SEQ_LENGTH)
-    X_test, y_test = create_sequences(test_feats, test_t, SEQ_LENGTH)
+    X_train, y_train, X_test, y_test = split_sequences(prices, price_scaler, feature_scaler, fit=True)
     
     if len(X_train) == 0 or len(X_test) == 0:
         print(f"Insufficient sequences for {market}-{crop}")
         return None, None
     
     # Build enhanced model
-    model = build_hybrid_model(input_dim=feats_scaled.shape[1])
+    model = build_hybrid_model(input_dim=X_train.shape[2], n_outputs=len(TRAIN_HORIZONS))
     
     # Enhanced callbacks
     callbacks = [
@@ -301,23 +214,26 @@ def train_enhanced_lstm_for_crop(market, crop):
     # Enhanced evaluation
     y_pred = model.predict(X_test, verbose=0)
     
-    # Invert scaling
-    y_test_inv = price_scaler.inverse_transform(y_test)
-    y_pred_inv = price_scaler.inverse_transform(y_pred)
+    # Invert scaling (one column per horizon)
+    y_test_inv = price_scaler.inverse_transform(y_test.reshape(-1, 1)).reshape(y_test.shape)
+    y_pred_inv = price_scaler.inverse_transform(y_pred.reshape(-1, 1)).reshape(y_pred.shape)
     
-    # Calculate multiple metrics
-    mape = np.mean(np.abs((y_test_inv - y_pred_inv) / np.maximum(1e-6, np.abs(y_test_inv)))) * 100.0
-    mae = mean_absolute_error(y_test_inv, y_pred_inv)
-    mse = mean_squared_error(y_test_inv, y_pred_inv)
+    # Calculate multiple metrics (headline numbers are for the one-step head)
+    mapes = np.mean(np.abs((y_test_inv - y_pred_inv) / np.maximum(1e-6, np.abs(y_test_inv))), axis=0) * 100.0
+    mape = mapes[0]
+    mae = mean_absolute_error(y_test_inv[:, 0], y_pred_inv[:, 0])
+    mse = mean_squared_error(y_test_inv[:, 0], y_pred_inv[:, 0])
     rmse = np.sqrt(mse)
     
     # Calculate directional accuracy (trend prediction accuracy)
-    actual_direction = np.diff(y_test_inv.flatten())
-    predicted_direction = np.diff(y_pred_inv.flatten())
+    actual_direction = np.diff(y_test_inv[:, 0])
+    predicted_direction = np.diff(y_pred_inv[:, 0])
     directional_accuracy = np.mean(np.sign(actual_direction) == np.sign(predicted_direction)) * 100
     
     print(f"Enhanced Test Results for {market}-{crop}:")
     print(f"  MAPE: {mape:.2f}%")
+    for h, h_mape in zip(TRAIN_HORIZONS[1:], mapes[1:]):
+        print(f"  MAPE at {h}d: {h_mape:.2f}%")
     print(f"  MAE: {mae:.2f}")
     print(f"  RMSE: {rmse:.2f}")
     print(f"  Directional Accuracy: {directional_accuracy:.2f}%")
@@ -333,9 +249,12 @@ def train_enhanced_lstm_for_crop(market, crop):
     import joblib
     joblib.dump({
         'price_scaler': price_scaler,
-        'feature_scaler': feature_scaler
+        'feature_scaler': feature_scaler,
+        'horizons': list(TRAIN_HORIZONS)
     }, scaler_path)
     
+    record(model_path[:-len('.keras')], forecast_metrics(TRAIN_HORIZONS, mapes, len(y_test_inv), mae=mae, rmse=rmse,
+                                                         directional_accuracy=directional_accuracy))
     print(f'Saved enhanced model to {model_path} and scalers to {scaler_path}')
     
     return model, {'price_scaler': price_scaler, 'feature_scaler': feature_scaler}
@@ -1,13 +1,11 @@
-import os
-import glob
 import pandas as pd
 import numpy as np
 import xgboost as xgb
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import LabelEncoder
 import joblib
+from price_store import load_series
 
-DATA_DIR = '../data'
 MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
 CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -19,18 +17,12 @@ CROPS = {
 # Build a dataset for crop recommendation
 rows = []
 for market in MARKETS:
-    folder = os.path.join(DATA_DIR, market)
     for crop in CROPS[market]:
-        files = glob.glob(os.path.join(folder, f'*{crop}*.csv'))
-        if not files:
+        series = load_series(market, crop)
+        if series is None:
             continue
-        df = pd.read_csv(files[0])
-        for _, row in df.iterrows():
-            # Extract month as a proxy for season
-            date = pd.to_datetime(row['Price Date'], errors='coerce')
-            if pd.isnull(date):
-                continue
-            month = date.month
+        # Extract month as a proxy for season
+        for month in pd.DatetimeIndex(series.dates).month:
             rows.append({'market': market, 'month': month, 'crop': crop})
 
 # Prepare features and labels
@@ -1,5 +1,4 @@
 import os
-import glob
 import pandas as pd
 import numpy as np
 import xgboost as xgb
@@ -11,6 +10,7 @@ from sklearn.svm import SVC
 from sklearn.metrics import accuracy_score, classification_report, confusion_matrix
 from sklearn.feature_selection import SelectKBest, f_classif
 import joblib
+from price_store import load_series
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -22,7 +22,6 @@ except ImportError:
     OPTUNA_AVAILABLE = False
     print("Optuna not available. Install with: pip install optuna")
 
-DATA_DIR = '../data'
 MARKETS = ['davangere', 'gangavathi', 'HBhalli', 'hospet']
 CROPS = {
     'davangere': ['Cotton', 'Maize', 'Ragi', 'Rice', 'Tomato'],
@@ -37,15 +36,12 @@ def build_enhanced_dataset():
     rows = []
     
     for market in MARKETS:
-        folder = os.path.join(DATA_DIR, market)
         for crop in CROPS[market]:
-            files = glob.glob(os.path.join(folder, f'*{crop}*.csv'))
-            if not files:
+            series = load_series(market, crop)
+            if series is None:
                 continue
             
-            df = pd.read_csv(files[0])
-            df['Price Date'] = pd.to_datetime(df['Price Date'], errors='coerce')
-            df = df.dropna(subset=['Price Date'])
+            df = pd.DataFrame({'Price Date': series.dates, 'price': series.modal_price.astype(float)})
             
             # Extract temporal features
             df['year'] = df['Price Date'].dt.year
@@ -57,10 +53,6 @@ def build_enhanced_dataset():
             df['is_month_start'] = df['Price Date'].dt.is_month_start.astype(int)
             df['is_month_end'] = df['Price Date'].dt.is_month_end.astype(int)
             
-            # Price features
-            df['price'] = pd.to_numeric(df['Modal Price (Rs./Quintal)'], errors='coerce')
-            df = df.dropna(subset=['price'])
-            
             # Advanced price features
             df['price_ma_7'] = df['price'].rolling(window=7, min_periods=1).mean()
             df['price_ma_30'] = df['price'].rolling(window=30, min_periods=1).mean()